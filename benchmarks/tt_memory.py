@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# tt_memory.py
+# Memory and time used by the entries of the transposition tables.
+# Usage: python benchmarks/tt_memory.py [entries] (or python -m benchmarks.tt_memory)
+
+import os
+import sys
+import time
+import tracemalloc
+
+# the packages of the project are imported from its root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from easyAI.AI import TT, ArrayTT
+
+inf = float('infinity')
+
+
+class Position:
+    '''Position of a game reduced to its key in the transposition tables.'''
+
+    def __init__(self, key):
+        self.key = key
+
+    def ttentry(self):
+        return self.key
+
+
+class DictEntriesTT(TT):
+    '''Transposition table storing one dictionary per entry (the previous format).'''
+
+    def store(self, **data):
+        entry = data.pop('game').ttentry()
+        self.d[entry] = data
+
+
+def positions(n):
+    # Quarto keys are large ints (base 17), the moves small ints
+    return [Position(17 ** 20 + 7919 * i) for i in range(n)]
+
+
+def fill(table, games):
+    for i, game in enumerate(games):
+        table.store(game=game, depth=i % 8, lowerbound=i % 200 - 100.0,
+                    upperbound=inf, move=i % 512)
+
+
+def measure(name, factory, games):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    table = factory()
+    fill(table, games)
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del table
+    # the times are measured without tracing the allocations
+    table = factory()
+    begin = time.perf_counter()
+    fill(table, games)
+    stored = time.perf_counter() - begin
+    begin = time.perf_counter()
+    for game in games:
+        table.lookup(game)
+    looked = time.perf_counter() - begin
+    n = len(games)
+    print('{:<28} {:>8.1f} B/entry {:>8.2f} us/store {:>8.2f} us/lookup'
+          .format(name, size / n, stored / n * 1e6, looked / n * 1e6))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    games = positions(n)
+    print('{} entries (the keys are not counted)'.format(n))
+    measure('dict entries (before)', DictEntriesTT, games)
+    measure('TT', TT, games)
+    measure('TT(max_entries)', lambda: TT(max_entries=n), games)
+    # an entry of 36 bytes and its reference to a move which is not an int
+    measure('ArrayTT(max_mb)', lambda: ArrayTT(max_mb=n * 44 / 2**20), games)
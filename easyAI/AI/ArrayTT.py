@@ -0,0 +1,177 @@
+"""
+This module implements a transposition table of fixed size, stored
+in preallocated Numpy arrays.
+"""
+
+import pickle
+import struct
+
+import numpy as np
+
+from easyAI.AI.TT import Entry
+
+# fields of an entry: a move which is an int is stored in the entry, any
+# other move (OBJECT_MOVE) in the slot of the entry in ``ArrayTT.objects``
+ENTRY = np.dtype([('key', '<i8'), ('lowerbound', '<f8'), ('upperbound', '<f8'),
+                  ('move', '<i8'), ('depth', '<i2'), ('gen', '<u2')])
+OBJECT_MOVE = -2**63
+
+# binary file of a table: magic, version, generation, number of buckets and
+# size of the pickled moves (the moves which are not ints, by slot), followed
+# by the moves and the array of entries
+MAGIC = b'EAT1'
+HEADER = struct.Struct('<4sHHQQ')
+
+
+class ArrayTT:
+    """
+    A transposition table of fixed size: its memory does not grow
+    during the search, however long it is.
+
+    The entries are stored in a Numpy structured array allocated once,
+    at most ``max_mb`` megabytes. A position is hashed (with Python's
+    ``hash`` of ``game.ttentry()``) to a bucket of two entries:
+
+    - the first one keeps the deepest search of the positions of the
+      bucket: it is only replaced by a search at least as deep, or when
+      it was stored before the last call to **age**;
+    - the second one always receives the entries which do not replace
+      the first one.
+
+    A 64-bit key is kept with the entry to check that it is the stored
+    position. The table can be used instead of ``TT`` by the algorithms
+    of easyAI, e.g.
+
+        >>> table = ArrayTT(max_mb=64)
+        >>> ai = Negamax(8, tt = table)
+        >>> # before each move of the game
+        >>> table.age()
+
+    The moves which are ints are stored in the entries, the other ones
+    in an array of references of the same size (``objects``): the
+    memory of the table only grows with the size of these moves. The
+    keys only make sense in the process which stored them (the hash of
+    strings is randomized).
+    """
+
+    def __init__(self, max_mb=64):
+        # an entry and its reference in ``objects``
+        buckets = max(1, int(max_mb * 2**20) // (2 * (ENTRY.itemsize + 8)))
+        self.generation = 0
+        self._settable(np.zeros((buckets, 2), dtype=ENTRY),
+                       np.full((buckets, 2), None, dtype=object))
+
+    def _settable(self, table, objects):
+        self.table = table
+        self.objects = objects
+        self.buckets = len(table)
+        # views on the fields (indexing a view is faster than the array)
+        self._key = table['key']
+        self._lowerbound = table['lowerbound']
+        self._upperbound = table['upperbound']
+        self._move = table['move']
+        self._depth = table['depth']
+        self._gen = table['gen']
+
+    def _hash(self, game):
+        """ Returns the (non zero) key of the position and its bucket. """
+        key = hash(game.ttentry()) or 1
+        return key, key % self.buckets
+
+    def _slot(self, key, bucket):
+        if self._key[bucket, 0] == key:
+            return 0
+        if self._key[bucket, 1] == key:
+            return 1
+        return None
+
+    def lookup(self, game):
+        """ Requests the entry in the table. Returns None if the
+            entry has not been previously stored in the table. """
+        key, bucket = self._hash(game)
+        slot = self._slot(key, bucket)
+        if slot is None:
+            return None
+        key, lowerbound, upperbound, move, depth, gen = self.table[bucket, slot].item()
+        if move == OBJECT_MOVE:
+            move = self.objects[bucket, slot]
+        return Entry(depth, lowerbound, upperbound, move)
+
+    def store(self, game, depth=0, lowerbound=None, upperbound=None,
+              move=None, value=None):
+        """ Stores an entry into the table. A value (``df_solve``)
+            is stored as two equal bounds. """
+        if value is not None:
+            lowerbound = upperbound = value
+        key, bucket = self._hash(game)
+        slot = self._slot(key, bucket)
+        # the first entry is only replaced by a search at least as deep
+        deeper = (self._gen[bucket, 0] != self.generation
+                  or self._depth[bucket, 0] <= depth)
+        if slot != 0:
+            if deeper:
+                # the replaced first entry takes the place of the second one
+                self.table[bucket, 1] = self.table[bucket, 0]
+                self.objects[bucket, 1] = self.objects[bucket, 0]
+                slot = 0
+            else:
+                slot = 1
+        if type(move) is int and OBJECT_MOVE < move < 2**63:
+            self.objects[bucket, slot] = None
+        else:
+            self.objects[bucket, slot] = move
+            move = OBJECT_MOVE
+        self.table[bucket, slot] = (key, lowerbound, upperbound, move,
+                                    depth, self.generation)
+
+    def age(self):
+        """ Starts a new generation (a new search): the first entries
+            of the buckets can be replaced again. """
+        self.generation = (self.generation + 1) % 2**16
+
+    def clear(self):
+        """ Removes all the entries of the table. """
+        self.table.fill(0)
+        self.objects.fill(None)
+
+    def tofile(self, filename):
+        """ Saves the transposition table to a binary file, as big as
+            the table in memory. """
+        slots = np.flatnonzero(self._move.ravel() == OBJECT_MOVE)
+        moves = dict(zip(slots.tolist(), self.objects.ravel()[slots]))
+        blob = pickle.dumps(moves, pickle.HIGHEST_PROTOCOL)
+        with open(filename, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 1, self.generation, self.buckets,
+                                len(blob)))
+            f.write(blob)
+            self.table.tofile(f)
+
+    def fromfile(self, filename):
+        """ Loads a transposition table previously saved with
+            ``ArrayTT.tofile`` (whatever its size) and returns it. The
+            positions are only found if their keys have the same hash
+            in both processes: use ints or tuples of ints. """
+        with open(filename, 'rb') as f:
+            magic, version, generation, buckets, size = HEADER.unpack(
+                f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("%s is not a transposition table" % filename)
+            moves = pickle.loads(f.read(size))
+            table = np.fromfile(f, dtype=ENTRY, count=2 * buckets)
+        objects = np.full(2 * buckets, None, dtype=object)
+        for slot, move in moves.items():
+            objects[slot] = move
+        self.generation = generation
+        self._settable(table.reshape(buckets, 2), objects.reshape(buckets, 2))
+        return self
+
+    def __len__(self):
+        return int(np.count_nonzero(self._key))
+
+    def __call__(self, game):
+        """
+        This method enables the transposition table to be used
+        like an AI algorithm. However it will just break if it falls
+        on some game state that is not in the table.
+        """
+        return self.lookup(game).move
@@ -0,0 +1,229 @@
+"""
+This module implements a transposition table which replaces its
+entries by generation and depth, within a memory budget shared by all
+the tables of the process.
+"""
+
+import threading
+import weakref
+
+from easyAI.AI.TT import TT, Entry
+
+# estimated size of an entry of a table with its tags (~270 bytes) and its
+# key (a tuple or an int of a few machine words)
+ENTRY_BYTES = 320
+
+
+class MemoryBudget:
+    """
+    A memory budget shared by transposition tables: when the tables
+    together hold more than ``max_mb`` megabytes of entries, the least
+    useful entry among all of them is replaced (see ``BoundedTT``).
+
+    The size of the tables is estimated from their number of entries
+    (``entry_bytes`` per entry). A table leaves the budget when it is
+    garbage collected. ``max_mb=None`` sets no limit, but the entries
+    are still counted.
+
+    The budget of the process is ``memory_budget``, used by default by
+    every ``BoundedTT``:
+
+        >>> memory_budget.set_limit(512)
+    """
+
+    def __init__(self, max_mb=None, entry_bytes=ENTRY_BYTES):
+        self.entry_bytes = entry_bytes
+        self.tables = weakref.WeakSet()
+        self.entries = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        self.set_limit(max_mb)
+
+    def set_limit(self, max_mb):
+        """ Changes the budget, the tables are shrunk on their next
+            stores if they are above it. """
+        self.max_mb = max_mb
+        self.max_entries = (None if max_mb is None
+                            else max(1, int(max_mb * 2**20) // self.entry_bytes))
+
+    def register(self, table):
+        with self.lock:
+            self.tables.add(table)
+            self.entries += len(table.d)
+        # the dictionary outlives the table until the callback
+        weakref.finalize(table, self._release, table.d)
+
+    def _release(self, d):
+        with self.lock:
+            self.entries -= len(d)
+
+    def added(self, n=1):
+        """ Counts new entries, and replaces as many entries of the
+            tables as needed to stay within the budget. """
+        with self.lock:
+            self.entries += n
+            if self.max_entries is None:
+                return
+            while self.entries > self.max_entries:
+                victims = [table for table in self.tables if table.d]
+                if not victims:
+                    break
+                # the table whose worst entry is the oldest and shallowest
+                table = max(victims, key=lambda table: table.worst())
+                table.evict()
+                self.entries -= 1
+                self.evictions += 1
+
+    def removed(self, n=1):
+        with self.lock:
+            self.entries -= n
+
+    def metrics(self):
+        """ Returns the number of entries of the tables, their estimated
+            size, the occupancy of the budget and the number of entries
+            replaced to stay within it. """
+        return {'tables': len(self.tables),
+                'entries': self.entries,
+                'mb': self.entries * self.entry_bytes / 2**20,
+                'max_mb': self.max_mb,
+                'occupancy': (None if self.max_entries is None
+                              else self.entries / self.max_entries),
+                'evictions': self.evictions}
+
+
+# budget of all the tables of the process
+memory_budget = MemoryBudget()
+
+
+class BoundedTT(TT):
+    """
+    A transposition table which can be kept for days: its entries are
+    replaced when it holds ``max_entries`` entries, or when the tables
+    of its memory budget (``memory_budget`` by default) are full.
+
+    Each entry is tagged with the generation of the search which stored
+    or last found it; **age** starts a new generation, before each move
+    of a game. The entry replaced first is the one of the oldest
+    generation, then of the shallowest search, then the oldest stored:
+
+        >>> memory_budget.set_limit(512) # megabytes, for all the tables
+        >>> table = BoundedTT()
+        >>> ai = Negamax(8, tt = table)
+        >>> # before each move of the game
+        >>> table.age()
+
+    **metrics** returns the hits, the stores and the replaced entries.
+    """
+
+    def __init__(self, max_entries=None, budget=None):
+        TT.__init__(self)
+        self.max_entries = max_entries
+        self.budget = memory_budget if budget is None else budget
+        self.generation = 0
+        # key -> (generation, depth) and (generation, depth) -> the same
+        # tuple and the keys, from the first to the last stored
+        self.tags = {}
+        self.groups = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.budget.register(self)
+
+    def _tag(self, key, tag):
+        old = self.tags.get(key)
+        if old is not None:
+            group = self.groups[old][1]
+            del group[key]
+            if not group:
+                del self.groups[old]
+        if tag in self.groups:
+            # one tuple for all the keys of the group
+            tag, group = self.groups[tag]
+        else:
+            group = {}
+            self.groups[tag] = tag, group
+        self.tags[key] = tag
+        group[key] = None
+
+    def lookup(self, game):
+        """ Requests the entry in the table. Returns None if the
+            entry has not been previously stored in the table. """
+        key = game.ttentry()
+        entry = self.d.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.tags[key][0] != self.generation:
+            # still useful in this search
+            self._tag(key, (self.generation, entry.depth))
+        return entry
+
+    def store(self, game, depth=0, lowerbound=None, upperbound=None,
+              move=None, value=None):
+        """ Stores an entry into the table. A value (``df_solve``)
+            is stored as two equal bounds. """
+        if value is not None:
+            lowerbound = upperbound = value
+        self._insert(game.ttentry(), Entry(depth, lowerbound, upperbound, move))
+
+    def _insert(self, key, entry):
+        new = key not in self.d
+        self.d[key] = entry
+        self._tag(key, (self.generation, entry.depth))
+        self.stores += 1
+        if new:
+            if self.max_entries and len(self.d) > self.max_entries:
+                self.evict()
+            else:
+                self.budget.added()
+
+    def worst(self):
+        """ Returns the age (in generations) and the opposite of the
+            depth of the entry which would be replaced first. """
+        generation, depth = min(self.groups)
+        return self.generation - generation, -depth
+
+    def evict(self):
+        """ Removes the entry which would be replaced first. """
+        tag = min(self.groups)
+        group = self.groups[tag][1]
+        key = next(iter(group))
+        del group[key]
+        if not group:
+            del self.groups[tag]
+        del self.tags[key]
+        del self.d[key]
+        self.evictions += 1
+
+    def age(self):
+        """ Starts a new generation (a new search): the entries which
+            are not used by this search will be replaced first. """
+        self.generation += 1
+
+    def clear(self):
+        """ Removes all the entries of the table. """
+        self.budget.removed(len(self.d))
+        self.d.clear()
+        self.tags.clear()
+        self.groups.clear()
+
+    def fromfile(self, filename):
+        """ Loads the entries of a table saved with ``TT.tofile``, in
+            the current generation, and returns the table. """
+        for key, entry in TT().fromfile(filename).d.items():
+            self._insert(key, entry)
+        return self
+
+    def metrics(self):
+        """ Returns the number of entries, the hits and misses of the
+            lookups, the stores and the number of replaced entries. """
+        lookups = self.hits + self.misses
+        return {'entries': len(self.d),
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions}
@@ -0,0 +1,244 @@
+"""
+This module implements a read-only transposition table stored in a
+compressed file, made for the big tables of solved positions.
+"""
+
+import bisect
+import lzma
+import mmap
+import pickle
+import struct
+import sys
+import zlib
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+
+from easyAI.AI.MmapTT import stablehash
+from easyAI.AI.TT import Entry
+
+# file of a table: a header (magic, version, codec, whether the keys are
+# hashed, number of entries, offset and size of the index), the compressed
+# blocks and the pickled index. The index holds the first key, offset, size
+# and number of entries of each block, and the distinct bounds and moves.
+MAGIC = b'ECT1'
+HEADER = struct.Struct('<4sHBBQQQ')
+
+CODECS = {'zlib': (0, zlib.compress, zlib.decompress),
+          'lzma': (1, lzma.compress, lzma.decompress)}
+DECOMPRESS = {number: decompress for number, compress, decompress in CODECS.values()}
+
+# the columns of a block are arrays of the narrowest type of ints, or
+# pickled lists (of their size and the pickle) for the bigger ints
+TYPECODES = {False: 'BHIQ', True: 'bhiq'}
+SIZE = struct.Struct('<I')
+
+
+def _pack(values, signed=False):
+    """ Returns the ints as the typecode and the bytes of an array. """
+    low, high = min(values), max(values)
+    for typecode in TYPECODES[signed]:
+        bits = 8 * array(typecode).itemsize
+        if signed and -2**(bits - 1) <= low and high < 2**(bits - 1):
+            break
+        if not signed and high < 2**bits:
+            break
+    else:
+        data = pickle.dumps(values, pickle.HIGHEST_PROTOCOL)
+        return b'p' + SIZE.pack(len(data)) + data
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return typecode.encode() + column.tobytes()
+
+
+def _unpack(data, offset, n):
+    """ Returns the array of ``n`` ints at the offset of the data and
+        the offset after it. """
+    if data[offset] == ord('p'):
+        size = SIZE.unpack_from(data, offset + 1)[0]
+        offset += 1 + SIZE.size
+        return pickle.loads(data[offset:offset + size]), offset + size
+    column = array(chr(data[offset]))
+    end = offset + 1 + n * column.itemsize
+    column.frombytes(data[offset + 1:end])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column, end
+
+
+class ChunkTT:
+    """
+    A transposition table read from a compressed file.
+
+    The entries are sorted by key and cut in blocks of ``block_size``
+    entries. In a block, the keys are stored as the differences with
+    the previous ones, the bounds and the moves as indices in the lists
+    of the distinct bounds and moves of the table, and the block is
+    compressed with ``zlib`` or ``lzma``. The tables of solved games,
+    whose values are only wins, draws and losses, take a few bytes per
+    entry. The file is written once by **save** from another table:
+
+        >>> table = TT()
+        >>> id_solve(game, range(2, 20), win_score=90, tt=table)
+        >>> ChunkTT.save(table, 'solved.ctt')
+
+        >>> table = ChunkTT('solved.ctt', overlay=TT())
+
+    Only the index of the blocks is loaded. A lookup decompresses the
+    block of the position, and the last ``cache_blocks`` blocks used are
+    kept decompressed. The entries stored during a search go to the
+    **overlay** (they are dropped if there is none).
+
+    The keys are the ints returned by ``game.ttentry()`` when they are
+    all positive ints (as in Quarto), their 64-bit hash (``stablehash``)
+    otherwise.
+    """
+
+    def __init__(self, filename, overlay=None, cache_blocks=64):
+        self.overlay = overlay
+        self.cache_blocks = cache_blocks
+        self.cache = OrderedDict()
+        with open(filename, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, codec, hashed, count, offset, size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError("%s is not a transposition table" % filename)
+        self.decompress = DECOMPRESS[codec]
+        self.hashed = hashed
+        self.count = count
+        (self.first_keys, self.offsets, self.sizes, self.lengths, self.bounds,
+         self.moves) = pickle.loads(self.map[offset:offset + size])
+
+    @staticmethod
+    def save(table, filename, block_size=1024, codec='zlib'):
+        """ Writes the entries of a table (``TT``) to a compressed file
+            which can be read by ``ChunkTT``. """
+        number, compress, decompress = CODECS[codec]
+        keys = list(table.d)
+        hashed = not all(type(key) is int and key >= 0 for key in keys)
+        items = sorted(((stablehash(key) if hashed else key), key) for key in keys)
+        bounds, bound_index = [], {}
+        moves, move_index = [], {}
+
+        def index(value, values, indices):
+            i = indices.get(value)
+            if i is None:
+                i = indices[value] = len(values)
+                values.append(value)
+            return i
+
+        first_keys, offsets, sizes, lengths = [], [], [], []
+        offset = HEADER.size
+        with open(filename, 'wb') as f:
+            f.write(b'\0' * HEADER.size)
+            for start in range(0, len(items), block_size):
+                block = items[start:start + block_size]
+                entries = [table.d[key] for ikey, key in block]
+                ikeys = [ikey for ikey, key in block]
+                deltas = [0] + [b - a for a, b in zip(ikeys, ikeys[1:])]
+                data = b''.join([
+                    _pack(deltas),
+                    _pack([entry.depth for entry in entries], signed=True),
+                    _pack([index(entry.lowerbound, bounds, bound_index)
+                           for entry in entries]),
+                    _pack([index(entry.upperbound, bounds, bound_index)
+                           for entry in entries]),
+                    _pack([index(entry.move, moves, move_index)
+                           for entry in entries])])
+                data = compress(data)
+                f.write(data)
+                first_keys.append(ikeys[0])
+                offsets.append(offset)
+                sizes.append(len(data))
+                lengths.append(len(block))
+                offset += len(data)
+            blob = pickle.dumps((first_keys, offsets, sizes, lengths, bounds,
+                                 moves), pickle.HIGHEST_PROTOCOL)
+            f.write(blob)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, 1, number, hashed, len(items), offset,
+                                len(blob)))
+
+    def _block(self, i):
+        """ Returns the keys and the columns of the entries of a block. """
+        block = self.cache.get(i)
+        if block is not None:
+            self.cache.move_to_end(i)
+            return block
+        offset = self.offsets[i]
+        data = self.decompress(self.map[offset:offset + self.sizes[i]])
+        n = self.lengths[i]
+        deltas, offset = _unpack(data, 0, n)
+        depths, offset = _unpack(data, offset, n)
+        lowerbounds, offset = _unpack(data, offset, n)
+        upperbounds, offset = _unpack(data, offset, n)
+        moves, offset = _unpack(data, offset, n)
+        keys = list(accumulate(deltas))
+        first = self.first_keys[i]
+        keys = [first + key for key in keys]
+        block = keys, depths, lowerbounds, upperbounds, moves
+        self.cache[i] = block
+        if len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+        return block
+
+    def _entry(self, block, j):
+        keys, depths, lowerbounds, upperbounds, moves = block
+        return Entry(depths[j], self.bounds[lowerbounds[j]],
+                     self.bounds[upperbounds[j]], self.moves[moves[j]])
+
+    def _find(self, game):
+        key = game.ttentry()
+        if self.hashed:
+            key = stablehash(key)
+        i = bisect.bisect_right(self.first_keys, key) - 1
+        if i < 0:
+            return None
+        block = self._block(i)
+        keys = block[0]
+        j = bisect.bisect_left(keys, key)
+        if j == len(keys) or keys[j] != key:
+            return None
+        return self._entry(block, j)
+
+    def lookup(self, game):
+        """ Requests the entry in the overlay, then in the file.
+            Returns None if the position is in neither. """
+        if self.overlay is not None:
+            entry = self.overlay.lookup(game)
+            if entry is not None:
+                return entry
+        return self._find(game)
+
+    def store(self, game, **data):
+        """ Stores an entry into the overlay (if any). """
+        if self.overlay is not None:
+            self.overlay.store(game, **data)
+
+    def items(self):
+        """ Yields the keys (or their hashes) and the entries of the
+            file, e.g. to load it in a ``TT``. """
+        for i in range(len(self.first_keys)):
+            block = self._block(i)
+            for j, key in enumerate(block[0]):
+                yield key, self._entry(block, j)
+
+    def age(self):
+        if self.overlay is not None:
+            self.overlay.age()
+
+    def close(self):
+        self.map.close()
+
+    def __len__(self):
+        return self.count + (0 if self.overlay is None else len(self.overlay))
+
+    def __call__(self, game):
+        """
+        This method enables the transposition table to be used
+        like an AI algorithm. However it will just break if it falls
+        on some game state that is not in the table.
+        """
+        return self.lookup(game).move
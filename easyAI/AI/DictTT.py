@@ -1,100 +1,231 @@
 #contributed by mrfesol (Tomasz Wesolowski)
 from easyAI.AI.HashTT import HashTT
 
+# key of a free slot
+_EMPTY = object()
+
+
 class DictTT:
     """
     A DictTT implements custom dictionary,
     which can be used with transposition tables.
+
+    It is an open-addressing table with linear probing: a key which
+    collides goes to the next free slot, nothing is lost. The table
+    doubles its number of buckets when it is filled beyond
+    ``load_factor``, up to ``max_buckets``. Past that size a new key
+    overwrites the entry of its first slot, so the memory is bounded.
+
+    **stats** reports the occupancy, the probe lengths and the rate of
+    overwrites, e.g. to size the table for a game:
+
+        >>> table = TT(own_dict=DictTT(2**16, max_buckets=2**20))
+        >>> ai = Negamax(8, tt=table)
+        >>> ai(game)
+        >>> table.d.stats()
     """
-    def __init__(self, num_buckets=1024, own_hash = None):
+    def __init__(self, num_buckets=1024, own_hash = None, load_factor=0.75,
+                 max_buckets=None):
         """
         Initializes a dictionary with the given number of buckets.
         """
-        self.dict = []
-        for i in range(num_buckets):
-            self.dict.append((None, None))
-        self.keys = dict()
+        if not 0 < load_factor < 1:
+            raise ValueError("load_factor must be between 0 and 1")
+        self.load_factor = load_factor
+        self.max_buckets = max_buckets
+        self.own_hash = own_hash
         self.hash = hash
         if own_hash != None:
-            own_hash.modulo = len(self.dict)
             self.hash = own_hash.get_hash
         self.num_collisions = 0
         self.num_calls = 0
-    
+        self.num_lookups = 0
+        self.num_probes = 0
+        self.max_probes = 0
+        self.num_inserts = 0
+        self.num_updates = 0
+        self.num_overwrites = 0
+        self.num_resizes = 0
+        self._allocate(num_buckets)
+
+    def _allocate(self, num_buckets):
+        self.slots = [_EMPTY] * num_buckets
+        self.values = [None] * num_buckets
+        self.size = 0
+        if self.own_hash != None:
+            self.own_hash.modulo = num_buckets
+
     def hash_key(self, key):
         """
         Given a key this will create a number and then convert it to
         an index for the dict.
         """
         self.num_calls += 1
-        return self.hash(key) % len(self.dict)
-    
+        if self.own_hash != None:
+            return self.hash(key) % len(self.slots)
+        # spread the keys (Python hashes consecutive ints to consecutive
+        # slots, which makes long probe sequences)
+        return ((self.hash(key) * 0x9E3779B97F4A7C15) % 2**64 >> 32) % len(self.slots)
+
+    def _probe(self, key):
+        """
+        Returns the slot of the key (or the free slot where the search
+        ended) and the number of slots which were probed.
+        """
+        slots = self.slots
+        slot = self.hash_key(key)
+        probes = 1
+        while True:
+            k = slots[slot]
+            if k is _EMPTY or k == key:
+                return slot, probes
+            slot += 1
+            probes += 1
+            if slot == len(slots):
+                slot = 0
+
     def get_slot(self, key, default=None):
         """
         Returns the index, key, and value of a slot found in the dict.
         Returns -1, key, and default (None if not set) when not found.
         """
-        slot = self.hash_key(key)
-        
-        if key == self.dict[slot][0]:
-            return slot, self.dict[slot][0], self.dict[slot][1]
-    
+        slot, probes = self._probe(key)
+        self.num_lookups += 1
+        self.num_probes += probes
+        if probes > self.max_probes:
+            self.max_probes = probes
+
+        if self.slots[slot] is not _EMPTY:
+            return slot, self.slots[slot], self.values[slot]
+
         return -1, key, default
-    
+
     def get(self, key, default=None):
         """
         Gets the value for the given key, or the default.
-        """        
+        """
         i, k, v = self.get_slot(key, default=default)
         return v
-    
+
     def set(self, key, value):
         """
         Sets the key to the value, replacing any existing value.
         """
-        slot = self.hash_key(key)
-        
-        if self.dict[slot] != (None, None):
+        slot, probes = self._probe(key)
+
+        if self.slots[slot] is not _EMPTY:
+            self.values[slot] = value
+            self.num_updates += 1
+            return
+
+        if self.size + 1 > self.load_factor * len(self.slots):
+            num_buckets = 2 * len(self.slots)
+            if self.max_buckets is None or num_buckets <= self.max_buckets:
+                self._resize(num_buckets)
+                slot, probes = self._probe(key)
+            else:
+                # the table is full: the key takes its first slot and
+                # replaces the entry in it (or the next one if it is free)
+                slot = self.hash_key(key)
+                if self.slots[slot] is _EMPTY:
+                    other = slot
+                    while self.slots[other] is _EMPTY:
+                        other = (other + 1) % len(self.slots)
+                    self.delete(self.slots[other])
+                if self.slots[slot] is _EMPTY:
+                    self.size += 1
+                self.slots[slot] = key
+                self.values[slot] = value
+                self.num_overwrites += 1
+                return
+
+        if probes > 1:
             self.num_collisions += 1 #collision occured
-                
-        self.dict[slot] = (key, value)
-     
-        if self.keys.__contains__(key):
-            self.keys[key] = self.keys[key] + 1
-        else:
-            self.keys[key] = 1
-    
+        self.slots[slot] = key
+        self.values[slot] = value
+        self.size += 1
+        self.num_inserts += 1
+
+    def _resize(self, num_buckets):
+        items = list(self.items())
+        self._allocate(num_buckets)
+        for key, value in items:
+            slot, probes = self._probe(key)
+            self.slots[slot] = key
+            self.values[slot] = value
+        self.size = len(items)
+        self.num_resizes += 1
+
     def delete(self, key):
         """
         Deletes the given key from the dictionary.
         """
-        
-        slot = self.hash_key(key)
-        self.dict[slot] = (None, None)
-            
-        if self.keys.__contains__(key):
-            self.keys[key] = self.keys[key] - 1
-            if self.keys[key] <= 0:
-                del self.keys[key]
-                
+        slot, probes = self._probe(key)
+        if self.slots[slot] is _EMPTY:
+            return
+        # move back the following keys which can not be found anymore
+        slots, n = self.slots, len(self.slots)
+        other = slot
+        while True:
+            other = (other + 1) % n
+            k = slots[other]
+            if k is _EMPTY:
+                break
+            home = self.hash_key(k)
+            # the key can take the free slot if it is not after its home
+            if (slot - home) % n < (other - home) % n:
+                slots[slot], self.values[slot] = k, self.values[other]
+                slot = other
+        slots[slot] = _EMPTY
+        self.values[slot] = None
+        self.size -= 1
+
     def collisions(self):
         return self.num_collisions
-                    
+
+    def stats(self):
+        """
+        Returns the statistics of the table: its occupancy, the mean
+        and maximal number of slots probed by the lookups, and the
+        rate of new keys which overwrote another one.
+        """
+        stored = self.num_inserts + self.num_overwrites
+        return {'buckets': len(self.slots),
+                'entries': self.size,
+                'occupancy': self.size / len(self.slots),
+                'lookups': self.num_lookups,
+                'mean_probes': self.num_probes / max(1, self.num_lookups),
+                'max_probes': self.max_probes,
+                'inserts': self.num_inserts,
+                'updates': self.num_updates,
+                'overwrites': self.num_overwrites,
+                'overwrite_rate': self.num_overwrites / max(1, stored),
+                'collisions': self.num_collisions,
+                'resizes': self.num_resizes}
+
+    def items(self):
+        for key, value in zip(self.slots, self.values):
+            if key is not _EMPTY:
+                yield key, value
+
     def __getitem__(self, key):
         return self.get(key)
-    
+
     def __missing__(self, key):
         return None
-    
+
     def __setitem__(self, key, value):
         self.set(key, value)
-        
+
     def __delitem__(self, key):
         self.delete(key)
-        
+
     def __iter__(self):
-        return iter(self.keys)
-        
+        return (key for key in self.slots if key is not _EMPTY)
+
     def __contains__(self, key):
-        return self.keys.__contains__(key)
-        
\ No newline at end of file
+        slot, probes = self._probe(key)
+        return self.slots[slot] is not _EMPTY
+
+    def __len__(self):
+        return self.size
@@ -3,6 +3,7 @@
 class HashTT:
     """ 
         Base Class for various types of hashes
+        (see easyAI.AI.Hashes for fast ones)
     """    
     
     def __init__(self):
@@ -30,7 +31,7 @@ class HashTT:
             return self.hash_int(key)
         if type(key) is str and len(key) <= 1:
             return self.hash_char(key)
-        for v in list(key):
+        for v in key:
             ret_hash = self.join(ret_hash, self.get_hash(v, depth+1)) % self.modulo
         if depth == 0:
             ret_hash = self.after(key, ret_hash)
@@ -55,4 +56,4 @@ class HashTT:
         two - hash of new element
         one = join(one, two)
         """
-        return (one * two) % self.modulo
\ No newline at end of file
+        return (one * 31 + two) % self.modulo
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+Hash functions which can be given to ``DictTT(own_hash=...)``.
+
+Unlike the generic ``HashTT.get_hash``, they read the key as a flat
+sequence of ints (the characters of a string are their ``ord``, an
+int wider than 64 bits is read by blocks of 64 bits) and mix them with
+64-bit arithmetic, so they are fast and a zero does not erase the hash:
+
+- ``FNVHashTT``: FNV-1a, simple and good for short keys;
+- ``MixHashTT``: a multiply-xorshift mix (in the spirit of xxHash),
+  better spread for long or regular keys;
+- ``JSWHashTT``: a table of random numbers per byte, rotated;
+- ``ZobristHashTT``: the XOR of random numbers per (cell, value) of
+  a board, which can be updated incrementally after a move.
+
+They also hash many keys at once with Numpy (**hash_array**).
+"""
+
+import random
+
+from easyAI.AI.HashTT import HashTT
+
+MASK = 2**64 - 1
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+MIX_PRIME1 = 0x9E3779B185EBCA87
+MIX_PRIME2 = 0xC2B2AE3D27D4EB4F
+
+
+def flatten(key):
+    """ Yields the ints of a key (an int, a string or a nested sequence
+        of them). """
+    if type(key) is int:
+        if 0 <= key <= MASK:
+            yield key
+            return
+        # the sign and the blocks of 64 bits of the number
+        yield int(key < 0)
+        key = abs(key)
+        while key:
+            yield key & MASK
+            key >>= 64
+    elif type(key) is str:
+        for c in key:
+            yield ord(c)
+    else:
+        for v in key:
+            if type(v) is int and 0 <= v <= MASK:
+                yield v
+            else:
+                for w in flatten(v):
+                    yield w
+
+
+def _numpy_keys(keys):
+    """ Returns the keys (a 2D array or sequence of sequences of ints of
+        the same length) as a 2D array of 64-bit unsigned ints. """
+    import numpy as np
+    keys = np.asarray(keys)
+    if keys.ndim == 1:
+        keys = keys.reshape(-1, 1)
+    return np, keys.astype(np.uint64)
+
+
+class FNVHashTT(HashTT):
+    """
+    FNV-1a hash of the ints of the key (64 bits).
+    """
+
+    def get_hash(self, key, depth=0):
+        h = FNV_OFFSET
+        for v in flatten(key):
+            h = ((h ^ v) * FNV_PRIME) & MASK
+        return h % self.modulo
+
+    def hash_array(self, keys):
+        """
+        Returns the hashes of many keys at once, as a Numpy array: ``keys``
+        is a 2D array of ints (one key per row) and the hashes are equal
+        to the ``get_hash`` of the rows as tuples.
+        """
+        np, keys = _numpy_keys(keys)
+        h = np.full(len(keys), FNV_OFFSET, dtype=np.uint64)
+        prime = np.uint64(FNV_PRIME)
+        with np.errstate(over='ignore'):
+            for column in keys.T:
+                h = (h ^ column) * prime
+        return h % np.uint64(self.modulo)
+
+
+class MixHashTT(HashTT):
+    """
+    Multiply-xorshift hash of the ints of the key, with a final avalanche
+    so that all the bits of the hash depend on all the bits of the key.
+    """
+
+    def get_hash(self, key, depth=0):
+        h = MIX_PRIME2
+        for v in flatten(key):
+            h = (h ^ ((v * MIX_PRIME1) & MASK)) * MIX_PRIME2 & MASK
+            h ^= h >> 29
+        h ^= h >> 33
+        h = (h * MIX_PRIME1) & MASK
+        h ^= h >> 32
+        return h % self.modulo
+
+    def hash_array(self, keys):
+        """
+        Returns the hashes of many keys at once, as a Numpy array (see
+        ``FNVHashTT.hash_array``).
+        """
+        np, keys = _numpy_keys(keys)
+        h = np.full(len(keys), MIX_PRIME2, dtype=np.uint64)
+        prime1, prime2 = np.uint64(MIX_PRIME1), np.uint64(MIX_PRIME2)
+        with np.errstate(over='ignore'):
+            for column in keys.T:
+                h = (h ^ column * prime1) * prime2
+                h ^= h >> np.uint64(29)
+            h ^= h >> np.uint64(33)
+            h = h * prime1
+            h ^= h >> np.uint64(32)
+        return h % np.uint64(self.modulo)
+
+
+class JSWHashTT(HashTT):
+    """
+    JSW hash: each byte of the key selects a random number, which is
+    XORed to the hash rotated by one bit. The random numbers are drawn
+    from ``seed``, so the hashes are the same in every process.
+    """
+
+    def __init__(self, seed=0):
+        HashTT.__init__(self)
+        rng = random.Random(seed)
+        self.tab = [rng.getrandbits(32) for i in range(256)]
+
+    def get_hash(self, key, depth=0):
+        tab = self.tab
+        h = 16777551
+        for v in flatten(key):
+            while True:
+                h = (((h << 1) | (h >> 31)) & 0xFFFFFFFF) ^ tab[v & 255]
+                v >>= 8
+                if not v:
+                    break
+        return h % self.modulo
+
+    def hash_array(self, keys):
+        """
+        Returns the hashes of many keys at once, as a Numpy array (see
+        ``FNVHashTT.hash_array``).
+        """
+        np, keys = _numpy_keys(keys)
+        tab = np.array(self.tab, dtype=np.uint64)
+        h = np.full(len(keys), 16777551, dtype=np.uint64)
+        one, byte = np.uint64(1), np.uint64(8)
+        for column in keys.T:
+            # the bytes of each int up to its last non-zero one
+            v = column.copy()
+            todo = np.ones(len(keys), dtype=bool)
+            while todo.any():
+                rotated = ((h << one) | (h >> np.uint64(31))) & np.uint64(0xFFFFFFFF)
+                h = np.where(todo, rotated ^ tab[v & np.uint64(255)], h)
+                v >>= byte
+                todo &= v != 0
+        return h % np.uint64(self.modulo)
+
+
+class ZobristHashTT(HashTT):
+    """
+    Zobrist hashing for keys of ``size`` ints in ``range(values)``,
+    e.g. the cells of a board: the hash is the XOR of one random 64-bit
+    number per (cell, value).
+
+    When a move changes a few cells, the hash of the new position is
+    computed from the previous one with **update**, without reading the
+    whole key:
+
+        >>> zobrist = ZobristHashTT(9, 3)
+        >>> h = zobrist.hash64(board)
+        >>> h = zobrist.update(h, 4, 0, 1) # the cell 4 goes from 0 to 1
+
+    The table is drawn from ``seed``, so the hashes are the same in
+    every process.
+    """
+
+    def __init__(self, size, values, seed=0):
+        HashTT.__init__(self)
+        rng = random.Random(seed)
+        self.size = size
+        self.values = values
+        self.table = [[rng.getrandbits(64) for v in range(values)]
+                      for i in range(size)]
+
+    def hash64(self, key):
+        """ Returns the full 64-bit hash of a key. """
+        h = 0
+        for row, v in zip(self.table, key):
+            h ^= row[v]
+        return h
+
+    def update(self, h, index, old, new):
+        """ Returns the 64-bit hash after the cell ``index`` of the key
+            changed from ``old`` to ``new``. """
+        row = self.table[index]
+        return h ^ row[old] ^ row[new]
+
+    def get_hash(self, key, depth=0):
+        return self.hash64(key) % self.modulo
+
+    def hash_array(self, keys):
+        """
+        Returns the hashes of many keys at once, as a Numpy array: ``keys``
+        is a 2D array of ints (one key of ``size`` ints per row).
+        """
+        import numpy as np
+        keys = np.asarray(keys, dtype=np.intp)
+        table = np.array(self.table, dtype=np.uint64)
+        h = np.bitwise_xor.reduce(table[np.arange(keys.shape[1]), keys],
+                                  axis=1)
+        return h % np.uint64(self.modulo)
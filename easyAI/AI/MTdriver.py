@@ -17,16 +17,16 @@ def mt(game, gamma, depth, origDepth, scoring, tt=None):
     lowerbound, upperbound = -inf, inf
     best_move = None
     
-    if lookup != None and lookup['depth'] >= depth:
+    if lookup != None and lookup.depth >= depth:
         # The game has been visited in the past
-        lowerbound, upperbound = lookup['lowerbound'], lookup['upperbound']
+        lowerbound, upperbound = lookup.lowerbound, lookup.upperbound
         if lowerbound > gamma:
             if depth == origDepth:
-                game.ai_move = lookup['move']
+                game.ai_move = lookup.move
             return lowerbound
         if upperbound < gamma:
             if depth == origDepth:
-                game.ai_move = lookup['move']
+                game.ai_move = lookup.move
             return upperbound
             
     best_value = -inf
@@ -35,21 +35,33 @@ def mt(game, gamma, depth, origDepth, scoring, tt=None):
         score = game.scoring()
         
         if score != 0:
-            score = (score - 0.99*depth*abs(score)/score)
+            score = (score - 0.01*depth*abs(score)/score)
         
         lowerbound = upperbound = best_value = score
     else:
         ngame = game
         unmake_move = hasattr(game, 'unmake_move')
-        possible_moves = game.possible_moves()
+        scores = None
+        if depth == 1 and hasattr(game, 'evaluate_moves'):
+            # All the children are leaves: score them at once
+            possible_moves, scores = game.evaluate_moves()
+        else:
+            possible_moves = game.possible_moves()
         best_move = possible_moves[0]
     
         if not hasattr(game, 'ai_move'):
             game.ai_move = best_move
         
-        for move in possible_moves:
+        for i, move in enumerate(possible_moves):
             if best_value >= gamma: break
             
+            if scores is not None:
+                move_value = -scores[i]
+                if best_value < move_value:
+                    best_value = move_value
+                    best_move = move
+                continue
+            
             if not unmake_move:
                 ngame = game.copy()
                 
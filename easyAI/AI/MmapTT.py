@@ -0,0 +1,147 @@
+"""
+This module implements a read-only transposition table mapped in
+memory from a file, which can be shared by several processes.
+"""
+
+import mmap
+import pickle
+import struct
+from hashlib import blake2b
+
+from easyAI.AI.TT import Entry
+
+MASK = 2**64 - 1
+
+# file of a table: a header (magic, version, number of slots, number of
+# entries and size of the pickled moves), the slots of the open-addressed
+# table and the pickled moves. A slot holds the hash of the position (0 if
+# the slot is free), its bounds, the index of its move and its depth.
+MAGIC = b'EMT1'
+HEADER = struct.Struct('<4sHxxQQQ')
+SLOT = struct.Struct('<Qddii')
+
+
+def stablehash(key):
+    """ Returns a non zero 64-bit hash of a key of the table which is the
+        same in every process (unlike ``hash`` for strings). """
+    if type(key) is int:
+        h = (hash(key) * 0x9E3779B97F4A7C15) & MASK
+    else:
+        h = int.from_bytes(blake2b(repr(key).encode(), digest_size=8).digest(),
+                           'little')
+    return h or 1
+
+
+class MmapTT:
+    """
+    A transposition table read from a file mapped in memory.
+
+    The file is not loaded: the lookups read the mapped pages, so the
+    table is opened instantly and all the processes using the same file
+    share one copy of it in the page cache. The file is written once by
+    **save** from another table, e.g. a table filled by ``id_solve``:
+
+        >>> table = TT()
+        >>> id_solve(game, range(2, 12), win_score=90, tt=table)
+        >>> MmapTT.save(table, 'solved.tt')
+
+        >>> # in every client
+        >>> ai = Negamax(8, tt=MmapTT('solved.tt', overlay=TT()))
+
+    The mapped table is read-only. The entries stored during a search go
+    to the **overlay**, a private table which is looked up first (they
+    are dropped if there is none).
+
+    The positions are identified by a 64-bit hash of ``game.ttentry()``
+    (see ``stablehash``), in a table with linear probing.
+    """
+
+    def __init__(self, filename, overlay=None):
+        self.overlay = overlay
+        with open(filename, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slots, count, size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError("%s is not a transposition table" % filename)
+        self.slots = slots
+        self.count = count
+        self.shift = 64 - (slots.bit_length() - 1)
+        offset = HEADER.size + slots * SLOT.size
+        self.moves = pickle.loads(self.map[offset:offset + size])
+
+    @staticmethod
+    def save(table, filename, load_factor=0.5):
+        """ Writes the entries of a table (``TT``) to a file which can
+            be mapped by ``MmapTT``. """
+        count = len(table.d)
+        slots = 2
+        while slots * load_factor < count or slots <= count:
+            slots *= 2
+        shift = 64 - (slots.bit_length() - 1)
+        data = bytearray(slots * SLOT.size)
+        moves, move_index = [], {}
+        for key in table.d:
+            entry = table.d[key]
+            index = move_index.get(entry.move)
+            if index is None:
+                index = move_index[entry.move] = len(moves)
+                moves.append(entry.move)
+            h = stablehash(key)
+            slot = h >> shift
+            while True:
+                stored = SLOT.unpack_from(data, slot * SLOT.size)[0]
+                if stored == 0 or stored == h:
+                    break
+                slot = (slot + 1) & (slots - 1)
+            SLOT.pack_into(data, slot * SLOT.size, h, entry.lowerbound,
+                           entry.upperbound, index, entry.depth)
+        blob = pickle.dumps(moves, pickle.HIGHEST_PROTOCOL)
+        with open(filename, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 1, slots, count, len(blob)))
+            f.write(data)
+            f.write(blob)
+
+    def _find(self, game):
+        h = stablehash(game.ttentry())
+        slot = h >> self.shift
+        while True:
+            stored, lowerbound, upperbound, move, depth = SLOT.unpack_from(
+                self.map, HEADER.size + slot * SLOT.size)
+            if stored == h:
+                return Entry(depth, lowerbound, upperbound, self.moves[move])
+            if stored == 0:
+                return None
+            slot = (slot + 1) & (self.slots - 1)
+
+    def lookup(self, game):
+        """ Requests the entry in the overlay, then in the mapped
+            table. Returns None if the position is in neither. """
+        if self.overlay is not None:
+            entry = self.overlay.lookup(game)
+            if entry is not None:
+                return entry
+        return self._find(game)
+
+    def store(self, game, **data):
+        """ Stores an entry into the overlay (if any). """
+        if self.overlay is not None:
+            self.overlay.store(game, **data)
+
+    def age(self):
+        if self.overlay is not None:
+            self.overlay.age()
+
+    def close(self):
+        self.map.close()
+
+    def __len__(self):
+        return self.count + (0 if self.overlay is None else len(self.overlay))
+
+    def __call__(self, game):
+        """
+        This method enables the transposition table to be used
+        like an AI algorithm. However it will just break if it falls
+        on some game state that is not in the table.
+        """
+        return self.lookup(game).move
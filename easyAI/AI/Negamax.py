@@ -9,13 +9,15 @@ LOWERBOUND, EXACT, UPPERBOUND = -1,0,1
 inf = float('infinity')
 
 def negamax(game, depth, origDepth, scoring, alpha=+inf, beta=-inf,
-             tt=None):
+             tt=None, batch=False):
     """
     This implements Negamax with transposition tables.
     This method is not meant to be used directly. See ``easyAI.Negamax``
     for an example of practical use.
     This function is implemented (almost) acccording to
     http://en.wikipedia.org/wiki/Negamax
+    If ``batch`` is set, the last layer before the leaves is scored with
+    a single call to ``game.evaluate_moves()``.
     """
     
     alphaOrig = alpha
@@ -26,21 +28,20 @@ def negamax(game, depth, origDepth, scoring, alpha=+inf, beta=-inf,
     if lookup != None:
         # The game has been visited in the past
         
-        if lookup['depth'] >= depth:
-            flag, value = lookup['flag'], lookup['value']
-            if flag == EXACT:
+        if lookup.depth >= depth:
+            # The entries hold bounds so that they can be shared with mt
+            lowerbound, upperbound = lookup.lowerbound, lookup.upperbound
+            if lowerbound == upperbound:
                 if depth == origDepth:
-                    game.ai_move = lookup['move']
-                return value
-            elif flag == LOWERBOUND:
-                alpha = max( alpha, value)
-            elif flag == UPPERBOUND:
-                beta = min( beta, value)
-                
-            if alpha >= beta:
+                    game.ai_move = lookup.move
+                return lowerbound
+            
+            if lowerbound >= beta or upperbound <= alpha:
                 if depth == origDepth:
-                    game.ai_move = lookup['move']
-                return value
+                    game.ai_move = lookup.move
+                return lowerbound if lowerbound >= beta else upperbound
+            alpha = max( alpha, lowerbound)
+            beta = min( beta, upperbound)
         
         
         
@@ -52,11 +53,16 @@ def negamax(game, depth, origDepth, scoring, alpha=+inf, beta=-inf,
             return  (score - 0.01*depth*abs(score)/score)
     
     
-    if lookup != None:
+    scores = None
+    if batch and depth == 1:
+        # All the children are leaves: score them at once
+        possible_moves, scores = game.evaluate_moves()
+
+    elif lookup != None:
         # Put the supposedly best move first in the list
         possible_moves = game.possible_moves()
-        possible_moves.remove(lookup['move'])
-        possible_moves = [lookup['move']] + possible_moves
+        possible_moves.remove(lookup.move)
+        possible_moves = [lookup.move] + possible_moves
         
     else:
         
@@ -73,20 +79,24 @@ def negamax(game, depth, origDepth, scoring, alpha=+inf, beta=-inf,
     unmake_move = hasattr(state, 'unmake_move')
     
     
-    for move in possible_moves:
-        
-        if not unmake_move:
-            game = state.copy() # re-initialize move
+    for i, move in enumerate(possible_moves):
         
-        game.make_move(move)
-        game.switch_player()
+        if scores is not None:
+            move_alpha = - scores[i]
         
-        move_alpha = - negamax(game, depth-1, origDepth, scoring,
-                               -beta, -alpha, tt)
-        
-        if unmake_move:
+        else:
+            if not unmake_move:
+                game = state.copy() # re-initialize move
+            
+            game.make_move(move)
             game.switch_player()
-            game.unmake_move(move)
+            
+            move_alpha = - negamax(game, depth-1, origDepth, scoring,
+                                   -beta, -alpha, tt, batch)
+            
+            if unmake_move:
+                game.switch_player()
+                game.unmake_move(move)
         
         # bestValue = max( bestValue,  move_alpha )
         if bestValue < move_alpha:
@@ -104,10 +114,11 @@ def negamax(game, depth, origDepth, scoring, alpha=+inf, beta=-inf,
     if tt != None:
         
         assert best_move in possible_moves
-        tt.store(game=state, depth=depth, value = bestValue,
-                 move= best_move,
-                 flag = UPPERBOUND if (bestValue <= alphaOrig) else (
-                        LOWERBOUND if (bestValue >= beta) else EXACT))
+        flag = UPPERBOUND if (bestValue <= alphaOrig) else (
+               LOWERBOUND if (bestValue >= beta) else EXACT)
+        tt.store(game=state, depth=depth, move= best_move,
+                 lowerbound = -inf if (flag == UPPERBOUND) else bestValue,
+                 upperbound = +inf if (flag == LOWERBOUND) else bestValue)
 
     return bestValue
 
@@ -146,6 +157,9 @@ class Negamax:
       scoring: can be none if the game that the AI will be given has a
       ``scoring`` method.
       
+    When no scoring is provided and the game has an ``evaluate_moves``
+    method, it is used to score the last layer of the tree in one call.
+      
     Notes
     -----
    
@@ -178,6 +192,7 @@ class Negamax:
         scoring = self.scoring if self.scoring else (
                        lambda g: g.scoring() ) # horrible hack
                        
+        batch = (self.scoring is None) and hasattr(game, 'evaluate_moves')
         self.alpha = negamax(game, self.depth, self.depth, scoring,
-                     -self.win_score, +self.win_score, self.tt)
+                     -self.win_score, +self.win_score, self.tt, batch)
         return game.ai_move
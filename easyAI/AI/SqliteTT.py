@@ -0,0 +1,142 @@
+"""
+This module implements a persistent transposition table stored in a
+SQLite database, which accumulates the positions searched in all the
+games played.
+"""
+
+import ast
+import sqlite3
+import threading
+
+from easyAI.AI.BoundedTT import BoundedTT
+from easyAI.AI.TT import Entry
+
+# an entry replaces the stored one if its search was at least as deep
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    lowerbound REAL,
+    upperbound REAL,
+    move TEXT
+) WITHOUT ROWID
+"""
+UPSERT = """
+INSERT INTO entries VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET
+    depth = excluded.depth, lowerbound = excluded.lowerbound,
+    upperbound = excluded.upperbound, move = excluded.move
+WHERE excluded.depth >= entries.depth
+"""
+
+
+class SqliteTT:
+    """
+    A transposition table kept in a SQLite database, so that the
+    positions searched in a game are known in the next ones:
+
+        >>> table = SqliteTT('quarto.db')
+        >>> ai = Negamax(8, tt = table)
+        >>> # ... play ...
+        >>> table.close() # writes the last entries
+
+    The entries are looked up in ``cache`` (by default a ``BoundedTT``
+    within the memory budget of the process, ``False`` for no cache),
+    then in the database, and are written to the database in
+    transactions of ``batch_size`` entries (and by **flush**, called
+    by ``id_solve`` after each depth). An entry replaces the stored one
+    only if its search was at least as deep.
+
+    The database is in WAL mode: several processes (e.g. the bots of a
+    host) can read it while one of them writes. The keys and the moves
+    are stored as their ``repr``, and the moves are read back with
+    ``ast.literal_eval``: they must be literals (ints, strings, tuples,
+    lists...), and the database never runs code.
+    """
+
+    def __init__(self, filename, cache=None, batch_size=1000, timeout=30.0):
+        if cache is None:
+            cache = BoundedTT()
+        self.cache = cache if cache is not False else None
+        self.batch_size = batch_size
+        self.pending = {}
+        # the table can be used by the thread of a pondering search
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, timeout=timeout,
+                                  check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.execute(SCHEMA)
+
+    def lookup(self, game):
+        """ Requests the entry in the cache, then in the database.
+            Returns None if the position is in neither. """
+        if self.cache is not None:
+            entry = self.cache.lookup(game)
+            if entry is not None:
+                return entry
+        key = repr(game.ttentry())
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                row = self.db.execute(
+                    'SELECT depth, lowerbound, upperbound, move FROM entries '
+                    'WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                depth, lowerbound, upperbound, move = row
+                entry = Entry(depth, lowerbound, upperbound,
+                              ast.literal_eval(move))
+        if self.cache is not None:
+            self.cache.store(game, **entry._asdict())
+        return entry
+
+    def store(self, game, depth=0, lowerbound=None, upperbound=None,
+              move=None, value=None):
+        """ Stores an entry into the cache, and into the database with
+            the next batch. """
+        if value is not None:
+            lowerbound = upperbound = value
+        if self.cache is not None:
+            self.cache.store(game, depth=depth, lowerbound=lowerbound,
+                             upperbound=upperbound, move=move)
+        key = repr(game.ttentry())
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None or entry.depth <= depth:
+                self.pending[key] = Entry(depth, lowerbound, upperbound, move)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """ Writes the pending entries to the database, in one
+            transaction. """
+        with self.lock:
+            rows = [(key, entry.depth, entry.lowerbound, entry.upperbound,
+                     repr(entry.move))
+                    for key, entry in self.pending.items()]
+            with self.db:
+                self.db.executemany(UPSERT, rows)
+            self.pending = {}
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def age(self):
+        if self.cache is not None:
+            self.cache.age()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def __call__(self, game):
+        """
+        This method enables the transposition table to be used
+        like an AI algorithm. However it will just break if it falls
+        on some game state that is not in the table.
+        """
+        return self.lookup(game).move
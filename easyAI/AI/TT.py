@@ -3,9 +3,49 @@ This module implements transposition tables, which store positions
 and moves to speed up the AI.
 """
 
+import gc
 import pickle
 import json
+import struct
+import sys
+from array import array
 from ast import literal_eval as make_tuple
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from itertools import repeat
+
+# binary file of a table: magic, version, number of entries and size of the
+# pickled keys and moves, followed by the keys and moves and then the depths,
+# lowerbounds and upperbounds of the entries packed in arrays
+MAGIC = b'ETT1'
+HEADER = struct.Struct('<4sHxxQQ')
+
+
+@contextmanager
+def _nogc():
+    """ Pauses the garbage collector, which would scan the table again
+        and again while millions of entries are created. """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class Entry(namedtuple('Entry', 'depth lowerbound upperbound move')):
+    """
+    An entry of a transposition table: a tuple (much smaller than a
+    dictionary) of the depth of the search, the bounds of the value of
+    the position and the best move found.
+    """
+    __slots__ = ()
+
+    @property
+    def value(self):
+        """ The value of a position stored with exact bounds. """
+        return self.lowerbound
 
 
 class TT:
@@ -23,10 +63,10 @@ class TT:
     Transposition tables can only be used on games which have a method
     game.ttentry() -> string or tuple
 
-    To save the table as a `pickle` file, use the **tofile** and **fromfile**
-    methods. A pickle file is binary and usually faster. A pickle file
-    can also be appended to with new cached data. See python's pickle
-    documentation for secuirty issues.
+    To save the table as a binary file, use the **tofile** and **fromfile**
+    methods. The numbers of the entries are written and read in bulk, only
+    the keys and the moves are pickled: see python's pickle documentation
+    for security issues.
 
     To save the table as a universal JSON file, use the **to_json_file**
     and **from_json_file** methods. For these methods, you must explicity
@@ -48,15 +88,39 @@ class TT:
     but they must be exhaustive in this case: if they are asked for
     a position that isn't stored in the table, it will lead to an error.
 
+    A table can be kept for a whole game and bounded with **max_entries**:
+    when the table is full, the entry which was not used for the longest
+    time is replaced first.
+
+        >>> table = TT(max_entries=100000)
+        >>> ai = Negamax(8, tt = table)
+
     """
 
-    def __init__(self, own_dict=None):
-        self.d = own_dict if own_dict is not None else dict()
+    def __init__(self, own_dict=None, max_entries=None):
+        self.max_entries = max_entries
+        if own_dict is not None:
+            self.d = own_dict
+        else:
+            # the entries are kept from the least to the most recently used
+            self.d = OrderedDict() if max_entries else dict()
 
     def lookup(self, game):
         """ Requests the entry in the table. Returns None if the
             entry has not been previously stored in the table. """
-        return self.d.get(game.ttentry(), None)
+        if not self.max_entries:
+            return self.d.get(game.ttentry(), None)
+        key = game.ttentry()
+        entry = self.d.get(key, None)
+        if entry is not None:
+            # still useful: replaced last
+            self.d.move_to_end(key)
+        return entry
+
+    def age(self):
+        """ Starts a new search. Nothing to do: the entries which were
+            not used recently are always replaced first. """
+        pass
 
     def __call__(self, game):
         """
@@ -68,24 +132,71 @@ class TT:
         >>> # negamax boosted with a transposition table !
         >>> Negamax(10, tt= my_dictTT)
         """
-        return self.d[game.ttentry()]['move']
-
-    def store(self, **data):
-        """ Stores an entry into the table """
-        entry = data.pop("game").ttentry()
-        self.d[entry] = data
+        return self.d[game.ttentry()].move
+
+    def store(self, game, depth=0, lowerbound=None, upperbound=None,
+              move=None, value=None):
+        """ Stores an entry into the table. A value (``df_solve``)
+            is stored as two equal bounds. """
+        if value is not None:
+            lowerbound = upperbound = value
+        key = game.ttentry()
+        self.d[key] = Entry(depth, lowerbound, upperbound, move)
+        if self.max_entries:
+            self.d.move_to_end(key)
+            if len(self.d) > self.max_entries:
+                # replace the least recently used entry
+                self.d.popitem(last=False)
+
+    def __len__(self):
+        return len(self.d)
 
     def tofile(self, filename):
-        """ Saves the transposition table to a file. Warning: the file
-            can be big (~100Mo). """
-        with open(filename, 'w+') as f:
-            pickle.dump(self, f)
+        """ Saves the transposition table to a binary file. Warning: the
+            file can be big (~100Mo). """
+        keys = list(self.d)
+        if isinstance(self.d, dict):
+            entries = list(self.d.values())
+        else:
+            entries = [self.d[key] for key in keys]
+        with _nogc():
+            depths, lowerbounds, upperbounds, moves = (
+                zip(*entries) if entries else ((), (), (), ()))
+        blob = pickle.dumps((keys, list(moves)), pickle.HIGHEST_PROTOCOL)
+        fields = [array('q', depths), array('d', lowerbounds),
+                  array('d', upperbounds)]
+        with open(filename, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 1, len(keys), len(blob)))
+            f.write(blob)
+            for field in fields:
+                if sys.byteorder == 'big':
+                    field.byteswap()
+                field.tofile(f)
 
     def fromfile(self, filename):
         """ Loads a transposition table previously saved with
-             ``TT.tofile`` """
-        with open(filename, 'r') as h:
-            self.__dict__.update(pickle.load(h).__dict__)
+             ``TT.tofile`` and returns it. """
+        with open(filename, 'rb') as f:
+            magic, version, n, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("%s is not a transposition table" % filename)
+            with _nogc():
+                keys, moves = pickle.loads(f.read(size))
+            fields = [array('q'), array('d'), array('d')]
+            for field in fields:
+                field.fromfile(f, n)
+                if sys.byteorder == 'big':
+                    field.byteswap()
+        # tuple.__new__ builds the entries without calling Python code
+        entries = zip(keys, map(tuple.__new__, repeat(Entry),
+                                zip(*(fields + [moves]))))
+        with _nogc():
+            if isinstance(self.d, dict):
+                self.d = type(self.d)(entries)
+            else:
+                for key, entry in entries:
+                    self.d[key] = entry
+        return self
 
     def to_json_file(self, filename, use_tuples=False):
         """ Saves the transposition table to a serial JSON file. Warning: the file
@@ -98,18 +209,18 @@ class TT:
                 json.dump(dict(zip(*[k1, v])), f, ensure_ascii=False)
         else:
             with open(filename, 'w') as f:
-                json.dump(self.d, f, ensure_ascii=True, indent=3)
+                json.dump(self.d, f, ensure_ascii=True)
 
     def from_json_file(self, filename, use_tuples=False):
         """ Loads a transposition table previously saved with
              ``TT.to_json_file`` """
         with open(filename, 'r') as f:
-            data = f.read().decode("utf-8")
+            data = f.read()
             if use_tuples:
                 data = json.loads(data)
                 k = data.keys()
-                v = data.values()
+                v = [Entry(*e) for e in data.values()]
                 k1 = [make_tuple(i) for i in k]
                 self.d = dict(zip(*[k1, v]))
             else:
-                self.d = json.loads(data)
+                self.d = {k: Entry(*e) for k, e in json.loads(data).items()}
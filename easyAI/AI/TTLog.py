@@ -0,0 +1,155 @@
+"""
+This module implements an append-only log of transposition table
+entries, written while a long search is running and read back
+incrementally.
+"""
+
+import os
+import pickle
+import struct
+import time
+
+from easyAI.AI.TT import TT, Entry
+
+# the log starts with MAGIC, then each record is the size of the pickled
+# (key, depth, lowerbound, upperbound, move) followed by the pickle
+MAGIC = b'ETL1'
+SIZE = struct.Struct('<I')
+
+
+def _records(f, chunk_size):
+    """ Reads the complete records from the current position of the
+        file, in lists of at most ``chunk_size`` (key, entry). The file
+        is left at the beginning of the first incomplete record. """
+    chunk = []
+    while True:
+        start = f.tell()
+        header = f.read(SIZE.size)
+        if len(header) == SIZE.size:
+            size = SIZE.unpack(header)[0]
+            data = f.read(size)
+        if len(header) < SIZE.size or len(data) < size:
+            # end of the log (or a record still being written)
+            f.seek(start)
+            break
+        key, depth, lowerbound, upperbound, move = pickle.loads(data)
+        chunk.append((key, Entry(depth, lowerbound, upperbound, move)))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _open(filename):
+    f = open(filename, 'rb')
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError("%s is not a transposition table log" % filename)
+    return f
+
+
+def read_log(filename, chunk_size=10000):
+    """
+    Reads a log lazily: yields the entries in lists of at most
+    ``chunk_size`` (key, entry) pairs. The later entries of a position
+    replace the earlier ones, e.g.
+
+        >>> table = TT()
+        >>> for chunk in read_log('solve.log'):
+        ...     table.d.update(chunk)
+    """
+    with _open(filename) as f:
+        for chunk in _records(f, chunk_size):
+            yield chunk
+
+
+def tail_log(filename, chunk_size=10000, interval=1.0, stop=None):
+    """ Like ``read_log``, but waits for the entries appended to the log
+        (checking every ``interval`` seconds) until the event ``stop``
+        is set. """
+    with _open(filename) as f:
+        while stop is None or not stop.is_set():
+            found = False
+            for chunk in _records(f, chunk_size):
+                found = True
+                yield chunk
+            if not found:
+                time.sleep(interval)
+
+
+def load_log(filename, table=None):
+    """ Loads the entries of a log into ``table`` (a new ``TT`` by
+        default) and returns it. """
+    if table is None:
+        table = TT()
+    for chunk in read_log(filename):
+        for key, entry in chunk:
+            table.d[key] = entry
+    return table
+
+
+class LogTT:
+    """
+    A transposition table which appends the entries stored in it to a
+    log, so that a long search can be checkpointed and resumed:
+
+        >>> table = LogTT(TT(), 'solve.log')
+        >>> id_solve(game, range(2, 20), win_score=90, tt=table)
+
+        >>> # later, or in a process following the search
+        >>> table = load_log('solve.log')
+
+    The entries are kept in memory and written by blocks of
+    ``flush_every`` entries, and by **flush** (``id_solve`` flushes
+    the log after each depth). The log is created if it does not exist,
+    otherwise the entries are appended to it.
+    """
+
+    def __init__(self, table, filename, flush_every=10000):
+        self.table = table
+        self.flush_every = flush_every
+        self.pending = []
+        new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self.file = open(filename, 'ab')
+        if new:
+            self.file.write(MAGIC)
+
+    def lookup(self, game):
+        return self.table.lookup(game)
+
+    def store(self, game, depth=0, lowerbound=None, upperbound=None,
+              move=None, value=None):
+        """ Stores an entry into the table and the log. """
+        if value is not None:
+            lowerbound = upperbound = value
+        self.table.store(game, depth=depth, lowerbound=lowerbound,
+                         upperbound=upperbound, move=move)
+        self.pending.append((game.ttentry(), depth, lowerbound, upperbound,
+                             move))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """ Writes the pending entries at the end of the log. """
+        records = []
+        for record in self.pending:
+            data = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+            records.append(SIZE.pack(len(data)))
+            records.append(data)
+        self.file.write(b''.join(records))
+        self.file.flush()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def age(self):
+        self.table.age()
+
+    def __len__(self):
+        return len(self.table)
+
+    def __call__(self, game):
+        return self.table(game)
@@ -5,4 +5,14 @@ from .solving import id_solve, df_solve
 from .MTdriver import mtd
 from .SSS import SSS
 from .DUAL import DUAL
-from .HashTT import HashTT
\ No newline at end of file
+from .HashTT import HashTT
+from .Hashes import FNVHashTT, MixHashTT, JSWHashTT, ZobristHashTT
+from .BoundedTT import BoundedTT, MemoryBudget, memory_budget
+from .MmapTT import MmapTT
+from .ChunkTT import ChunkTT
+from .SqliteTT import SqliteTT
+from .TTLog import LogTT, read_log, tail_log, load_log
+try:
+    from .ArrayTT import ArrayTT
+except ImportError:
+    pass # ArrayTT requires Numpy
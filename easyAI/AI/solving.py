@@ -71,6 +71,8 @@ def id_solve(game, ai_depths, win_score, scoring=None,
         alpha = ai.alpha
         if verbose:
              print( "d:%d, a:%d, m:%s"%(depth, alpha, str(game.ai_move)))
+        if hasattr(tt, 'flush'):
+            tt.flush() # checkpoint (see LogTT)
         if abs(alpha) >= win_score:
             break
     
@@ -131,7 +133,7 @@ def df_solve(game, win_score, maxdepth=50, tt=None, depth=0):
     # Is there a transposition table and is this game in it ?
     lookup = None if (tt is None) else tt.lookup(game)
     if lookup != None:
-        return lookup['value']
+        return lookup.value
         
     if (depth == maxdepth):
         raise "Max recursion depth reached :("
@@ -18,6 +18,8 @@ class TwoPlayersGame:
     - ``show(self)`` : prints/displays the game
     - ``scoring``: gives a score to the current game (for the AI)
     - ``unmake_move(self, move)``: how to unmake a move (speeds up the AI)
+    - ``evaluate_moves(self)``: returns ``(moves, scores)`` where ``scores[i]``
+      is the ``scoring`` of the game after ``moves[i]`` (speeds up the AI)
     - ``ttentry(self)``: returns a string/tuple describing the game.
     - ``ttrestore(self, entry)``: use string/tuple from ttentry to restore a game.
     
@@ -132,3 +132,4 @@ if __name__ == "__main__":
     print('Statistics of custom dictionary:')
     print('Calls of hash: ', dict_tt.num_calls)
     print('Collisions: ', dict_tt.num_collisions)
+    print(dict_tt.stats())
@@ -3,14 +3,35 @@
 # Version: April 20, 2016
 
 from abc import *
+import asyncio
 import copy
+import inspect
 import json
 import socket
+import struct
 import sys
+import time
+import zlib
+
+from . import metrics, recorder
+from .transport import TCP
 
 DEFAULT_BUFFER_SIZE = 2048
 SECTION_WIDTH = 60
 
+# Version of the protocol: 1 sends each message as it is (read with a single recv),
+# 2 sends each message in a frame, prefixed with its size on 4 bytes (big-endian)
+PROTOCOL_VERSION = 2
+FRAME = struct.Struct('>I')
+# the first byte of a frame is always 0, unlike the first letter of a message
+MAX_FRAME_SIZE = 2**24 - 1
+# features of the version 2: the states are sent in binary (see GameState.tobytes),
+# the players receive the moves played since their last turn instead of the state,
+# the players stay connected to play game after game (NEWGAME instead of closing)
+BINARY_STATE = 'STATE=binary'
+DELTA_UPDATES = 'UPDATES=delta'
+SESSION = 'GAMES=session'
+
 
 def _printsection(title):
     print()
@@ -23,6 +44,349 @@ class InvalidMoveException(Exception):
         super().__init__(message)
 
 
+def _readytokens(data):
+    '''Return the name of the player (or None), the version of the protocol and the
+    features announced in a READY message ('READY [name] [PROTO=version] [features]').'''
+    name, version, features = None, 1, set()
+    for token in data.split(' ')[1:]:
+        if token.startswith('PROTO='):
+            version = int(token[len('PROTO='):])
+        elif '=' in token:
+            features.add(token)
+        elif token:
+            name = token
+    return name, min(version, PROTOCOL_VERSION), features
+
+
+def _implements(stateclass, *names):
+    # the methods are not the stubs of GameState
+    return all(inspect.getattr_static(stateclass, name) is not inspect.getattr_static(GameState, name)
+               for name in names)
+
+
+def _statefeatures(stateclass):
+    '''Return the features of the protocol supported by the states of 'stateclass': the
+    class says so (binary, delta) and implements the methods they need.'''
+    features = set()
+    if stateclass.binary() and _implements(stateclass, 'tobytes', 'frombytes'):
+        features.add(BINARY_STATE)
+    if stateclass.delta() and _implements(stateclass, 'update'):
+        features.add(DELTA_UPDATES)
+    return features
+
+
+def _acceptedfeatures(version, features, stateclass, sessions=False):
+    '''Return the features announced by a client which the server accepts ('sessions' if
+    the server can play several games with a client).'''
+    accepted = set()
+    if version >= 2:
+        accepted.update(_statefeatures(stateclass) & set(features))
+    if version >= 2 and SESSION in features and sessions:
+        accepted.add(SESSION)
+    return accepted
+
+
+class _History:
+    '''Class representing the moves applied to the state of a game, to send to each player
+    the state or, with delta updates, the moves played since its last turn.'''
+    def __init__(self, nbplayers):
+        self.moves = []     # None for an invalid move (the turn passes to the next player)
+        self.sent = [None] * nbplayers
+
+    def message(self, i, player, state):
+        '''Return the message giving the turn to play to the player 'i'.
+
+        With delta updates, the message is 'MOVES seq checksum moves' where 'seq' is the
+        number of moves applied to the state, 'checksum' the one of the resulting state
+        and 'moves' the JSON list of the moves since the last turn of the player. The
+        first time, or if the player asked to RESYNC, the message is 'SYNC seq state'.
+        '''
+        if player.delta and self.sent[i] is not None:
+            message = 'MOVES {} {} {}'.format(len(self.moves), state.checksum(),
+                                              json.dumps(self.moves[self.sent[i]:]))
+        else:
+            command = 'SYNC {} '.format(len(self.moves)) if player.delta else 'PLAY '
+            message = command.encode() + state.tobytes() if player.binary else command + str(state)
+        self.sent[i] = len(self.moves)
+        return message
+
+    def resync(self, i):
+        self.sent[i] = None
+
+
+class Clock:
+    '''Class representing the chess clock of a game: each move must be played within
+    'movetime' seconds and/or each player has 'gametime' seconds for the whole game,
+    credited with 'increment' seconds after each move (None for no limit).
+
+    Before each turn, the players of the version 2 receive 'CLOCK limit remaining': the
+    seconds to play the move and the seconds left in the game ('-' for no limit). A
+    player who does not answer in time loses the game.
+    '''
+    def __init__(self, nbplayers, movetime=None, gametime=None, increment=0):
+        self.movetime = movetime
+        self.increment = increment
+        self.remaining = [gametime] * nbplayers
+        self.__start = None
+
+    @property
+    def enabled(self):
+        return self.movetime is not None or self.remaining[0] is not None
+
+    def limit(self, i):
+        '''Return the seconds that the player 'i' has to play its move (None for no limit).'''
+        limits = [t for t in (self.movetime, self.remaining[i]) if t is not None]
+        return min(limits) if limits else None
+
+    def message(self, i):
+        limit, remaining = self.limit(i), self.remaining[i]
+        return 'CLOCK {:.3f} {}'.format(limit, '-' if remaining is None else '{:.3f}'.format(remaining))
+
+    def start(self):
+        self.__start = time.monotonic()
+
+    def left(self, i):
+        '''Return the seconds left to the player 'i' to play its move (None for no limit),
+        never 0 which would make a socket non-blocking.'''
+        limit = self.limit(i)
+        return None if limit is None else max(0.001, limit - (time.monotonic() - self.__start))
+
+    def stop(self, i):
+        '''Stop the clock of the player 'i' after its move, and return whether it was in time.'''
+        elapsed = time.monotonic() - self.__start
+        limit = self.limit(i)
+        if self.remaining[i] is not None:
+            self.remaining[i] -= elapsed
+            self.remaining[i] += self.increment
+        return limit is None or elapsed <= limit
+
+
+def _applymove(game, move, metrics):
+    '''Apply a move to the game, with the time of its validation in the metrics.'''
+    start = time.perf_counter()
+    try:
+        game.applymove(move)
+    except InvalidMoveException:
+        metrics.invalid.inc()
+        raise
+    finally:
+        metrics.validation.observe(time.perf_counter() - start)
+
+
+def _result(winner):
+    return 'draw' if winner is None else winner
+
+
+def _unfinishedproto(data):
+    # the start of a PROTO acknowledgement whose line has not been received in full
+    return data[:len(b'PROTO ')] == b'PROTO '[:len(data)] and b'\n' not in data
+
+
+def _frame(message):
+    data = message.encode() if isinstance(message, str) else message
+    if len(data) > MAX_FRAME_SIZE:
+        raise ValueError('Message of {} bytes too long for a frame'.format(len(data)))
+    return FRAME.pack(len(data)) + data
+
+
+class Channel:
+    '''Class representing the messages exchanged with a peer over a socket (or a connection
+    of another transport, see transport.py).
+
+    The messages are sent as they are until the START/READY handshake agrees on the
+    version 2 of the protocol: the client announces it in READY ('READY PROTO=2'),
+    the server answers 'PROTO 2' and, from then on, both sides send frames, read
+    in full however the network cuts or merges them. The bytes exchanged are counted
+    in 'metrics' (see metrics.GameMetrics), if any.
+    '''
+    def __init__(self, socket, buffersize=DEFAULT_BUFFER_SIZE, metrics=None):
+        self.socket = socket
+        self.buffersize = buffersize
+        self.metrics = metrics
+        self.version = 1
+        self.features = set()
+        self.__buffer = bytearray()
+
+    @property
+    def binary(self):
+        '''Whether the states are sent in binary.'''
+        return BINARY_STATE in self.features
+
+    @property
+    def delta(self):
+        '''Whether the moves are sent instead of the states.'''
+        return DELTA_UPDATES in self.features
+
+    @property
+    def session(self):
+        '''Whether the peer plays game after game on the connection.'''
+        return SESSION in self.features
+
+    def send(self, message):
+        '''Send a message (a string, or bytes in the version 2).'''
+        if self.version >= 2:
+            self._sendall(_frame(message))
+        else:
+            self._sendall(message.encode())
+
+    def _sendall(self, data):
+        self.socket.sendall(data)
+        if self.metrics is not None:
+            self.metrics.sent.inc(len(data))
+
+    def _recv(self, size):
+        data = self.socket.recv(size)
+        if self.metrics is not None:
+            self.metrics.received.inc(len(data))
+        return data
+
+    def recv(self):
+        '''Return the next message, or '' if the connection is closed.'''
+        return self.recvbytes().decode()
+
+    def recvbytes(self):
+        '''Return the next message as bytes, or b'' if the connection is closed.'''
+        if self.version < 2:
+            data = bytes(self.__buffer) or self._recv(self.buffersize)
+            self.__buffer.clear()
+            # the acknowledgement may be cut in several segments
+            while data and _unfinishedproto(data):
+                more = self._recv(self.buffersize)
+                if not more:
+                    return b''
+                data += more
+            if data.startswith(b'PROTO '):
+                # the frames may follow the acknowledgement in the same segment
+                line, _, rest = data.partition(b'\n')
+                tokens = line.decode().split(' ')
+                self.version = int(tokens[1])
+                self.features = set(tokens[2:])
+                self.__buffer += rest
+                return line
+            return data
+        buffer = self.__buffer
+        while True:
+            if len(buffer) >= FRAME.size:
+                size = FRAME.unpack_from(buffer)[0]
+                if size > MAX_FRAME_SIZE:
+                    raise OSError('Invalid frame of {} bytes'.format(size))
+                if len(buffer) >= FRAME.size + size:
+                    message = bytes(buffer[FRAME.size:FRAME.size + size])
+                    del buffer[:FRAME.size + size]
+                    return message
+            data = self._recv(max(self.buffersize, 65536))
+            if not data:
+                return b''
+            buffer += data
+
+    def accept(self, version, features=()):
+        '''Acknowledge the version of the protocol announced by a client and the
+        features accepted by the server (server side), once per connection.'''
+        if version >= 2 and self.version < 2:
+            self._sendall(' '.join(['PROTO', str(version)] + sorted(features)).encode() + b'\n')
+            self.version = version
+            self.features = set(features)
+
+    def settimeout(self, timeout):
+        '''Set the seconds after which recv raises socket.timeout (None to wait forever).'''
+        self.socket.settimeout(timeout)
+
+    def getpeername(self):
+        return self.socket.getpeername()
+
+    def close(self):
+        self.socket.close()
+
+
+class AsyncChannel:
+    '''Class representing the messages exchanged with a peer over asyncio streams
+    (see Channel).'''
+    def __init__(self, reader, writer, buffersize=DEFAULT_BUFFER_SIZE, metrics=None):
+        self.reader = reader
+        self.writer = writer
+        self.buffersize = buffersize
+        self.metrics = metrics
+        self.version = 1
+        self.features = set()
+        self.__buffer = bytearray()
+
+    @property
+    def binary(self):
+        return BINARY_STATE in self.features
+
+    @property
+    def delta(self):
+        return DELTA_UPDATES in self.features
+
+    @property
+    def session(self):
+        return SESSION in self.features
+
+    async def send(self, message):
+        await self._write(_frame(message) if self.version >= 2 else message.encode())
+
+    async def _write(self, data):
+        self.writer.write(data)
+        if self.metrics is not None:
+            self.metrics.sent.inc(len(data))
+        await self.writer.drain()
+
+    def _count(self, data):
+        if self.metrics is not None:
+            self.metrics.received.inc(len(data))
+        return data
+
+    async def _read(self):
+        return self._count(await self.reader.read(self.buffersize))
+
+    async def _readexactly(self, size):
+        # the bytes received after the acknowledgement are read first
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        if len(data) < size:
+            data += self._count(await self.reader.readexactly(size - len(data)))
+        return data
+
+    async def recv(self):
+        '''Return the next message, or '' if the connection is closed.'''
+        return (await self.recvbytes()).decode()
+
+    async def recvbytes(self):
+        '''Return the next message as bytes, or b'' if the connection is closed.'''
+        if self.version < 2:
+            data = bytes(self.__buffer) or await self._read()
+            self.__buffer.clear()
+            while data and _unfinishedproto(data):
+                more = await self._read()
+                if not more:
+                    return b''
+                data += more
+            if data.startswith(b'PROTO '):
+                line, _, rest = data.partition(b'\n')
+                tokens = line.decode().split(' ')
+                self.version = int(tokens[1])
+                self.features = set(tokens[2:])
+                self.__buffer += rest
+                return line
+            return data
+        try:
+            size = FRAME.unpack(await self._readexactly(FRAME.size))[0]
+            if size > MAX_FRAME_SIZE:
+                raise OSError('Invalid frame of {} bytes'.format(size))
+            return await self._readexactly(size)
+        except asyncio.IncompleteReadError:
+            return b''
+
+    async def accept(self, version, features=()):
+        if version >= 2 and self.version < 2:
+            await self._write(' '.join(['PROTO', str(version)] + sorted(features)).encode() + b'\n')
+            self.version = version
+            self.features = set(features)
+
+    def close(self):
+        self.writer.close()
+
+
 class GameState(metaclass=ABCMeta):
     '''Abstract class representing a generic game state.'''
     def __init__(self, visible, hidden=None, currentPlayer=0):
@@ -73,13 +437,59 @@ class GameState(metaclass=ABCMeta):
     def buffersize(cls):
         return DEFAULT_BUFFER_SIZE
 
+    @classmethod
+    def binary(cls):
+        '''Whether the state can be sent in binary (with tobytes and frombytes, which must be
+        implemented for the feature to be announced).'''
+        return False
+
+    def tobytes(self):
+        '''Return the state (visible part and current player) encoded in a few bytes.
+        Pre: The state class supports the binary encoding (see binary).
+        '''
+        raise NotImplementedError
+
+    @classmethod
+    def frombytes(cls, data):
+        '''Return the state encoded by tobytes.'''
+        raise NotImplementedError
+
+    @classmethod
+    def delta(cls):
+        '''Whether the state can be updated with the moves (with update, which must be
+        implemented for the feature to be announced).'''
+        return False
+
+    def update(self, move):
+        '''Apply a move sent to the server and pass to the next player, as the server did.
+        Pre: The state class supports the delta updates (see delta), 'move' was accepted by
+             the server or is None (the move was invalid, only the player changes).
+        '''
+        raise NotImplementedError
+
+    def checksum(self):
+        '''Return a checksum of the state, compared by the clients to the one of the server.'''
+        return zlib.crc32(self.tobytes() if BINARY_STATE in _statefeatures(type(self)) else str(self).encode())
+
 
 class GameServer(metaclass=ABCMeta):
     '''Abstract class representing a generic game server.'''
-    def __init__(self, name, nbplayers, initialstate, verbose=False):
+    def __init__(self, name, nbplayers, initialstate, verbose=False, host='0.0.0.0', port=5000,
+                 movetime=None, gametime=None, increment=0, metricsport=None, recorder=None, transport=None):
         self.__name = name
         self.__nbplayers = nbplayers
         self.__verbose = verbose
+        self.__host = host
+        self.__port = port
+        # TCP sockets by default, or e.g. transport.PipeTransport for the games in memory
+        self.__transport = TCP if transport is None else transport
+        # metrics of the game, served on http://127.0.0.1:metricsport/metrics if not None
+        self.__metrics = metrics.GameMetrics()
+        self.__metricsport = metricsport
+        # time control of the games (see Clock)
+        self.__timecontrol = movetime, gametime, increment
+        # records of the games (see recorder.GameRecorder), if not None
+        self.__recorder = recorder
         self._state = initialstate
         # Stats about the running game
         self.__turns = 0
@@ -100,6 +510,10 @@ class GameServer(metaclass=ABCMeta):
     def turns(self):
         return self.__turns
 
+    @property
+    def metrics(self):
+        return self.__metrics
+
     @abstractmethod
     def applymove(self, move):
         '''Apply a move.
@@ -113,23 +527,27 @@ class GameServer(metaclass=ABCMeta):
     def state(self):
         return copy.deepcopy(self._state)
 
+    def _clock(self):
+        '''Return a new clock with the time control of the server.'''
+        return Clock(self.nbplayers, *self.__timecontrol)
+
+    def _record(self, names, initial, start, moves, times, winner):
+        '''Return the record of a game (see recorder.GameRecorder).'''
+        return {'game': self.name, 'time': round(start, 3), 'players': names, 'state': initial,
+                'moves': moves, 'times': times, 'result': _result(winner)}
+
     def _waitplayers(self):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind(('0.0.0.0', 5000))
-        s.listen(self.nbplayers)
+        s = self.__transport.listen((self.__host, self.__port), self.nbplayers)
         if self.__verbose:
             _printsection('Starting {}'.format(self.name))
-            try:
-                print(' Game server listening on {}:{}.'.format(socket.gethostbyname(socket.gethostname()), 5000))
-            except:
-                print(' Game server listening on port {}.'.format(5000))
+            print(' Game server listening on {}:{}.'.format(*s.getsockname()))
             print(' Waiting for {} players...'.format(self.nbplayers))
         self.__players = []
+        self.__names = []
         # Wait for enough players for a play
         try:
             while len(self.__players) < self.__nbplayers:
-                client = s.accept()[0]
+                client = Channel(s.accept()[0], self._state.__class__.buffersize(), self.__metrics)
                 self.__players.append(client)
                 if self.__verbose:
                     print(' - Client connected from {}:{} ({}/{}).'
@@ -140,21 +558,27 @@ class GameServer(metaclass=ABCMeta):
                 player.close()
             _printsection('Game server ended')
             return False
+        finally:
+            s.close()
         # Notify players that the game started
         try:
             for i in range(len(self.__players)):
                 if self.__verbose:
                     print(' Initialising player {}...'.format(i))
                 player = self.__players[i]
-                player.sendall('START {}'.format(i).encode())
-                data = player.recv(self._state.__class__.buffersize()).decode().split(' ')
-                if data[0] != 'READY':
+                player.send('START {}'.format(i))
+                data = player.recv()
+                if data.split(' ')[0] != 'READY':
                     if self.__verbose:
                         print(' - Player {} not ready to start.'.format(i))
                         _printsection('Current game ended')
                     return False
-                elif self.__verbose:
-                    print(' - Player {} ({}) ready to start.'.format(i, data[1] if len(data) == 2 else 'Anonymous'))
+                name, version, features = _readytokens(data)
+                player.accept(version, _acceptedfeatures(version, features, self._state.__class__))
+                self.__names.append(name)
+                if self.__verbose:
+                    print(' - Player {} ({}) ready to start (protocol {}).'
+                          .format(i, name or 'Anonymous', ' '.join([str(version)] + sorted(player.features))))
         except OSError:
             if self.__verbose:
                 print('Error while notifying player {}.'.format(player))
@@ -169,39 +593,78 @@ class GameServer(metaclass=ABCMeta):
         if self.__verbose:
             print(' Initial state:')
             self._state.prettyprint()
+        history = _History(self.nbplayers)
+        clock = self._clock()
+        initial, starttime, times = recorder.encodestate(self._state), time.time(), []
+        self.__metrics.active.inc()
         # Loop until the game ends with a winner or with a draw
         while winner == -1:
-            player = self.__players[self.currentplayer]
+            i = self.currentplayer
+            player = self.__players[i]
             if self.__verbose:
                 print("\n=> Turn #{} (player {})".format(self.turns, self.currentplayer))
-            player.sendall('PLAY {}'.format(self.state).encode())
+            if clock.enabled and player.version >= 2:
+                player.send(clock.message(i))
+            player.send(history.message(i, player, self._state))
+            clock.start()
+            start = time.perf_counter()
+            move = None
             try:
-                move = player.recv(self._state.__class__.buffersize()).decode()
+                player.settimeout(clock.left(i))
+                move = player.recv()
+                if move == 'RESYNC':
+                    # the state of the player differs from the one of the server
+                    if self.__verbose:
+                        print('   Resynchronising the player')
+                    history.resync(i)
+                    player.send(history.message(i, player, self._state))
+                    player.settimeout(clock.left(i))
+                    move = player.recv()
+                player.settimeout(None)
+                elapsed = time.perf_counter() - start
+                self.__metrics.think.observe(elapsed)
+                if not clock.stop(i):
+                    raise socket.timeout
                 if self.__verbose:
                     print('   Move:', move)
-                self.applymove(move)
+                _applymove(self, move, self.__metrics)
                 self.__turns += 1
             except InvalidMoveException as e:
                 if self.__verbose:
                     print('Invalid move:', e)
-                player.sendall('ERROR {}'.format(e).encode())
+                player.send('ERROR {}'.format(e))
+                move = None
+            except socket.timeout:
+                # the player lost on time
+                player.settimeout(None)
+                self.__metrics.timeouts.inc()
+                winner = (i + 1) % self.nbplayers
+                if self.__verbose:
+                    print('   Player {} ran out of time.'.format(i))
+                break
+            history.moves.append(move)
+            times.append(round(elapsed, 6))
             if self.__verbose:
                 print('   State:')
                 self._state.prettyprint()
             winner = self._state.winner()
             self._state.nextPlayer()
+        self.__metrics.active.dec()
+        self.__metrics.finished.inc(value=_result(winner))
+        if self.__recorder is not None:
+            self.__recorder.record(self._record(self.__names, initial, starttime, history.moves, times, winner))
         if self.__verbose:
             _printsection('Game finished')
         # Notify players about won/lost status
         if winner is not None:
             for i in range(self.nbplayers):
-                self.__players[i].sendall(('WON' if winner == i else 'LOST').encode())
+                self.__players[i].send('WON' if winner == i else 'LOST')
             if self.__verbose:
                 print(' The winner is player {}.'.format(winner))
         # Notify players that the game ended
         else:
             for player in self.__players:
-                player.sendall('END'.encode())
+                player.send('END')
         # Close the connexions with the clients
         for player in self.__players:
             player.close()
@@ -209,42 +672,276 @@ class GameServer(metaclass=ABCMeta):
             _printsection('Game ended')
 
     def run(self):
-        if self._waitplayers():
-            self._gameloop()
+        http = None if self.__metricsport is None else self.__metrics.serve(port=self.__metricsport)
+        try:
+            if self._waitplayers():
+                self._gameloop()
+        finally:
+            if http is not None:
+                http.shutdown()
+
+
+class GameHost:
+    '''Class representing a server hosting many games at once.
+
+    The clients are seated at tables as they connect: as soon as a table has enough
+    players, its game is played in an asyncio task while the next clients are waiting
+    for the next table. Each table plays the game of a new server, created by 'newgame'
+    (a GameServer subclass or any function returning a GameServer), with the same
+    protocol as 'GameServer.run'. The clients which announce a session are sent NEWGAME
+    after their game, and wait for the next table. The metrics of all the games are served on
+    http://127.0.0.1:metricsport/metrics if 'metricsport' is not None, and the games
+    are recorded by 'recorder' (see recorder.GameRecorder) if not None. The clients connect
+    over 'transport' (TCP by default, see transport.py).
+    '''
+    def __init__(self, newgame, host='0.0.0.0', port=5000, games=None, verbose=False, metricsport=None,
+                 recorder=None, transport=None):
+        self.__newgame = newgame
+        self.__host = host
+        self.__port = port
+        self.__games = games
+        self.__verbose = verbose
+        self.__metrics = metrics.GameMetrics()
+        self.__metricsport = metricsport
+        self.__recorder = recorder
+        self.__transport = TCP if transport is None else transport
+        game = newgame()
+        self.__nbplayers = game.nbplayers
+        self.__buffersize = game._state.__class__.buffersize()
+        # Stats about the games played
+        self.__tables = 0
+        self.__results = {}
+
+    @property
+    def results(self):
+        '''Number of games by result: the number of the winning player, None (draw)
+        or 'aborted' (a player left or was not ready).'''
+        return dict(self.__results)
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    def run(self):
+        '''Host 'games' games (or until interrupted if None).'''
+        http = None if self.__metricsport is None else self.__metrics.serve(port=self.__metricsport)
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if http is not None:
+                http.shutdown()
+        if self.__verbose:
+            _printsection('Game server ended')
+            print(' Results:', self.results)
+
+    async def _serve(self):
+        self.__done = asyncio.Event()
+        self.__waiting = []
+        self.__tasks = set()
+        server = await self.__transport.start_server(self._connected, (self.__host, self.__port))
+        if self.__verbose:
+            _printsection('Starting game server')
+            print(' Game server listening on {}:{}.'.format(*server.sockets[0].getsockname()[:2]))
+        async with server:
+            await self.__done.wait()
+            server.close()
+            if self.__tasks:
+                await asyncio.wait(self.__tasks)
+        for player in self.__waiting:
+            player.close()
+
+    async def _connected(self, reader, writer):
+        if self.__games is not None and self.__tables >= self.__games:
+            writer.close()
+            return
+        self._seat(AsyncChannel(reader, writer, self.__buffersize, self.__metrics))
+
+    def _seat(self, player):
+        '''Seat a player at the next table, whose game starts once it is full.'''
+        self.__waiting.append(player)
+        if len(self.__waiting) < self.__nbplayers:
+            return
+        players, self.__waiting = self.__waiting[:self.__nbplayers], self.__waiting[self.__nbplayers:]
+        self.__tables += 1
+        task = asyncio.ensure_future(self._table(self.__tables, self.__newgame(), players))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def _table(self, number, game, players):
+        self.__metrics.active.inc()
+        session = []
+        try:
+            result = await self._gameloop(game, players)
+            if result != 'aborted':
+                # the players of a session stay connected for the next games
+                session = [player for player in players if player.session]
+        except (OSError, asyncio.IncompleteReadError):
+            result = 'aborted'
+        finally:
+            for player in players:
+                if player not in session:
+                    player.close()
+            self.__metrics.active.dec()
+        self.__metrics.finished.inc(value=_result(result))
+        self.__results[result] = self.__results.get(result, 0) + 1
+        if self.__verbose:
+            print(' Table {}: {}'.format(number, 'draw' if result is None else
+                                         result if result == 'aborted' else 'player {} won'.format(result)))
+        for player in session:
+            if self.__games is not None and self.__tables >= self.__games:
+                player.close()
+                continue
+            try:
+                await player.send('NEWGAME')
+            except OSError:
+                player.close()
+            else:
+                self._seat(player)
+        if self.__games is not None and sum(self.__results.values()) >= self.__games:
+            self.__done.set()
+
+    async def _gameloop(self, game, players):
+        # Notify players that the game started
+        names = []
+        for i, player in enumerate(players):
+            await player.send('START {}'.format(i))
+            data = await player.recv()
+            if data.split(' ')[0] != 'READY':
+                return 'aborted'
+            name, version, features = _readytokens(data)
+            await player.accept(version, _acceptedfeatures(version, features, game._state.__class__, sessions=True))
+            names.append(name)
+        history = _History(len(players))
+        clock = game._clock()
+        initial, starttime, times = recorder.encodestate(game._state), time.time(), []
+        # Loop until the game ends with a winner or with a draw
+        winner = -1
+        while winner == -1:
+            i = game.currentplayer
+            player = players[i]
+            if clock.enabled and player.version >= 2:
+                await player.send(clock.message(i))
+            await player.send(history.message(i, player, game._state))
+            clock.start()
+            start = time.perf_counter()
+            try:
+                move = await asyncio.wait_for(player.recv(), clock.left(i))
+                if move == 'RESYNC':
+                    history.resync(i)
+                    await player.send(history.message(i, player, game._state))
+                    move = await asyncio.wait_for(player.recv(), clock.left(i))
+            except asyncio.TimeoutError:
+                # the read may have been cancelled in the middle of a frame, and the late move
+                # would be read in the next game: the player leaves the session after this one
+                player.features.discard(SESSION)
+                move = None
+            if move == '':
+                return 'aborted'
+            elapsed = time.perf_counter() - start
+            if move is not None:
+                self.__metrics.think.observe(elapsed)
+            if move is None or not clock.stop(i):
+                # the player lost on time
+                self.__metrics.timeouts.inc()
+                winner = (i + 1) % len(players)
+                break
+            try:
+                _applymove(game, move, self.__metrics)
+            except InvalidMoveException as e:
+                await player.send('ERROR {}'.format(e))
+                move = None
+            history.moves.append(move)
+            times.append(round(elapsed, 6))
+            winner = game._state.winner()
+            game._state.nextPlayer()
+        # Notify players about won/lost status or draw
+        for i, player in enumerate(players):
+            await player.send('END' if winner is None else 'WON' if winner == i else 'LOST')
+        if self.__recorder is not None:
+            self.__recorder.record(game._record(names, initial, starttime, history.moves, times, winner))
+        return winner
 
 
 class GameClient(metaclass=ABCMeta):
-    '''Abstract class representing a game client'''
-    def __init__(self, server, stateclass, verbose=False):
+    '''Abstract class representing a game client
+
+    The game is played during the initialisation of the client. Without 'server', the client
+    is only initialised: its moves can then be asked directly with '_nextmove' (see tournament.py).
+    With 'session', the client asks to stay connected after its game and plays the next ones
+    sent by the server (NEWGAME, see '_newgame'), until the server closes the connection.
+    '''
+    def __init__(self, server, stateclass, verbose=False, session=False, transport=None):
         self.__stateclass = stateclass
         self.__verbose = verbose
+        self.__session = session
+        # time at which the current move must be sent and seconds left in the game at the
+        # start of the move (see Clock), None for no limit
+        self.__deadline = None
+        self.__gametime = None
+        if server is None:
+            return
         if self.__verbose:
             _printsection('Starting game')
-        addrinfos = socket.getaddrinfo(*server, socket.AF_INET, socket.SOCK_STREAM)
-        s = socket.socket()
+        transport = TCP if transport is None else transport
         try:
-            s.connect(addrinfos[0][4])
+            s = transport.connect(server)
             if self.__verbose:
-                print(' Connected to the game server on {}:{}.'.format(*addrinfos[0][4]))
-            self.__server = s
+                print(' Connected to the game server on {}:{}.'.format(*s.getpeername()[:2]))
+            self.__server = Channel(s, stateclass.buffersize())
+            # state of the last turn and number of moves applied to it (delta updates)
+            self.__state = None
+            self.__seq = 0
             self._gameloop()
         except OSError:
-            print(' Impossible to connect to the game server on {}:{}.'.format(*addrinfos[0][4]))
+            print(' Impossible to connect to the game server on {}:{}.'.format(*server))
 
     def _gameloop(self):
         server = self.__server
         running = True
         while running:
-            data = server.recv(self.__stateclass.buffersize()).decode()
-            command = data[:data.index(' ')] if ' ' in data else data
+            data = server.recvbytes()
+            self._stopponder()
+            command = data.split(b' ', 1)[0].decode()
+            state = None
+            if command in ('PLAY', 'SYNC'):
+                if command == 'SYNC':
+                    command, seq, payload = data.split(b' ', 2)
+                    self.__seq = int(seq)
+                else:
+                    payload = data[len('PLAY '):]
+                if server.binary:
+                    state = self.__stateclass.frombytes(payload)
+                else:
+                    state = self.__stateclass.parse(payload.decode())
+                self.__state = state
+            elif command == 'MOVES':
+                state = self._update(data.decode())
+                if state is None:
+                    server.send('RESYNC')
+                    continue
+            else:
+                data = data.decode()
             if command == 'START':
                 self._playernb = int(data[data.index(' '):])
-                server.sendall('READY'.encode())
+                features = sorted(_statefeatures(self.__stateclass))
+                if self.__session:
+                    features.append(SESSION)
+                server.send(' '.join(['READY', 'PROTO={}'.format(PROTOCOL_VERSION)] + features))
                 if self.__verbose:
                     _printsection('Game started')
                     print("   Player's number: {}".format(self._playernb))
-            elif command == 'PLAY':
-                state = self.__stateclass.parse(data[data.index(' ')+1:])
+            elif command == 'PROTO':
+                if self.__verbose:
+                    print('   Protocol: {} {}'.format(server.version, ' '.join(sorted(server.features))))
+            elif command == 'CLOCK':
+                limit, remaining = data.split(' ')[1:3]
+                self.__deadline = time.monotonic() + float(limit)
+                self.__gametime = None if remaining == '-' else float(remaining)
+                if self.__verbose:
+                    print('   Clock: {} s to play, {} s left in the game'.format(*data.split(' ')[1:3]))
+            elif state is not None:
                 if self.__verbose:
                     print("\n=> Player's turn to play")
                     print('   State:')
@@ -252,9 +949,16 @@ class GameClient(metaclass=ABCMeta):
                 move = self._nextmove(state)
                 if self.__verbose:
                     print('   Move:', move)
-                server.sendall(move.encode())
-            elif command in ('WON', 'LOST', 'END'):
+                server.send(move)
+                self.__deadline = self.__gametime = None
+                self._ponder(state, move)
+            elif command == '':
                 running = False
+                if self.__verbose:
+                    print(' Connection closed by the game server.')
+                server.close()
+            elif command in ('WON', 'LOST', 'END'):
+                running = server.session
                 if self.__verbose:
                     _printsection('Game finished')
                     if command == 'WON':
@@ -264,12 +968,49 @@ class GameClient(metaclass=ABCMeta):
                     else:
                         print(' It is draw.')
                     _printsection('Game ended')
-                server.close()
+                if not running:
+                    server.close()
+            elif command == 'NEWGAME':
+                # the next game of the session
+                self.__state = None
+                self.__seq = 0
+                self._newgame()
+                if self.__verbose:
+                    _printsection('Waiting for the next game')
             else:
                 if self.__verbose:
                     print('Specific data received:', data)
                 self._handle(data)
 
+    def _update(self, data):
+        '''Apply the moves of a MOVES message to the state of the last turn.
+        Return the new state, or None if it is not the state of the server anymore.'''
+        _, seq, checksum, moves = data.split(' ', 3)
+        moves = json.loads(moves)
+        state = self.__state
+        if state is None or self.__seq + len(moves) != int(seq):
+            return None
+        try:
+            for move in moves:
+                state.update(move)
+        except Exception:
+            # the state was modified by the client
+            return None
+        if state.checksum() != int(checksum):
+            return None
+        self.__seq = int(seq)
+        return state
+
+    def _timeleft(self):
+        '''Return the seconds left to send the current move to the server (None for no limit).'''
+        if self.__deadline is None:
+            return None
+        return max(0.0, self.__deadline - time.monotonic())
+
+    def _gametime(self):
+        '''Return the seconds left in the game at the start of the current move (None for no limit).'''
+        return self.__gametime
+
     @abstractmethod
     def _handle(self, command):
         '''Handle a command.
@@ -278,10 +1019,32 @@ class GameClient(metaclass=ABCMeta):
         '''
         ...
 
+    def _newgame(self):
+        '''Prepare the next game of a session.
+        Pre: The previous game has ended, the client stays connected to the server.
+        Post: The client is ready to play a new game (what it learnt may be kept).
+        '''
+        pass
+
+    def _ponder(self, state, move):
+        '''Think on the opponent's time.
+        Pre: 'move' has just been sent to the server, it was played in the specified 'state'.
+        Post: A background search may have been started, it will be stopped by '_stopponder'.
+        '''
+        pass
+
+    def _stopponder(self):
+        '''Stop thinking on the opponent's time.
+        Pre: -
+        Post: No background search is running anymore.
+        '''
+        pass
+
     @abstractmethod
     def _nextmove(self, state):
         '''Get the next move to play.
-        Pre: 'state' is a valid game' state.
+        Pre: 'state' is a valid game' state. With delta updates, it is kept and updated with
+             the next moves: the state sent by the server is requested again if it is modified.
         Post: The returned value contains a valid move to be played by this player
               in the specified 'state' of the game.
         '''
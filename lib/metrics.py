@@ -0,0 +1,130 @@
+# metrics.py
+# Metrics of the game servers, served over HTTP in the Prometheus text format.
+#
+# The metrics are updated by the thread playing the games (the asyncio loop of a GameHost)
+# and only read by the thread of the HTTP server: with a single writer, they are plain
+# numbers updated without lock, and a scrape sees each of them at some point of the games.
+
+import bisect
+import http.server
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds, from a fast bot to the time controls of the humans
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(label, value):
+    if label is None:
+        return ''
+    value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return '{{{}="{}"}}'.format(label, value)
+
+
+class Counter:
+    '''Class representing a number which only increases, optionally by value of a label.'''
+    kind = 'counter'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {} if label is not None else {None: 0}
+
+    def inc(self, amount=1, value=None):
+        self.values[value] = self.values.get(value, 0) + amount
+
+    def samples(self):
+        # list() copies the items at once, even if the writer adds a value meanwhile
+        return [(self.name + _labels(self.label, value), count) for value, count in list(self.values.items())]
+
+
+class Gauge(Counter):
+    '''Class representing a number which goes up and down.'''
+    kind = 'gauge'
+
+    def dec(self, amount=1, value=None):
+        self.inc(-amount, value)
+
+
+class Histogram:
+    '''Class representing the distribution of observed values in buckets.'''
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)     # the last one for the values above the buckets
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        counts = list(self.counts)
+        samples = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            total += count
+            samples.append(('{}_bucket{{le="{}"}}'.format(self.name, bound), total))
+        samples.append((self.name + '_sum', self.sum))
+        samples.append((self.name + '_count', total))
+        return samples
+
+
+class GameMetrics:
+    '''Class representing the metrics of the games of a server.'''
+    def __init__(self, prefix='game'):
+        self.active = Gauge(prefix + '_games_active', 'Games being played.')
+        self.finished = Counter(prefix + '_games_finished_total',
+                                'Games finished, by result (number of the winner, draw or aborted).', 'result')
+        self.think = Histogram(prefix + '_think_seconds',
+                               'Time between the turn sent to a client and its move.')
+        self.validation = Histogram(prefix + '_move_validation_seconds', 'Time to check and apply a move.')
+        self.invalid = Counter(prefix + '_invalid_moves_total', 'Moves refused by the server.')
+        self.timeouts = Counter(prefix + '_timeouts_total', 'Games lost on time.')
+        self.received = Counter(prefix + '_received_bytes_total', 'Bytes received from the clients.')
+        self.sent = Counter(prefix + '_sent_bytes_total', 'Bytes sent to the clients.')
+
+    def metrics(self):
+        return [self.active, self.finished, self.think, self.validation, self.invalid, self.timeouts,
+                self.received, self.sent]
+
+    def render(self):
+        '''Return the metrics in the Prometheus text format.'''
+        lines = []
+        for metric in self.metrics():
+            lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            for sample, value in metric.samples():
+                lines.append('{} {}'.format(sample, value))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, host='127.0.0.1', port=9100):
+        '''Serve the metrics on http://host:port/metrics from a background thread, and return
+        the HTTP server (shutdown stops it).'''
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
@@ -0,0 +1,97 @@
+# recorder.py
+# Records of the games played by the game servers, appended to a rotating log file.
+#
+# Each game is a line of JSON: {"game": name, "time": start (seconds since the epoch),
+# "players": names, "state": initial state (see encodestate), "moves": moves
+# (None for an invalid move), "times": think time of each move (seconds), "result":
+# number of the winner or "draw"}; the aborted games are not recorded. The position
+# before the move k is the initial state with the k first moves applied as by the server
+# (see replay.py).
+
+import json
+import os
+import queue
+import threading
+
+MAX_BYTES = 64 * 2**20
+BACKUPS = 5
+BATCH_SIZE = 256
+
+
+def encodestate(state):
+    '''Return the state as a string: the hexadecimal of its bytes if the states can be sent
+    in binary (see GameState.tobytes), the state itself otherwise.'''
+    return state.tobytes().hex() if state.binary() else str(state)
+
+
+def decodestate(data, stateclass):
+    '''Return the state encoded by encodestate.'''
+    return stateclass.frombytes(bytes.fromhex(data)) if stateclass.binary() else stateclass.parse(data)
+
+
+def read(filenames):
+    '''Yield the records of the games logged in the files, in their order.'''
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class GameRecorder:
+    '''Class writing the records of the games in a background thread.
+
+    'record' only queues the game: the thread writes the queued games in batches of
+    at most 'batchsize' games. When the file exceeds 'maxbytes', it is renamed
+    'filename.1' (the previous one becoming 'filename.2', up to 'backups' files)
+    and a new file is started.
+    '''
+    def __init__(self, filename, maxbytes=MAX_BYTES, backups=BACKUPS, batchsize=BATCH_SIZE):
+        self.filename = filename
+        self.maxbytes = maxbytes
+        self.backups = backups
+        self.batchsize = batchsize
+        self.__queue = queue.SimpleQueue()
+        self.__file = open(filename, 'a')
+        self.__thread = threading.Thread(target=self._write)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def record(self, game):
+        '''Queue the record of a game (a dictionary, see above).'''
+        self.__queue.put(game)
+
+    def close(self):
+        '''Write the queued games and close the file.'''
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__file.close()
+
+    def _write(self):
+        running = True
+        while running:
+            games = [self.__queue.get()]
+            while len(games) < self.batchsize:
+                try:
+                    games.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in games:
+                running = False
+                games = games[:games.index(None)]
+            if games:
+                self.__file.write(''.join(json.dumps(game, separators=(',', ':')) + '\n' for game in games))
+                self.__file.flush()
+                if self.__file.tell() >= self.maxbytes:
+                    self._rotate()
+
+    def _rotate(self):
+        self.__file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists('{}.{}'.format(self.filename, i)):
+                os.replace('{}.{}'.format(self.filename, i), '{}.{}'.format(self.filename, i + 1))
+        if self.backups > 0:
+            os.replace(self.filename, '{}.1'.format(self.filename))
+        else:
+            os.remove(self.filename)
+        self.__file = open(self.filename, 'a')
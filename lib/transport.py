@@ -0,0 +1,279 @@
+# transport.py
+# Transports of the messages between the game servers and clients: TCP sockets, or pipes
+# in memory between the threads of a process.
+#
+# A transport listens on an address (host, port) and connects to it. The listeners and the
+# connections have the methods of the sockets used by the game (accept, getsockname,
+# sendall, recv, settimeout, getpeername and close), so a socket is a connection of TCP.
+# The servers of asyncio (game.GameHost) are started by 'start_server', which calls
+# connected(reader, writer) with the streams of each new connection, as asyncio.start_server.
+
+import asyncio
+import collections
+import itertools
+import socket
+import threading
+
+
+class TCPTransport:
+    '''Class representing the transport over TCP sockets (the default one).'''
+    def listen(self, address, backlog):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(address)
+        s.listen(backlog)
+        return s
+
+    def connect(self, address):
+        addrinfos = socket.getaddrinfo(*address, socket.AF_INET, socket.SOCK_STREAM)
+        s = socket.socket()
+        try:
+            s.connect(addrinfos[0][4])
+        except OSError:
+            s.close()
+            raise
+        return s
+
+    async def start_server(self, connected, address):
+        return await asyncio.start_server(connected, *address)
+
+
+TCP = TCPTransport()
+
+
+class PipeTransport:
+    '''Class representing a transport in memory, between the threads of a process.
+
+    A server and its clients share the same PipeTransport, as the processes of one host:
+    an address is named by its port alone (a server listening on ('0.0.0.0', 1) is
+    reached at ('localhost', 1)), without ports of the system, so that many games can be
+    played side by side (on different ports). The messages do not go through the system:
+    the bytes sent are queued for the other end, and only copied when they are not bytes
+    or when they are read in several parts.
+
+    As a client retrying until its server is started, 'connect' waits for a listener
+    during 'timeout' seconds.
+    '''
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self.__listeners = {}
+        self.__condition = threading.Condition()
+        self.__numbers = itertools.count(1)
+
+    def listen(self, address, backlog=None):
+        port = address[1]
+        with self.__condition:
+            if port in self.__listeners:
+                raise OSError('Address already in use: {}'.format(address))
+            listener = PipeListener(self, address)
+            self.__listeners[port] = listener
+            self.__condition.notify_all()
+        return listener
+
+    def connect(self, address):
+        port = address[1]
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: port in self.__listeners, self.timeout):
+                raise ConnectionRefusedError('No game server on {}'.format(address))
+            client, server = PipeConnection.pair(('pipe', next(self.__numbers)), address)
+            self.__listeners[port]._connected(server)
+        return client
+
+    async def start_server(self, connected, address):
+        return PipeServer(self.listen(address), connected, asyncio.get_running_loop())
+
+    def _closed(self, listener):
+        with self.__condition:
+            if self.__listeners.get(listener.address[1]) is listener:
+                del self.__listeners[listener.address[1]]
+
+
+class PipeListener:
+    '''Class representing a listening address of a PipeTransport.
+
+    As a socket, 'accept' waits for a connection during the timeout set by 'settimeout'
+    (socket.timeout is raised after it), and raises OSError once the listener is closed
+    (by another thread).
+    '''
+    def __init__(self, transport, address):
+        self.__transport = transport
+        self.address = address
+        self.__pending = collections.deque()
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__timeout = None
+
+    def _connected(self, connection):
+        with self.__condition:
+            if self.__closed:
+                raise ConnectionRefusedError('No game server on {}'.format(self.address))
+            self.__pending.append(connection)
+            self.__condition.notify()
+
+    def accept(self):
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__pending or self.__closed, self.__timeout):
+                raise socket.timeout('timed out')
+            if self.__closed:
+                raise OSError('Listener closed')
+            connection = self.__pending.popleft()
+        return connection, connection.getpeername()
+
+    def settimeout(self, timeout):
+        self.__timeout = timeout
+
+    def getsockname(self):
+        return self.address
+
+    def close(self):
+        self.__transport._closed(self)
+        with self.__condition:
+            self.__closed = True
+            pending, self.__pending = self.__pending, collections.deque()
+            self.__condition.notify_all()
+        # the connections not accepted are refused
+        for connection in pending:
+            connection.close()
+
+
+class PipeConnection:
+    '''Class representing an end of a connection in memory (see PipeTransport).'''
+    def __init__(self, name, peername):
+        self.__name = name
+        self.__peername = peername
+        self.__peer = None
+        self.__chunks = collections.deque()     # bytes received, as they were sent
+        self.__closed = False                   # no more bytes will be received
+        self.__condition = threading.Condition()
+        self.__timeout = None
+
+    @classmethod
+    def pair(cls, clientname, servername):
+        '''Return the two ends (client, server) of a new connection.'''
+        client, server = cls(clientname, servername), cls(servername, clientname)
+        client.__peer, server.__peer = server, client
+        return client, server
+
+    def _receive(self, data):
+        with self.__condition:
+            if self.__closed:
+                raise BrokenPipeError('Connection closed by the peer')
+            self.__chunks.append(data)
+            self.__condition.notify()
+
+    def _eof(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def sendall(self, data):
+        if self.__peer is None:
+            raise BrokenPipeError('Connection closed')
+        self.__peer._receive(data if type(data) is bytes else bytes(data))
+
+    def recv(self, size):
+        '''Return at most 'size' bytes, b'' once the connection is closed.'''
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__chunks or self.__closed, self.__timeout):
+                raise socket.timeout('timed out')
+            if not self.__chunks:
+                return b''
+            data = self.__chunks.popleft()
+            if len(data) > size:
+                self.__chunks.appendleft(data[size:])
+                data = data[:size]
+            return data
+
+    def settimeout(self, timeout):
+        self.__timeout = timeout
+
+    def getpeername(self):
+        return self.__peername
+
+    def getsockname(self):
+        return self.__name
+
+    def close(self):
+        peer, self.__peer = self.__peer, None
+        if peer is not None:
+            peer._eof()
+        self._eof()
+
+
+class PipeServer:
+    '''Class representing a server of asyncio listening on a PipeTransport.
+
+    A thread accepts the connections and a thread per connection reads it: the bytes are
+    fed to the StreamReader given to 'connected' in the loop of the server, and the
+    PipeWriter writes directly to the connection (its buffer has no limit).
+    '''
+    def __init__(self, listener, connected, loop):
+        self.__listener = listener
+        self.__connected = connected
+        self.__loop = loop
+        self.sockets = [listener]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.__listener.accept()[0]
+                self.__loop.call_soon_threadsafe(self._start, connection)
+            except (OSError, RuntimeError):
+                # the listener or the loop is closed
+                return
+
+    def _start(self, connection):
+        reader = asyncio.StreamReader()
+        thread = threading.Thread(target=self._read, args=(connection, reader))
+        thread.daemon = True
+        thread.start()
+        result = self.__connected(reader, PipeWriter(connection))
+        if asyncio.iscoroutine(result):
+            self.__loop.create_task(result)
+
+    def _read(self, connection, reader):
+        try:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                self.__loop.call_soon_threadsafe(reader.feed_data, data)
+            self.__loop.call_soon_threadsafe(reader.feed_eof)
+        except RuntimeError:
+            # the loop is closed
+            pass
+
+    def close(self):
+        self.__listener.close()
+
+    async def wait_closed(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+        await self.wait_closed()
+
+
+class PipeWriter:
+    '''Class representing the StreamWriter of a PipeConnection (see PipeServer).'''
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, data):
+        self.connection.sendall(data)
+
+    async def drain(self):
+        pass
+
+    def get_extra_info(self, name, default=None):
+        return {'peername': self.connection.getpeername(),
+                'sockname': self.connection.getsockname()}.get(name, default)
+
+    def close(self):
+        self.connection.close()
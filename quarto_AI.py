@@ -12,20 +12,42 @@ import argparse
 import random
 import json
 import copy
+import itertools
+import os
+import struct
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    print("Sorry, the Quarto AI requires Numpy installed !")
+    raise
 
-from random import randint
 from easyAI import TwoPlayersGame, AI_Player
-from easyAI.AI import Negamax, TT, SSS
+from easyAI.AI import Negamax, TT, SSS, MmapTT, BoundedTT, SqliteTT, memory_budget
 from easyAI.AI.solving import id_solve
-from lib import game
+from lib import game, recorder
+
+# binary state (see QuartoState.tobytes): the positions of the board which are occupied,
+# the codes of their pieces (4 bits per position), the remaining pieces (one bit per code),
+# the index of the piece to play in the remaining pieces (255 for none) and the current
+# player and the announced quarto (bits 0 and 1)
+STATE = struct.Struct('<HQHBB')
+
+# size of the transposition tables kept by the AI clients during a game (for each number of pieces on the board)
+TT_ENTRIES = 100000
+TT_MEMORY = 256     # megabytes for all the transposition tables of a client
+
+# part of the time left for a move (see game.Clock) that the AI clients spend searching it
+TIME_MARGIN = 0.8
 
 
 class QuartoState(game.GameState):
-    '''Class representing a state for the Quarto game.'''
+    '''Class representing a state for the Quarto game (the first player is drawn with 'rng'
+    if not given, e.g. a random.Random for reproducible games).'''
 
-    def __init__(self, initialstate=None, currentPlayer=None):
+    def __init__(self, initialstate=None, currentPlayer=None, rng=random):
         self.__player = 0
-        random.seed()
         if initialstate is None:
             pieces = []
             for shape in ['round', 'square']:
@@ -46,12 +68,54 @@ class QuartoState(game.GameState):
             }
 
         if currentPlayer is None:
-            currentPlayer = random.randrange(2)
+            currentPlayer = rng.randrange(2)
 
         super().__init__(initialstate, currentPlayer=currentPlayer)
+        # board, remaining pieces and piece to play as codes, when decoded from bytes (see QuartoMind)
+        self.codes = None
+
+    @classmethod
+    def binary(cls):
+        return True
+
+    def tobytes(self):
+        state = self._state['visible']
+        occupied = board = 0
+        for pos, piece in enumerate(state['board']):
+            if piece is not None:
+                occupied |= 1 << pos
+                board |= piececode(piece) << 4 * pos
+        remaining = sum(1 << piececode(piece) for piece in state['remainingPieces'])
+        piece = 255 if state['pieceToPlay'] is None else state['pieceToPlay']
+        return STATE.pack(occupied, board, remaining, piece,
+                          self._state['currentPlayer'] | state['quartoAnnounced'] << 1)
+
+    @classmethod
+    def frombytes(cls, data):
+        occupied, board, remaining, piece, flags = STATE.unpack(data)
+        board = [board >> 4 * pos & 15 if occupied >> pos & 1 else -1 for pos in range(16)]
+        pieces = [code for code in range(16) if remaining >> code & 1]
+        state = cls({
+            'board': [None if code < 0 else PIECES[code] for code in board],
+            'remainingPieces': [PIECES[code] for code in pieces],
+            'pieceToPlay': None if piece == 255 else piece,
+            'quartoAnnounced': bool(flags & 2)
+        }, currentPlayer=flags & 1)
+        state.codes = board, pieces, -1 if piece == 255 else pieces[piece]
+        return state
+
+    @classmethod
+    def delta(cls):
+        return True
+
+    def update(self, move):
+        if move is not None:
+            self.applymove(json.loads(move))
+        self.nextPlayer()
 
     def applymove(self, move):
         # {pos: 8, quarto: true, nextPiece: 2}
+        self.codes = None
         stateBackup = copy.deepcopy(self._state)
         try:
             state = self._state['visible']
@@ -152,11 +216,18 @@ class QuartoState(game.GameState):
         self._state['currentPlayer'] = (self._state['currentPlayer'] + 1) % 2
 
 
+# the pieces in the order of their codes (see piececode)
+PIECES = QuartoState()._state['visible']['remainingPieces']
+
+
 class QuartoServer(game.GameServer):
     '''Class representing a server for the Quarto game.'''
 
-    def __init__(self, verbose=False):
-        super().__init__('Quarto', 2, QuartoState(), verbose=verbose)
+    def __init__(self, verbose=False, host='0.0.0.0', port=5000, movetime=None, gametime=None, increment=0,
+                 metricsport=None, recorder=None, transport=None):
+        super().__init__('Quarto', 2, QuartoState(), verbose=verbose, host=host, port=port,
+                         movetime=movetime, gametime=gametime, increment=increment, metricsport=metricsport,
+                         recorder=recorder, transport=transport)
 
     def applymove(self, move):
         try:
@@ -169,445 +240,93 @@ class QuartoServer(game.GameServer):
 
 # Main AI
 class QuartoAI(game.GameClient):
-    '''Class representing a client for the Quarto game.'''
-
-    def __init__(self, name, server, verbose=False):
-        super().__init__(server, QuartoState, verbose=verbose)
+    '''Class representing a client for the Quarto game (its random choices are drawn with 'rng',
+    e.g. a random.Random for reproducible games).'''
+
+    def __init__(self, name, server, verbose=False, ponder=False, shared=None, persistent=None, session=False,
+                 transport=None, rng=random):
+        self.__random = rng
+        # the game is played during the initialisation of the client
+        self.__tt = QuartoTT(TT_ENTRIES, shared, persistent)    # shared by all the searches of the game (and pondering)
+        self.__ponder = QuartoPonder(self._search) if ponder else None
+        self.__book = openingbook()
+        super().__init__(server, QuartoState, verbose=verbose, session=session, transport=transport)
         self.__name = name
 
     def _handle(self, message):
         pass
 
-    def _nextmove(self, state):
+    # the book, the pondering thread and the persistent and shared tables are kept for the next
+    # game of the session
+    def _newgame(self):
+        self.__tt.newgame()
+
+    def _ponder(self, state, move):
+        move = json.loads(move)
+        if self.__ponder is None or 'quarto' in move:
+            return
+        Quarto = QuartoMind([], state)
+        Quarto.make_move(Quarto.parsemove(move))
+        if not Quarto.is_over():
+            self.__ponder.start(Quarto)
+
+    def _stopponder(self):
+        if self.__ponder is not None:
+            self.__ponder.stop()
+
+    # easyAI part of the AI, the depths of the algorithms depend on the number of remaining pieces
+    def _search(self, Quarto):
+        x = Quarto.remaining
+        if 9 < x:
+            quarto_algo_sss = SSS(3, tt=self.__tt)    # Algorithm(depth, scoring=None, win_score=inf)
+            quarto_algo_neg = Negamax(8, win_score=90,
+                                      tt=self.__tt)   # Algorithm(depth, scoring=None, win_score=inf,tt=None)
+
+        elif 7 < x <= 9:
+            quarto_algo_sss = SSS(4, tt=self.__tt)    # Algorithm(depth, scoring=None, win_score=inf)
+            quarto_algo_neg = Negamax(7, win_score=90,
+                                      tt=self.__tt)   # Algorithm(depth, scoring=None, win_score=inf,tt=None)
+
+        elif 4 < x <= 7:
+            quarto_algo_sss = SSS(5, tt=self.__tt)    # Algorithm(depth, scoring=None, win_score=inf)
+            quarto_algo_neg = Negamax(8, win_score=90,
+                                      tt=self.__tt)   # Algorithm(depth, scoring=None, win_score=inf,tt=None)
+
+        else:
+            # solve the game and give the Move to do it, id_solve return:
+            #   • Move: Best Move to play for the player.
+            #   • Result: Either 1 (certain victory of the first player) or -1 (certain defeat) or 0 (either draw)
+            #   • Depth: The minimal number of moves before victory (or defeat)
+            Result, Depth, move = id_solve(Quarto, ai_depths=range(2, 4), win_score=90, tt=self.__tt)
+            return move
 
-        # gives a dictionary containing all the position on the board with their state, state stands here for if the
-        # position is free. If it's free, then the state = None otherwise we have the characteristics of the piece
-        def _read(board):
-            dicoRead = {}
-            for i in range(len(board)):
-                dicoRead[i] = board[i]
-            return dicoRead
-
-        # returns a list of the position on the board which are taken
-        def token():
-            link = []
-            for i in range(16):
-                if visible['board'][i] is not None:
-                    link.append(i)
-            return link
-
-        # returns a list of the free positions on the board
-        def nottoken():
-            notlink = []
-            for i in range(16):
-                if visible['board'][i] is None:
-                    notlink.append(i)
-            return notlink
-
-        # returns a list of the position of the first piece on the board
-        def token0():
-            list = []
-            i = token()[0]
-            list.append(i)
-            return list
-
-        # returns a list of the position of the second piece on the board
-        def token1():
-            list = []
-            i = token()[1]
-            list.append(i)
-            return list
+        Quarto.players = [AI_Player(quarto_algo_sss), AI_Player(quarto_algo_neg)]
+        return Quarto.get_move()
 
+    def _nextmove(self, state):
         visible = state._state['visible']
         move = {}
-        piecetoplay = visible['pieceToPlay']
-        remainingPieces = visible['remainingPieces']
-        x = len(remainingPieces)
-
-        # structure for each position on the board
-        boardfeature = {0: {"row": [1, 2, 3], "colons": [4, 8, 12], "diagonals": [5, 10, 15]},
-                        1: {"row": [0, 2, 3], "colons": [5, 9, 13], "diagonals": []},
-                        2: {"row": [0, 1, 3], "colons": [6, 10, 14], "diagonals": []},
-                        3: {"row": [0, 1, 2], "colons": [7, 11, 15], "diagonals": [6, 9, 12]},
-                        4: {"row": [5, 6, 7], "colons": [0, 8, 12], "diagonals": []},
-                        5: {"row": [4, 6, 7], "colons": [1, 9, 13], "diagonals": [0, 10, 15]},
-                        6: {"row": [4, 5, 7], "colons": [2, 10, 14], "diagonals": [3, 9, 12]},
-                        7: {"row": [4, 5, 6], "colons": [3, 11, 15], "diagonals": []},
-                        8: {"row": [9, 10, 11], "colons": [0, 4, 12], "diagonals": []},
-                        9: {"row": [8, 10, 11], "colons": [1, 5, 13], "diagonals": [3, 6, 12]},
-                        10: {"row": [8, 9, 11], "colons": [2, 6, 14], "diagonals": [0, 5, 15]},
-                        11: {"row": [8, 9, 10], "colons": [3, 7, 15], "diagonals": []},
-                        12: {"row": [13, 14, 15], "colons": [0, 4, 8], "diagonals": [3, 6, 9]},
-                        13: {"row": [12, 14, 15], "colons": [1, 5, 9], "diagonals": []},
-                        14: {"row": [12, 13, 15], "colons": [2, 6, 10], "diagonals": []},
-                        15: {"row": [12, 13, 14], "colons": [3, 7, 11], "diagonals": [0, 5, 10]}
-                        }
+        x = len(visible['remainingPieces'])
 
         # select next piece to play if you are first to play
         # first to play means, choose the first piece which will be played and that he is player 1
         if visible['pieceToPlay'] is None:
-            move['nextPiece'] = randint(0, x - 1)
+            move['nextPiece'] = self.__random.randint(0, x - 1)
 
         if visible['pieceToPlay'] is not None:
-            # There are no pieces on the board
-            # AI is playing second, he is the first one to place a piece on the board and he is player 2
-            if x == 16:
-                move['pos'] = randint(0, 15)
-                move['nextPiece'] = randint(0, 14)
-
-            # 1 piece is already on board.
-            # move for player 1
-            if x == 15:
-                posPiece = 0
-
-                def posliste(pos):
-                    # makes a list of all the positions related to the position of piece already laying on the board
-                    alignment = []
-                    posdic1 = boardfeature[pos]["row"]
-                    posdic2 = boardfeature[pos]["colons"]
-                    posdic3 = boardfeature[pos]["diagonals"]
-                    for elem in posdic1:
-                        alignment.append(elem)
-                    for elem in posdic2:
-                        alignment.append(elem)
-                    for elem in posdic3:
-                        alignment.append(elem)
-                    return alignment
-
-                def nbrcara(para, piece):
-                    # returns the number of common characteristics between 2 pieces
-                    # This function is when para is a dictionary of dictionaries
-                    for data in para.values():
-                        if data is not None:
-                            keys_a = set(data.values())
-                            keys_b = set(piece.values())
-                            intersection = keys_a & keys_b
-                            nombre = len(intersection)
-                            return nombre
-
-                def nbrcara1(piece, data):
-                    # Returns the number of common characteristics between 2 pieces
-                    # This function is when piece is just a dictionary
-                    keys_a = set(piece.values())
-                    keys_b = set(data.values())
-                    intersection = keys_a & keys_b
-                    nombre = len(intersection)
-                    return nombre
-
-                # determines on which position the piece is on the board
-                for i in range(16):
-                    if visible['board'][i] is not None:
-                        posPiece = i
-
-                def listpiece(nbr1, nbr2):
-                    # returns a list of all the possibilities which satisfy the conditions for the nextpiece to play
-                    nextpieces = []
-                    i = 0
-                    remainingPieces_copy = copy.deepcopy(remainingPieces)
-                    remainingPieces_copy.remove(remainingPieces[piecetoplay])
-                    for piece in remainingPieces_copy:
-                        if nbrcara1(piece, remainingPieces[piecetoplay]) == nbr1:
-                            if nbr2+1 >= nbrcara(_read(visible['board']), piece) >= nbr2:
-                                nextpieces.append(i)
-                        i += 1
-                    return nextpieces
-
-                # all the positions possible on the board
-                boarddata = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
-
-                # making a choice in function of the number of common characteristics
-                if nbrcara(_read(visible['board']), remainingPieces[piecetoplay]) < 2:
-                    possibilities = list(filter(lambda x: x not in posliste(posPiece), boarddata))
-                    move['pos'] = random.choice(possibilities)
-                    # number of common characteristics equals 0
-                    if nbrcara(_read(visible['board']), remainingPieces[piecetoplay]) == 0:
-                        # will choose a piece which will have 3 common characteristics with the last piece played and
-                        # 1 or 2 with the piece which was first played
-                        move['nextPiece'] = random.choice(listpiece(3, 1))
-                    # number of common characteristics equals 1
-                    else:
-                        # will choose a piece which will have 2 common characteristics with the last piece played and
-                        # 1 or 2 with the piece which was first played
-                        move['nextPiece'] = random.choice(listpiece(2, 1))
-
-                else:
-                    move['pos'] = random.choice(posliste(posPiece))
-                    # number of common characteristics equals 2
-                    if nbrcara(_read(visible['board']), remainingPieces[piecetoplay]) == 2:
-                        # will choose a piece which will have 1 common characteristics with the last piece played and
-                        # 0 or 1 with the piece which was first played or the contrary
-                        move['nextPiece'] = random.choice(listpiece(1, 0) or listpiece(0, 1))
-                    # number of common characteristics equals 3
-                    else:
-                        # will choose a piece which will have 2 common characteristics with the last piece played and
-                        # 2 or 3 with the piece which was first played
-                        move['nextPiece'] = random.choice(listpiece(2, 2))
-
-            # 2 pieces already on the board
-            # move for player 2
-            if x == 14:
-
-                boarddata2 = nottoken()  # boarddata changes in the current of the game
-
-                def posliste(pos):
-                    # returns a list of lists
-                    # (result = [all the positions in alignment to at least one of the positions of the pieces on the
-                    # board, , all the positions in alignment with the 2 pieces on the board, all the positions in
-                    # alignment with just 1 piece on the board)
-                    alignment = []
-                    alignmentbis = []
-                    arrangement = []
-                    for data in pos:
-                        posdic1 = boardfeature[data]["row"]
-                        posdic2 = boardfeature[data]["colons"]
-                        posdic3 = boardfeature[data]["diagonals"]
-                        for elem in posdic1:
-                            alignmentbis.append(elem)
-                        for elem in posdic2:
-                            alignmentbis.append(elem)
-                        for elem in posdic3:
-                            alignmentbis.append(elem)
-                    alignmentbisbis = list(filter(lambda x: x not in token(), alignmentbis))
-                    for i in alignmentbisbis:
-                        if i not in alignment:
-                            alignment.append(i)
-                        else:
-                            arrangement.append(i)
-                    arrangement2 = list(filter(lambda x: x not in arrangement, alignment))
-                    result = [alignment, arrangement, arrangement2]
-                    return result
-
-                def count(cara):
-                    # returns a list of lists
-                    # (number = (Common Cara of the 2 piece on the board, Common Cara of one of the pieces on the board
-                    # and the piece to play, Common Cara of the other piece on the board an the piece to play).
-                    keys_a = []
-                    for data in cara:
-                        if data is not None:
-                            keys_a.append(data)
-                    piece1 = keys_a[0]
-                    piece2 = keys_a[1]
-                    lista1 = set(piece1.values())
-                    listb1 = set(piece2.values())
-                    listc1 = set(remainingPieces[piecetoplay].values())
-                    intersection0 = lista1 & listb1
-                    intersection1 = listc1 & lista1
-                    intersection2 = listc1 & listb1
-                    nombre0 = len(intersection0)
-                    nombre1 = len(intersection1)
-                    nombre2 = len(intersection2)
-                    number = [nombre0, nombre1, nombre2]
-                    return number
-
-                def _read1(board):
-                    # same function as _read but here it returns a list of the pieces on the
-                    # board without their positions. It returns a list of dictionaries
-                    dicoRead = []
-                    for i in board:
-                        if i is not None:
-                            dicoRead.append(i)
-                    dicoRead.append(remainingPieces[piecetoplay])
-                    return dicoRead
-
-                def master(liste):
-                    # returns the characteristics of the piece which will be played by the opponent inf function
-                    # of the pieces already on the board
-                    roundi = 0
-                    squarei = 0
-                    darki = 0
-                    lighti = 0
-                    lowi = 0
-                    highi = 0
-                    emptyi = 0
-                    fulli = 0
-                    piecetoplay = {}
-                    for piece in liste:
-                        for car in piece:
-                            if piece[car] == 'round':
-                                roundi += 1
-                            if piece[car] == 'square':
-                                squarei += 1
-                            if piece[car] == 'dark':
-                                darki += 1
-                            if piece[car] == 'light':
-                                lighti += 1
-                            if piece[car] == 'low':
-                                lowi += 1
-                            if piece[car] == 'high':
-                                highi += 1
-                            if piece[car] == 'empty':
-                                emptyi += 1
-                            if piece[car] == 'full':
-                                fulli += 1
-                    if roundi < squarei:
-                        piecetoplay.update({'shape': 'round'})
-                    else:
-                        piecetoplay.update({'shape': 'square'})
-                    if darki < lighti:
-                        piecetoplay.update({'color': 'dark'})
-                    else:
-                        piecetoplay.update({'color': 'light'})
-                    if lowi < highi:
-                        piecetoplay.update({'height': 'low'})
-                    else:
-                        piecetoplay.update({'height': 'high'})
-                    if emptyi < fulli:
-                        piecetoplay.update({'filling': 'empty'})
-                    else:
-                        piecetoplay.update({'filling': 'full'})
-                    return piecetoplay
-
-                def match(piece2play):
-                    # returns the index of the piece in remainingPieces which matches the characteristics of the piece
-                    # returned in master
-                    remainingPieces_copy = copy.deepcopy(remainingPieces)
-                    remainingPieces_copy.remove(remainingPieces[piecetoplay])
-                    for i in range(len(remainingPieces_copy)):
-                        if remainingPieces_copy[i] == piece2play:
-                            return i
-
-                # choices for the position and nextpiece are made here after
-
-                # number of common characteristics between the pieces on the board equals 0
-                if count(visible['board'])[0] == 0:
-                    # comparison between the common characteristics of each piece on the board and the piecetoplay
-                    if count(visible['board'])[1] > count(visible['board'])[2]:
-                        possibilities = posliste(token0())[0]   # in alignment with the first piece on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif count(visible['board'])[1] == count(visible['board'])[2]:
-                        possibilities = posliste(token())[1]    # in alignment with the two pieces on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    else:
-                        possibilities = posliste(token1())[0]   # in alignment with the second piece on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-
-                # number of common characteristics between the pieces on the board equals 1
-                elif count(visible['board'])[0] == 1:
-                    # comparison between the common characteristics of each piece on the board and the piecetoplay
-                    if count(visible['board'])[1] == 0 and count(visible['board'])[2] >= 1:
-                        possibilities = posliste(token1())[0]   # in alignment with the second piece on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif count(visible['board'])[1] >= 1 and count(visible['board'])[2] == 0:
-                        possibilities = posliste(token0())[0]   # in alignment with the first piece on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    else:
-                        if count(visible['board'])[1] > count(visible['board'])[2]:
-                            # in alignment with the first piece on the board but not with the second piece on the board
-                            possibilities = list(filter(lambda x: x not in posliste(token())[1], posliste(token0())[0]))
-                            move['pos'] = random.choice(possibilities)
-                            move['nextPiece'] = match(master(_read1(visible['board'])))
-                        elif count(visible['board'])[1] == count(visible['board'])[2]:
-                            possibilities = posliste(token())[1]    # in alignment with the two pieces on the board
-                            move['pos'] = random.choice(possibilities)
-                            move['nextPiece'] = match(master(_read1(visible['board'])))
-                        else:
-                            # in alignment with the second piece on the board but not with the first piece on the board
-                            possibilities = list(filter(lambda x: x not in posliste(token())[1], posliste(token1())[0]))
-                            move['pos'] = random.choice(possibilities)
-                            move['nextPiece'] = match(master(_read1(visible['board'])))
-
-                # number of common characteristics between the pieces on the board equals 2
-                elif count(visible['board'])[0] == 2:
-                    # comparison between the common characteristics of each piece on the board and the piecetoplay
-                    if count(visible['board'])[1] == 0:
-                        possibilities = posliste(token1())[0]   # in alignment with the second piece on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif count(visible['board'])[2] == 0:
-                        possibilities = posliste(token0())[0]   # in alignment with the second piece on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif count(visible['board'])[1] == 1 and count(visible['board'])[2] == 1:
-                        possibilities = posliste(token())[1]    # in alignment with the two pieces on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif count(visible['board'])[1] == 1 and count(visible['board'])[2] > 1:
-                        # in alignment with the first piece on the board but not with the second piece on the board
-                        possibilities = list(
-                            filter(lambda x: x not in posliste(token())[1], posliste(token0())[0]))
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif count(visible['board'])[1] > 1 and count(visible['board'])[2] == 1:
-                        # in alignment with the second piece on the board but not with the first piece on the board
-                        possibilities = list(
-                            filter(lambda x: x not in posliste(token())[1], posliste(token1())[0]))
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    # Nbr cara between piece 1 and piecetoplay and between piece 2 and piecetoplay greater than 1
-                    else:
-                        # not in alignment with any of the pieces on the board
-                        possibilities = list(filter(lambda x: x not in posliste(token())[0], boarddata2))
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-
-                # number of common characteristics between the pieces on the board equals 3
-                elif count(visible['board'])[0] == 3:
-                    # takes the sum of the common characteristics of each piece on the board and the piecetoplay and
-                    # chooses the moves for each possible outcome for the sum
-                    if (count(visible['board'])[1] + count(visible['board'])[2]) == 1:
-                        possibilities = posliste(token())[1]    # in alignment with the two pieces on the board
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-                    elif (count(visible['board'])[1] + count(visible['board'])[2]) == 3:
-                        if count(visible['board'])[1] == 2:
-                            # in alignment with the second piece on the board but not with the first piece on the board
-                            possibilities = list(
-                                filter(lambda x: x not in posliste(token())[1], posliste(token1())[0]))
-                            move['pos'] = random.choice(possibilities)
-                            move['nextPiece'] = match(master(_read1(visible['board'])))
-                        else:
-                            # in alignment with the first piece on the board but not with the second piece on the board
-                            possibilities = list(
-                                filter(lambda x: x not in posliste(token())[1], posliste(token0())[0]))
-                            move['pos'] = random.choice(possibilities)
-                            move['nextPiece'] = match(master(_read1(visible['board'])))
-                    # thus the sum equals 5
-                    else:
-                        # not in alignment with any of the pieces on the board
-                        possibilities = list(filter(lambda x: x not in posliste(token())[0], boarddata2))
-                        move['pos'] = random.choice(possibilities)
-                        move['nextPiece'] = match(master(_read1(visible['board'])))
-
-            # easyAI comes into place from this moment (x=13)
-            if 9 < x <= 13:
-                QuartoMind.ttentry = lambda self: state     # Send State to the Transposition tables
-                quarto_algo_sss = SSS(3)    # Algorithm(depth, scoring=None, win_score=inf)
-                quarto_algo_neg = Negamax(8, win_score=90,
-                                          tt=TT)   # Algorithm(depth, scoring=None, win_score=inf,tt=None)
-                Quarto = QuartoMind([AI_Player(quarto_algo_sss), AI_Player(quarto_algo_neg)], state)
-                print(str(Quarto.get_move()))
-                move = Quarto.get_move()    # find best move possible
-
-            if 7 < x <= 9:
-                QuartoMind.ttentry = lambda self: state     # Send State to the Transposition tables
-                quarto_algo_sss = SSS(4)    # Algorithm(depth, scoring=None, win_score=inf)
-                quarto_algo_neg = Negamax(7, win_score=90,
-                                          tt=TT)   # Algorithm(depth, scoring=None, win_score=inf,tt=None)
-                Quarto = QuartoMind([AI_Player(quarto_algo_sss), AI_Player(quarto_algo_neg)], state)
-                print(str(Quarto.get_move()))
-                move = Quarto.get_move()    # find best move possible
-
-            if 4 < x <= 7:
-                QuartoMind.ttentry = lambda self: state     # Send State to the Transposition tables
-                quarto_algo_sss = SSS(5)    # Algorithm(depth, scoring=None, win_score=inf)
-                quarto_algo_neg = Negamax(8, win_score=90,
-                                          tt=TT)   # Algorithm(depth, scoring=None, win_score=inf,tt=None)
-                Quarto = QuartoMind([AI_Player(quarto_algo_sss), AI_Player(quarto_algo_neg)], state)
-                print(str(Quarto.get_move()))
-                move = Quarto.get_move()    # find best move possible
-
-            if x <= 4:
-                # solve the game and give the Move to do it, id_solve return:
-                #   • Move: Best Move to play for the player.
-                #   • Result: Either 1 (certain victory of the first player) or -1 (certain defeat) or 0 (either draw)
-                #   • Depth: The minimal number of moves before victory (or defeat)
-
-                Result, Depth, move = id_solve(QuartoMind([], state), ai_depths=range(2, 4), win_score=90)
+            Quarto = QuartoMind([], state)
+            # first moves from the opening book, chosen randomly among the best ones
+            move = None if self.__book is None else self.__book.move(Quarto, self.__random)
+            # easyAI comes into place when the position is not in the book anymore
+            if move is None:
+                self.__tt.collect(Quarto)     # drop the positions which can not be reached anymore
+                self.__tt.age()     # entries of the previous moves are replaced first
+                # the move may have been found while the opponent was thinking
+                move = None if self.__ponder is None else self.__ponder.result(Quarto)
+            if move is None:
+                move = timedsearch(self._search, Quarto, self._timeleft(), self._gametime())    # find best move possible
+            move = Quarto.servermove(move)
+            print(str(move))
 
         # apply the move to check for quarto
         # applymove will raise if we announce a quarto while there is not
@@ -625,20 +344,31 @@ class QuartoAI(game.GameClient):
 class QuartoAIBOT1(game.GameClient):
     """Class representing a client for the Quarto game."""
 
-    def __init__(self, name, server, verbose=False):
-        super().__init__(server, QuartoState, verbose=verbose)
+    def __init__(self, name, server, verbose=False, shared=None, persistent=None, session=False, transport=None):
+        self.__tt = QuartoTT(TT_ENTRIES, shared, persistent)    # kept for the whole game
+        super().__init__(server, QuartoState, verbose=verbose, session=session, transport=transport)
         self.__name = name
 
     def _handle(self, message):
         pass
 
-    def _nextmove(self, state):
+    def _newgame(self):
+        self.__tt.newgame()
+
+    def _search(self, Quarto):
         # solve the game and give the Move to do it, id_solve return:
         #   • Move: Best Move to play for the player.
         #   • Result: Either 1 (certain victory of the first player) or -1 (certain defeat) or 0 (either draw)
         #   • Depth: The minimal number of moves before victory (or defeat)
+        Result, Depth, move = id_solve(Quarto, ai_depths=range(2, 4), win_score=90, tt=self.__tt)
+        return move
 
-        Result, Depth, move = id_solve(QuartoMind([], state), ai_depths=range(2, 4), win_score=90)
+    def _nextmove(self, state):
+        Quarto = QuartoMind([], state)
+        self.__tt.collect(Quarto)
+        self.__tt.age()
+        # stopped in time if the server has a time control
+        move = Quarto.servermove(timedsearch(self._search, Quarto, self._timeleft(), self._gametime()))
         return json.dumps(move)  # send the Move
 
 
@@ -646,99 +376,565 @@ class QuartoAIBOT1(game.GameClient):
 class QuartoAIBOT2(game.GameClient):
     """Class representing a client for the Quarto game."""
 
-    def __init__(self, name, server, verbose=False):
-        super().__init__(server, QuartoState, verbose=verbose)
+    def __init__(self, name, server, verbose=False, shared=None, persistent=None, session=False, transport=None):
+        self.__tt = QuartoTT(TT_ENTRIES, shared, persistent)    # kept for the whole game
+        super().__init__(server, QuartoState, verbose=verbose, session=session, transport=transport)
         self.__name = name
 
     def _handle(self, message):
         pass
 
+    def _newgame(self):
+        self.__tt.newgame()
+
     def _nextmove(self, State):
-        QuartoMind.ttentry = lambda self: State     # Send State to the Transposition tables
-        quarto_algo_neg = SSS(3)    # Algorithm(depth, scoring=None, win_score=inf)
-        quarto_algo_sss = Negamax(6, win_score=90, tt=TT)    # Algorithm(depth, scoring=None, win_score=inf,tt=None)
+        quarto_algo_neg = SSS(3, tt=self.__tt)    # Algorithm(depth, scoring=None, win_score=inf)
+        quarto_algo_sss = Negamax(6, win_score=90, tt=self.__tt)    # Algorithm(depth, scoring=None, win_score=inf,tt=None)
         Quarto = QuartoMind([AI_Player(quarto_algo_neg), AI_Player(quarto_algo_sss)], State)
-        print(str(Quarto.get_move()))
-        move = Quarto.get_move()   # find best move possible
+        self.__tt.collect(Quarto)
+        self.__tt.age()
+        # find best move possible, stopped in time if the server has a time control
+        move = Quarto.servermove(timedsearch(QuartoMind.get_move, Quarto, self._timeleft(), self._gametime()))
+        print(str(move))
         return json.dumps(move)  # send the Move
 
 
 # easyAI
+#
+# QuartoMind works on a compact copy of the state: every piece is a 4-bit code
+# (its index in the initial list of QuartoState: shape, color, height, filling),
+# the board is a list of 16 codes (-1 for a free position) and a move is an int
+# packing the position and the code of the next piece ('pos | nextPiece << 5',
+# NOPIECE when there is no position or no next piece). servermove converts a
+# move back to the dictionary expected by the server.
+
+NOPIECE = 16
+
+# 00 01 02 03
+# 04 05 06 07
+# 08 09 10 11
+# 12 13 14 15
+LINES = [(0, 1, 2, 3), (4, 5, 6, 7), (8, 9, 10, 11), (12, 13, 14, 15),
+         (0, 4, 8, 12), (1, 5, 9, 13), (2, 6, 10, 14), (3, 7, 11, 15),
+         (0, 5, 10, 15), (3, 6, 9, 12)]
+POSLINES = [[line for line in LINES if pos in line] for pos in range(16)]
+
+# DEADLY[ones << 4 | zeros] is the set (bitmask) of pieces completing a line of 3 pieces
+# having the characteristics 'ones' in common, and not having the characteristics 'zeros'
+DEADLY = [sum(1 << code for code in range(16) if (ones & code) or (zeros & ~code))
+          for ones in range(16) for zeros in range(16)]
+
+# line masks for the vectorized evaluation
+_LINES = np.array(LINES)
+_MEMBER = np.array([[pos in line for line in LINES] for pos in range(16)])
+_CODES = np.arange(16)
+
+
+def piececode(piece):
+    '''Returns the 4-bit code of a piece given as a dictionary.'''
+    return ((piece['shape'] == 'square') << 3 | (piece['color'] == 'light') << 2 |
+            (piece['height'] == 'high') << 1 | (piece['filling'] == 'full'))
+
+
+def _quarto(a, b, c, d):
+    return (a & b & c & d) or (~a & ~b & ~c & ~d & 15)
+
+
 class QuartoMind(TwoPlayersGame):
+    stop = None     # threading.Event stopping the search when set
+
     def __init__(self, players, State):
         self.State = State
         self.players = players
         self.nplayer = 1
+        if State.codes is not None:
+            # the state was received in binary
+            board, pieces, self.hand = State.codes
+            self.pieces = pieces[:]
+            self.board = board[:]
+        else:
+            visible = State._state['visible']
+            # remaining pieces in the order of the server (including the piece to play)
+            self.pieces = [piececode(piece) for piece in visible['remainingPieces']]
+            self.board = [-1 if piece is None else piececode(piece) for piece in visible['board']]
+            self.hand = -1 if visible['pieceToPlay'] is None else self.pieces[visible['pieceToPlay']]
+        self.free = sum(1 << code for code in self.pieces)
+        self.quarto = False
+        self.history = []
+
+    # position given by the codes of the pieces on the board and of the piece to play (-1 for none)
+    @classmethod
+    def fromcodes(cls, board, hand, players=()):
+        pieces = QuartoState()._state['visible']['remainingPieces']
+        visible = {
+            'board': [None if code < 0 else pieces[code] for code in board],
+            'remainingPieces': [piece for code, piece in enumerate(pieces) if code not in board],
+            'pieceToPlay': None,
+            'quartoAnnounced': False
+        }
+        if hand >= 0:
+            visible['pieceToPlay'] = visible['remainingPieces'].index(pieces[hand])
+        return cls(list(players), QuartoState(visible, currentPlayer=0))
+
+    # number of pieces which are not on the board yet
+    @property
+    def remaining(self):
+        return bin(self.free).count('1')
+
+    # copy of the position only (TwoPlayersGame.copy deep-copies the State and the players)
+    def copy(self):
+        other = copy.copy(self)
+        other.board = self.board[:]
+        other.history = self.history[:]
+        other.__dict__.pop('ai_move', None)
+        return other
+
+    def _completes(self, pos):
+        # check the lines going through pos for a quarto
+        board = self.board
+        for a, b, c, d in POSLINES[pos]:
+            if board[a] >= 0 and board[b] >= 0 and board[c] >= 0 and board[d] >= 0 and \
+                    _quarto(board[a], board[b], board[c], board[d]):
+                return True
+        return False
+
+    def _deadly(self):
+        # returns the set (bitmask) of pieces which would complete a quarto on the board
+        deadly = 0
+        board = self.board
+        for line in LINES:
+            ones, zeros, empty = 15, 15, 0
+            for pos in line:
+                piece = board[pos]
+                if piece < 0:
+                    empty += 1
+                else:
+                    ones &= piece
+                    zeros &= ~piece
+            if empty == 1:
+                deadly |= DEADLY[ones << 4 | zeros & 15]
+        return deadly
 
     # structure of the game
     def possible_moves(self):
-        liste = []
-        visible = self.State._state['visible']
-
-        def nottoken():
-            notlink = []
-            for i in range(16):
-                if visible['board'][i] is None:
-                    notlink.append(i)
-            return notlink
-
-        boarddata = nottoken()
-
-        # if there is only one free position left on the board, play the last piece
-        if visible['board'].count(None) == 1:
-            liste.append({'pos': visible['board'].index(None), 'nextPiece': 0})
-
-        else:
-            for i in boarddata:
-                for n in range(len(visible['remainingPieces']) - 1):
-                    move = {}
-                    move['pos'] = i
-                    move['nextPiece'] = n
-                    move['quarto'] = True
-                    if visible['board'][i] is None:
-                        try:
-                            CopyState = copy.deepcopy(self.State)
-                            CopyState.applymove(move)
-                        except:
-                            del (move['quarto'])
-                        liste.append(move)
-        return liste
-
-    # applying move 
+        # the moves are sorted with the vectorized evaluation: winning moves first,
+        # then the safe ones and finally the moves giving a winning piece to the opponent
+        moves, scores = self.evaluate_moves()
+        return [moves[i] for i in sorted(range(len(moves)), key=scores.__getitem__)]
+
+    def evaluate_moves(self):
+        # returns all the moves with the score of the resulting position (see scoring), every
+        # (position, nextPiece) successor being evaluated at once on the line masks
+        if self.stop is not None and self.stop.is_set():
+            raise SearchStopped()
+        hand = self.hand
+        others = [code for code in range(16) if self.free >> code & 1 and code != hand]
+        if hand < 0:
+            return [NOPIECE | code << 5 for code in others], [0] * len(others)
+
+        board = np.array(self.board)
+        values = board[_LINES]
+        filled = values >= 0
+        count = filled.sum(1) + _MEMBER
+        ones = np.bitwise_and.reduce(np.where(filled, values, 15), axis=1)
+        zeros = np.bitwise_and.reduce(np.where(filled, ~values, 15), axis=1) & 15
+        # lines (rows) after placing the piece to play on each position (columns)
+        ones = np.where(_MEMBER, ones & hand, ones)
+        zeros = np.where(_MEMBER, zeros & ~hand, zeros)
+        empty = board < 0
+        win = (_MEMBER & (count == 4) & ((ones | zeros) != 0)).any(1) & empty
+        if win.any():
+            nextpiece = others[0] if others else NOPIECE
+            return [int(pos) | nextpiece << 5 for pos in np.flatnonzero(win)], [-100] * int(win.sum())
+        if not others:
+            return [int(pos) | NOPIECE << 5 for pos in np.flatnonzero(empty)], [0] * int(empty.sum())
+
+        # deadly[pos, code]: 'code' completes a quarto once the piece is played on 'pos'
+        deadly = ((count == 3)[:, :, None] &
+                  (((ones[:, :, None] & _CODES) | (zeros[:, :, None] & ~_CODES)) != 0)).any(1)
+        deadly = deadly[:, others]
+        scores = np.where(deadly, 99, deadly - deadly.sum(1, keepdims=True))[empty]
+        positions = np.flatnonzero(empty)
+        moves = positions[:, None] | np.array(others) << 5
+        return moves.ravel().tolist(), scores.ravel().tolist()
+
+    # applying move
     def make_move(self, move):
-        position = move['pos']
-        visible = self.State._state['visible']
-        if visible['board'][position] is None:
-            self.State.applymove(move)
-
-    def win(self):
-        return self.State.winner()
+        pos, nextpiece = move & 31, move >> 5
+        self.history.append((self.hand, self.quarto))
+        if pos != NOPIECE:
+            self.board[pos] = self.hand
+            self.free ^= 1 << self.hand
+            self.quarto = self._completes(pos)
+        self.hand = -1 if nextpiece == NOPIECE else nextpiece
+
+    def unmake_move(self, move):
+        pos = move & 31
+        self.hand, self.quarto = self.history.pop()
+        if pos != NOPIECE:
+            self.board[pos] = -1
+            self.free |= 1 << self.hand
+
+    # pieces which can be given to the opponent, in the order of the server
+    def _nextpieces(self):
+        return [code for code in self.pieces if self.free >> code & 1 and code != self.hand]
+
+    # translate a move into the move sent to the server
+    def servermove(self, move):
+        pos, nextpiece = move & 31, move >> 5
+        result = {}
+        if pos != NOPIECE:
+            result['pos'] = pos
+        if nextpiece != NOPIECE:
+            result['nextPiece'] = self._nextpieces().index(nextpiece)
+        self.make_move(move)
+        if self.quarto:
+            result['quarto'] = True
+        self.unmake_move(move)
+        return result
+
+    # translate a move sent to the server into a move
+    def parsemove(self, move):
+        pos = move['pos'] if self.hand >= 0 else NOPIECE
+        nextpieces = self._nextpieces()
+        nextpiece = nextpieces[move['nextPiece']] if nextpieces else NOPIECE
+        return pos | nextpiece << 5
+
+    def ttentry(self):
+        key = self.hand + 1
+        for piece in self.board:
+            key = key * 17 + piece + 1
+        return key
 
     # check if the game is over
     def is_over(self):
-        return False if self.win() == -1 else True
-    
+        return self.quarto or self.free == 0
+
     # show the state of the board
     def show(self):
-        self.State.prettyprint()
-    
-    # verifies the state of the game and returns its status
+        for row in range(4):
+            print(' '.join('..' if piece < 0 else '{:02}'.format(piece) for piece in self.board[4 * row:4 * row + 4]))
+
+    # verifies the state of the game and returns its status for the player who has to play:
+    # -100 if the opponent made a quarto, 99 if the piece to play makes a quarto and otherwise
+    # minus the number of pieces which can not be given anymore
     def scoring(self):
-        Score = self.win()
-        if Score == self.nopponent:
-            return 100
-        if Score in [-1, 2]:
-            return 0
-        else:
+        if self.quarto:
             return -100
+        if self.hand < 0:
+            return 0
+        deadly = self._deadly()
+        if deadly >> self.hand & 1:
+            return 99
+        return -bin(deadly & self.free & ~(1 << self.hand)).count('1')
+
+
+# transposition table of the clients
+class QuartoTT:
+    '''Class representing the transposition table kept by a client during a game (the
+    tables start empty at each game of a session, see newgame).
+
+    The number of pieces on the board only goes up: the entries are stored in one table
+    per number of remaining pieces and, after each move, the tables of the positions
+    which can not be reached anymore are dropped at once. The tables share the memory
+    budget of the process (easyAI.AI.memory_budget): when it is full, the entries of
+    the oldest searches and the shallowest ones are replaced first.
+
+    The positions which are not in the tables are looked up in 'persistent', a table
+    of the positions searched in the previous games (SqliteTT) which receives all the
+    entries stored, then in 'shared', a read-only table of precomputed positions
+    (MmapTT) shared by all the clients of the host.
+    '''
+
+    def __init__(self, max_entries, shared=None, persistent=None):
+        self.max_entries = max_entries
+        self.tables = [BoundedTT(max_entries) for remaining in range(17)]
+        self.shared = shared
+        self.persistent = persistent
+
+    def lookup(self, game):
+        table = self.tables[game.remaining]
+        entry = None if table is None else table.lookup(game)
+        if entry is None and self.persistent is not None:
+            entry = self.persistent.lookup(game)
+        if entry is None and self.shared is not None:
+            entry = self.shared.lookup(game)
+        return entry
+
+    def store(self, game, **data):
+        table = self.tables[game.remaining]
+        if table is not None:
+            table.store(game, **data)
+        if self.persistent is not None:
+            self.persistent.store(game, **data)
+
+    def age(self):
+        for table in self.tables:
+            if table is not None:
+                table.age()
+
+    # Quarto is the position reached by the game
+    def collect(self, Quarto):
+        for remaining in range(Quarto.remaining + 1, 17):
+            self.tables[remaining] = None
+
+    # next game of a session: the tables start empty, the bounds of the previous game are not
+    # kept, and the persistent table receives the entries of the game
+    def newgame(self):
+        self.tables = [BoundedTT(self.max_entries) for remaining in range(17)]
+        if self.persistent is not None:
+            self.persistent.flush()
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables if table is not None)
+
+    # hits, misses, stores and replaced entries of the tables of the game
+    def metrics(self):
+        metrics = {'entries': 0, 'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        for table in self.tables:
+            if table is not None:
+                for name, value in table.metrics().items():
+                    if name in metrics:
+                        metrics[name] += value
+        return metrics
+
+
+class SearchStopped(Exception):
+    '''Exception raised in a search which has been stopped.'''
+
+
+# search(Quarto) stopped before the time left by the server (if any) runs out, the best move
+# of the static evaluation being played if the search did not end. The time of the game is
+# shared between the moves left to play
+def timedsearch(search, Quarto, timeleft, gametime=None):
+    if timeleft is None:
+        return search(Quarto)
+    if gametime is not None:
+        timeleft = min(timeleft, gametime / max(1, (Quarto.remaining + 1) // 2))
+    position = Quarto.copy()    # the stopped search leaves the position in the middle of a line
+    position.stop = threading.Event()
+    timer = threading.Timer(TIME_MARGIN * timeleft, position.stop.set)
+    timer.start()
+    try:
+        return search(position)
+    except SearchStopped:
+        return Quarto.possible_moves()[0]
+    finally:
+        timer.cancel()
+
+
+# pondering => think on the opponent's time
+class QuartoPonder:
+    '''Class searching in a background thread the answers to the likely replies of the opponent.'''
+
+    def __init__(self, search):
+        self.__search = search
+        self.__results = {}
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    # Quarto is the position after our move, the opponent has to play
+    def start(self, Quarto):
+        self.stop()
+        self.__results = {}
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self._run, args=(Quarto.copy(), self.__stop, self.__results))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stop.set()
+            self.__thread.join()
+            self.__thread = None
+
+    # move found while pondering for this position (None if it was not searched)
+    def result(self, Quarto):
+        return self.__results.get(Quarto.ttentry())
+
+    def _run(self, Quarto, stop, results):
+        Quarto.stop = stop
+        try:
+            # the replies are sorted from the best to the worst for the opponent
+            for reply in Quarto.possible_moves():
+                Quarto.make_move(reply)
+                if not Quarto.is_over() and Quarto.remaining <= 13:
+                    position = Quarto.copy()
+                    results[position.ttentry()] = self.__search(position)
+                Quarto.unmake_move(reply)
+        except SearchStopped:
+            pass
+
+
+# opening book
+#
+# The book gives the best moves of the positions with at most BOOK_PIECES pieces on the board. It is
+# built offline ('quarto_AI.py book') and only stores one position of each class of equivalent
+# positions: the board can be transformed by the 32 permutations of the positions keeping the lines,
+# and the pieces by swapping the values of a characteristic (XOR) and by permuting the characteristics.
+# In the canonical form of a position the piece to play is always 0.
+#
+# File format (little-endian): b'QBK1', number of positions (uint32), and for each position:
+# the canonical board (16 bytes, piece code + 1 or 0 for a free position), the number of moves
+# (uint8) and the moves (one byte each, 'pos << 4 | nextPiece').
+#
+# quarto_book.bin is built with the defaults: 'python quarto_AI.py book --pieces=2 --depth=4'.
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quarto_book.bin')
+BOOK_PIECES = 2
+BOOK_DEPTH = 4      # plies from the positions with BOOK_PIECES pieces (Negamax(3) on their successors)
+
+
+def _boardsymmetries():
+    # rotation, transposition, swap of the inner and outer rows and columns, swap of the middle ones
+    def rowscols(order):
+        return tuple(4 * order[pos // 4] + order[pos % 4] for pos in range(16))
+    generators = [tuple(4 * (3 - pos % 4) + pos // 4 for pos in range(16)),
+                  tuple(4 * (pos % 4) + pos // 4 for pos in range(16)),
+                  rowscols((1, 0, 3, 2)), rowscols((0, 2, 1, 3))]
+    group = {tuple(range(16))}
+    frontier = list(group)
+    while frontier:
+        frontier = [tuple(perm[other[pos]] for pos in range(16)) for perm in frontier for other in generators]
+        frontier = [perm for perm in set(frontier) if perm not in group]
+        group.update(frontier)
+    return sorted(group)
+
+
+# _SQUARES[t, i]: position of the board giving the position i of the transformed board
+_SQUARES = np.array(_boardsymmetries())
+# _TRAITS[t, code]: code of a piece once its characteristics are permuted
+_TRAITS = np.array([[sum((code >> bit & 1) << order[bit] for bit in range(4)) for code in range(16)]
+                    for order in itertools.permutations(range(4))])
+_UNTRAITS = np.argsort(_TRAITS, axis=1)
+_POW17 = 17 ** np.arange(7, -1, -1, dtype=np.int64)
+
+
+def canonical(board, hand):
+    '''Returns the canonical form of the position (bytes) and the transformation (squares, traits, xor) giving it.'''
+    boards = np.array(board)[_SQUARES]
+    codes = np.where(boards >= 0, boards ^ hand, 0)
+    forms = np.where(boards >= 0, _TRAITS[:, codes] + 1, 0).reshape(-1, 16)
+    best = np.lexsort((forms[:, 8:] @ _POW17, forms[:, :8] @ _POW17))[0]
+    traits, squares = divmod(int(best), len(_SQUARES))
+    return forms[best].astype(np.uint8).tobytes(), (squares, traits, hand)
+
+
+class QuartoBook:
+    '''Class representing the opening book of the AI.'''
+
+    def __init__(self, positions=None):
+        self.positions = {} if positions is None else positions
+
+    @classmethod
+    def load(cls, filename=BOOK_FILE):
+        with open(filename, 'rb') as file:
+            data = file.read()
+        magic, count = struct.unpack_from('<4sI', data)
+        if magic != b'QBK1':
+            raise ValueError('{} is not an opening book'.format(filename))
+        positions = {}
+        offset = 8
+        for i in range(count):
+            size = data[offset + 16]
+            positions[data[offset:offset + 16]] = data[offset + 17:offset + 17 + size]
+            offset += 17 + size
+        return cls(positions)
+
+    def save(self, filename=BOOK_FILE):
+        with open(filename, 'wb') as file:
+            file.write(struct.pack('<4sI', b'QBK1', len(self.positions)))
+            for key in sorted(self.positions):
+                moves = self.positions[key]
+                file.write(key + bytes([len(moves)]) + moves)
+
+    def __len__(self):
+        return len(self.positions)
+
+    # best moves of the position (None if it is not in the book)
+    def moves(self, Quarto):
+        if Quarto.hand < 0:
+            return None
+        key, (squares, traits, xor) = canonical(Quarto.board, Quarto.hand)
+        moves = self.positions.get(key)
+        if moves is None:
+            return None
+        return [int(_SQUARES[squares, move >> 4]) | (int(_UNTRAITS[traits, move & 15]) ^ xor) << 5 for move in moves]
+
+    # one of the best moves of the position, chosen randomly with 'rng' (None if it is not in the book)
+    def move(self, Quarto, rng=random):
+        moves = self.moves(Quarto)
+        return None if moves is None else rng.choice(moves)
+
+    @classmethod
+    def build(cls, pieces=BOOK_PIECES, depth=BOOK_DEPTH, verbose=False, tt=None):
+        '''Builds the book of the canonical positions with at most 'pieces' pieces on the board.
+
+        The successors of the last level (pieces + 1 pieces on the board) are evaluated by
+        Negamax(depth - 1), i.e. 'depth' plies from the last level: with the defaults, Negamax(3)
+        on the positions with 3 pieces. The value of the other positions is backed up from the
+        one of their best move, so the position with n pieces is searched depth + pieces - n
+        plies deep. The searches fill the transposition table 'tt'.
+        '''
+        levels = [{bytes(16): None}]    # canonical positions => canonical successors of each move
+        for placed in range(pieces + 1):
+            following = {}
+            for key in levels[-1]:
+                Quarto = QuartoMind.fromcodes([code - 1 for code in key], 0)
+                children = []
+                for move in Quarto.possible_moves():
+                    Quarto.make_move(move)
+                    children.append((move, canonical(Quarto.board, Quarto.hand)[0]))
+                    if placed == pieces and children[-1][1] not in following:
+                        following[children[-1][1]] = Quarto.copy()
+                    Quarto.unmake_move(move)
+                levels[-1][key] = children
+                if placed < pieces:
+                    following.update((child, None) for move, child in children)
+            if verbose:
+                print(' {} pieces on the board: {} positions'.format(placed, len(levels[-1])))
+            levels.append(following)
+
+        # value of the canonical positions for the player who has to play them
+        values = {}
+        if tt is None:
+            tt = TT(max_entries=TT_ENTRIES)
+        for child, Quarto in levels.pop().items():
+            if Quarto.is_over():
+                values[child] = Quarto.scoring()
+            else:
+                ai = Negamax(depth - 1, win_score=90, tt=tt)
+                ai(Quarto)
+                values[child] = ai.alpha
+        book = cls()
+        for level in reversed(levels):
+            for key, children in level.items():
+                best = max(-values[child] for move, child in children)
+                moves = [move for move, child in children if -values[child] == best]
+                book.positions[key] = bytes((move & 31) << 4 | move >> 5 for move in moves)
+                values[key] = best
+        return book
+
+_book = []
+
+
+def openingbook():
+    '''Returns the opening book of the AI (loaded once), None if it has not been built.'''
+    if not _book:
+        try:
+            _book.append(QuartoBook.load())
+        except OSError:
+            print('No opening book found, run "quarto_AI.py book" to build it.')
+            _book.append(None)
+    return _book[0]
 
 
 # player => human player can play against AI
 class QuartoPlayer(game.GameClient):
     '''Class representing a client for the Quarto game.'''
 
-    def __init__(self, name, server, verbose=False):
-        super().__init__(server, QuartoState, verbose=verbose)
+    def __init__(self, name, server, verbose=False, transport=None):
+        super().__init__(server, QuartoState, verbose=verbose, transport=transport)
         self.__name = name
 
     def _handle(self, message):
@@ -798,8 +994,18 @@ if __name__ == '__main__':
     # Create the parser for the 'server' subcommand
     server_parser = subparsers.add_parser('server', help='launch a server')
     server_parser.add_argument('--host', help='hostname (default: localhost)', default='localhost')
-    server_parser.add_argument('--port', help='port to listen on (default: 5000)', default=5000)
+    server_parser.add_argument('--port', help='port to listen on (default: 5000)', type=int, default=5000)
     server_parser.add_argument('--verbose', action='store_true')
+    server_parser.add_argument('--games', type=int,
+                               help='host this number of games at once, at tables of two clients in their order of '
+                                    'connection (default: one game), 0 to host games until interrupted')
+    server_parser.add_argument('--movetime', type=float, help='seconds to play each move (default: no limit)')
+    server_parser.add_argument('--gametime', type=float, help='seconds of each player for the game (default: no limit)')
+    server_parser.add_argument('--increment', type=float, default=0,
+                               help='seconds added to the game time of a player after each move (default: 0)')
+    server_parser.add_argument('--metrics-port', type=int, dest='metricsport',
+                               help='serve the Prometheus metrics of the games on http://127.0.0.1:<port>/metrics')
+    server_parser.add_argument('--record', help='append the games to this log file (see replay.py)')
     # Create the parser for the 'client' subcommand
     player_parser = subparsers.add_parser('player', help='launch a client')
     player_parser.add_argument('name', help='name of the player')
@@ -812,18 +1018,37 @@ if __name__ == '__main__':
     AI_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
     AI_parser.add_argument('--port', help='port of the server (default: 5000)', default=5000)
     AI_parser.add_argument('--verbose', action='store_true')
+    AI_parser.add_argument('--ponder', action='store_true', help="think on the opponent's time")
+    AI_parser.add_argument('--tt', help='precomputed transposition table (see easyAI.AI.MmapTT)')
+    AI_parser.add_argument('--memory', help='megabytes for the transposition tables (default: {})'.format(TT_MEMORY),
+                           type=float, default=TT_MEMORY)
+    AI_parser.add_argument('--db', help='transposition table kept from a game to the next (SQLite file)')
+    AI_parser.add_argument('--session', action='store_true',
+                           help='stay connected to play game after game (with a server hosting many games)')
     # Create the parser for the 'clientAIBOT' subcommand
     AI_parser = subparsers.add_parser('BOT1', help='launch a client')
     AI_parser.add_argument('name', help='name of the player')
     AI_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
     AI_parser.add_argument('--port', help='port of the server (default: 5000)', default=5000)
     AI_parser.add_argument('--verbose', action='store_true')
+    AI_parser.add_argument('--tt', help='precomputed transposition table (see easyAI.AI.MmapTT)')
+    AI_parser.add_argument('--memory', help='megabytes for the transposition tables (default: {})'.format(TT_MEMORY),
+                           type=float, default=TT_MEMORY)
+    AI_parser.add_argument('--db', help='transposition table kept from a game to the next (SQLite file)')
+    AI_parser.add_argument('--session', action='store_true',
+                           help='stay connected to play game after game (with a server hosting many games)')
     # Create the parser for the 'clientAIBOT' subcommand
     AI_parser = subparsers.add_parser('BOT2', help='launch a client')
     AI_parser.add_argument('name', help='name of the player')
     AI_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
     AI_parser.add_argument('--port', help='port of the server (default: 5000)', default=5000)
     AI_parser.add_argument('--verbose', action='store_true')
+    AI_parser.add_argument('--tt', help='precomputed transposition table (see easyAI.AI.MmapTT)')
+    AI_parser.add_argument('--memory', help='megabytes for the transposition tables (default: {})'.format(TT_MEMORY),
+                           type=float, default=TT_MEMORY)
+    AI_parser.add_argument('--db', help='transposition table kept from a game to the next (SQLite file)')
+    AI_parser.add_argument('--session', action='store_true',
+                           help='stay connected to play game after game (with a server hosting many games)')
     # Create the parser for the 'clientAIBOT' subcommand
     AI_parser = subparsers.add_parser('BOT3', help='launch a client')
     AI_parser.add_argument('name', help='name of the player')
@@ -836,15 +1061,56 @@ if __name__ == '__main__':
     AI_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
     AI_parser.add_argument('--port', help='port of the server (default: 5000)', default=5000)
     AI_parser.add_argument('--verbose', action='store_true')
+    # Create the parser for the 'book' subcommand
+    book_parser = subparsers.add_parser('book', help='build the opening book of the AI')
+    book_parser.add_argument('--pieces', help='pieces on the board in the positions of the book (default: {})'.format(BOOK_PIECES),
+                             type=int, default=BOOK_PIECES)
+    book_parser.add_argument('--depth', help='plies searched from the positions with the most pieces, Negamax(depth - 1) '
+                             'on their successors (default: {})'.format(BOOK_DEPTH),
+                             type=int, default=BOOK_DEPTH)
+    book_parser.add_argument('--output', help='book file (default: {})'.format(os.path.basename(BOOK_FILE)),
+                             default=BOOK_FILE)
+    book_parser.add_argument('--tt', help='also save the positions searched in a transposition table for the clients')
     # Parse the arguments of sys.args
     args = parser.parse_args()
+    # the precomputed table is mapped in memory, not loaded
+    shared = MmapTT(args.tt) if args.component in ('AI', 'BOT1', 'BOT2') and args.tt else None
+    # the positions searched in the previous games, without cache: the tables of QuartoTT are in front of it
+    persistent = SqliteTT(args.db, cache=False) if args.component in ('AI', 'BOT1', 'BOT2') and args.db else None
+    if args.component in ('AI', 'BOT1', 'BOT2'):
+        memory_budget.set_limit(args.memory)
     if args.component == 'server':
-        QuartoServer(verbose=args.verbose).run()
+        timecontrol = {'movetime': args.movetime, 'gametime': args.gametime, 'increment': args.increment}
+        games = None if args.record is None else recorder.GameRecorder(args.record)
+        try:
+            if args.games is None:
+                QuartoServer(verbose=args.verbose, host=args.host, port=args.port, metricsport=args.metricsport,
+                             recorder=games, **timecontrol).run()
+            else:
+                game.GameHost(lambda: QuartoServer(**timecontrol), host=args.host, port=args.port,
+                              games=args.games or None, verbose=args.verbose, metricsport=args.metricsport,
+                              recorder=games).run()
+        finally:
+            if games is not None:
+                games.close()
     elif args.component == 'AI':
-        QuartoAI(args.name, (args.host, args.port), verbose=args.verbose)
+        QuartoAI(args.name, (args.host, args.port), verbose=args.verbose, ponder=args.ponder, shared=shared, persistent=persistent,
+                 session=args.session)
     elif args.component == 'player':
         QuartoPlayer(args.name, (args.host, args.port), verbose=args.verbose)
     elif args.component == 'BOT1':
-        QuartoAIBOT1(args.name, (args.host, args.port), verbose=args.verbose)
+        QuartoAIBOT1(args.name, (args.host, args.port), verbose=args.verbose, shared=shared, persistent=persistent,
+                     session=args.session)
     elif args.component == 'BOT2':
-        QuartoAIBOT2(args.name, (args.host, args.port), verbose=args.verbose)
+        QuartoAIBOT2(args.name, (args.host, args.port), verbose=args.verbose, shared=shared, persistent=persistent,
+                     session=args.session)
+    elif args.component == 'book':
+        tt = TT(max_entries=TT_ENTRIES)
+        book = QuartoBook.build(args.pieces, args.depth, verbose=True, tt=tt)
+        book.save(args.output)
+        print(' {} positions saved in {}.'.format(len(book), args.output))
+        if args.tt:
+            MmapTT.save(tt, args.tt)
+            print(' {} positions saved in {}.'.format(len(tt), args.tt))
+    if persistent is not None:
+        persistent.close()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# replay.py
+# Replay of the games recorded by the Quarto server (quarto_AI.py server --record): lists the games
+# and their slowest moves, shows the position before any move and hands it to a bot to time or
+# profile its move.
+
+import argparse
+import contextlib
+import copy
+import cProfile
+import io
+import pstats
+import time
+
+from lib import recorder
+from quarto_AI import QuartoState, QuartoServer
+from tournament import PLAYERS
+
+
+def position(record, k):
+    '''Return the state of a recorded game before its move k (the k first moves applied).'''
+    server = QuartoServer()
+    server._state = recorder.decodestate(record['state'], QuartoState)
+    for move in record['moves'][:k]:
+        # an invalid move only passes the turn
+        if move is not None:
+            server.applymove(move)
+        server._state.nextPlayer()
+    return server._state
+
+
+def slowest(records, n):
+    '''Return the n slowest moves of the games as (think time, game, move) tuples.'''
+    moves = [(t, g, k) for g, record in enumerate(records) for k, t in enumerate(record['times'])]
+    return sorted(moves, reverse=True)[:n]
+
+
+def nextmove(bot, state, repeat=1, profile=False):
+    '''Ask 'repeat' times its move in the state to the bot (a name of PLAYERS), and return the
+    move, the best time and the profile of the calls (None if not profiled).'''
+    player = PLAYERS[bot](bot)
+    profiler = cProfile.Profile() if profile else None
+    times = []
+    for i in range(repeat):
+        # the clients may modify the state, and print their moves
+        state = copy.deepcopy(state)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            move = player._nextmove(state)
+            if profiler is not None:
+                profiler.disable()
+            times.append(time.perf_counter() - start)
+    return move, min(times), profiler
+
+
+def listgames(records):
+    print('{:>5}  {:<19} {:<21} {:>6} {:>6} {:>9}'.format('game', 'date', 'players', 'result', 'moves', 'max (ms)'))
+    for g, record in enumerate(records):
+        players = ' - '.join(name or '?' for name in record['players'])
+        print('{:>5}  {:<19} {:<21} {:>6} {:>6} {:>9.1f}'
+              .format(g, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['time'])), players,
+                      str(record['result']), len(record['moves']), 1000 * max(record['times'], default=0)))
+
+
+def showgame(record):
+    for k, (move, t) in enumerate(zip(record['moves'], record['times'])):
+        print(' {:>3} {:>9.1f} ms  {}'.format(k, 1000 * t, 'invalid' if move is None else move))
+    print(' Result:', record['result'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay of the recorded Quarto games')
+    parser.add_argument('files', nargs='+', help='game logs, e.g. games.log.1 games.log (in their order)')
+    parser.add_argument('--game', type=int, help='number of the game in the logs (see the list of the games)')
+    parser.add_argument('--move', type=int, help='show the position before this move of the game')
+    parser.add_argument('--slowest', type=int, help='list the slowest moves of the games')
+    parser.add_argument('--bot', choices=sorted(PLAYERS), help='ask its move in the position to this bot')
+    parser.add_argument('--repeat', type=int, default=1, help='ask the move this number of times (best time)')
+    parser.add_argument('--profile', action='store_true', help='profile the bot (functions by cumulative time)')
+    args = parser.parse_args()
+    records = list(recorder.read(args.files))
+    if args.game is None:
+        if args.slowest:
+            print('{:>9} {:>5} {:>5}'.format('time (ms)', 'game', 'move'))
+            for t, g, k in slowest(records, args.slowest):
+                print('{:>9.1f} {:>5} {:>5}'.format(1000 * t, g, k))
+        else:
+            listgames(records)
+    elif args.move is None:
+        showgame(records[args.game])
+    else:
+        record = records[args.game]
+        state = position(record, args.move)
+        state.prettyprint()
+        if args.move < len(record['moves']):
+            print(' Recorded move: {} ({:.1f} ms)'.format(record['moves'][args.move], 1000 * record['times'][args.move]))
+        if args.bot:
+            move, best, profiler = nextmove(args.bot, state, args.repeat, args.profile)
+            print(' {} move: {} ({:.1f} ms)'.format(args.bot, move, 1000 * best))
+            if profiler is not None:
+                pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
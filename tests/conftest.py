@@ -0,0 +1,7 @@
+# conftest.py
+# The modules of the project are imported from its root, whatever the directory pytest runs from.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,61 @@
+# test_book.py
+# The opening book stores one position of each class of equivalent positions: the moves read
+# for a position transformed by a symmetry must be the transformed moves of the position.
+
+import random
+
+import numpy as np
+import pytest
+
+from quarto_AI import QuartoMind, QuartoState, BOOK_PIECES, openingbook, _SQUARES, _TRAITS
+
+
+@pytest.fixture(scope='module')
+def book():
+    book = openingbook()
+    if book is None:
+        pytest.skip('the opening book has not been built')
+    return book
+
+
+def positions(n, seed=0):
+    '''Return n positions of random games with at most BOOK_PIECES pieces on the board.'''
+    rng = random.Random(seed)
+    result = []
+    while len(result) < n:
+        state = QuartoState(currentPlayer=0, rng=rng)
+        Quarto = QuartoMind([], state)
+        for _ in range(rng.randint(1, BOOK_PIECES + 1)):
+            state.applymove(Quarto.servermove(rng.choice(Quarto.possible_moves())))
+            state.nextPlayer()
+            Quarto = QuartoMind([], state)
+        result.append(Quarto)
+    return result
+
+
+def transform(squares, traits, xor):
+    '''Return the functions mapping a board and a move through a symmetry: the board is
+    permuted by _SQUARES[squares], and the characteristics of the pieces by _TRAITS[traits]
+    before swapping the values of the characteristics of 'xor'.'''
+    positions = np.argsort(_SQUARES[squares])
+
+    def piece(code):
+        return int(_TRAITS[traits, code]) ^ xor
+
+    def board(codes):
+        return [-1 if codes[pos] < 0 else piece(codes[pos]) for pos in _SQUARES[squares]]
+
+    def move(move):
+        return int(positions[move & 31]) | piece(move >> 5) << 5
+    return board, piece, move
+
+
+@pytest.mark.parametrize('Quarto', positions(50))
+def test_symmetric_positions(book, Quarto):
+    rng = random.Random(Quarto.ttentry())
+    board, piece, move = transform(rng.randrange(len(_SQUARES)), rng.randrange(len(_TRAITS)), rng.randrange(16))
+    other = QuartoMind.fromcodes(board(Quarto.board), piece(Quarto.hand))
+    moves = book.moves(Quarto)
+    assert moves and set(moves) <= set(Quarto.possible_moves())
+    assert set(book.moves(other)) == {move(m) for m in moves}
+    assert set(book.moves(other)) <= set(other.possible_moves())
@@ -0,0 +1,54 @@
+# test_hashes.py
+# The hashes of easyAI.AI.Hashes computed for many keys at once with Numpy (hash_array) must
+# be the hashes of each key, and the Zobrist hash updated after a move the hash of the new key.
+
+import random
+
+import pytest
+
+from easyAI.AI import FNVHashTT, MixHashTT, JSWHashTT, ZobristHashTT
+
+np = pytest.importorskip('numpy')
+
+HASHES = [FNVHashTT, MixHashTT, JSWHashTT, lambda: ZobristHashTT(16, 17)]
+
+
+def keys(n, values, seed=0):
+    '''Return n random keys of 16 ints in range(values).'''
+    rng = random.Random(seed)
+    return [[rng.randrange(values) for i in range(16)] for k in range(n)]
+
+
+@pytest.mark.parametrize('hash', HASHES)
+@pytest.mark.parametrize('modulo', [1024, 2**61 - 1])
+def test_hash_array(hash, modulo):
+    table = hash()
+    table.modulo = modulo
+    boards = keys(200, 17)
+    hashes = table.hash_array(np.array(boards))
+    assert hashes.dtype == np.uint64
+    assert hashes.tolist() == [table.get_hash(tuple(board)) for board in boards]
+
+
+@pytest.mark.parametrize('hash', HASHES[:3])
+def test_hash_array_of_wide_ints(hash):
+    table = hash()
+    table.modulo = 2**61 - 1
+    for bits in (8, 40, 64):
+        boards = keys(50, 2**bits, seed=bits)
+        assert table.hash_array(np.array(boards, dtype=np.uint64)).tolist() == \
+            [table.get_hash(tuple(board)) for board in boards]
+
+
+def test_zobrist_update():
+    rng = random.Random(0)
+    zobrist = ZobristHashTT(16, 17)
+    board = [0] * 16
+    h = zobrist.hash64(board)
+    for move in range(100):
+        index, value = rng.randrange(16), rng.randrange(17)
+        h = zobrist.update(h, index, board[index], value)
+        board[index] = value
+        assert h == zobrist.hash64(board)
+    zobrist.modulo = 2**20
+    assert zobrist.get_hash(board) == h % 2**20
@@ -0,0 +1,98 @@
+# test_metrics.py
+# The metrics of the game servers rendered in the Prometheus text format, read back by a
+# parser of the format, and served over HTTP.
+
+import re
+import urllib.error
+import urllib.request
+
+import pytest
+
+from lib.metrics import CONTENT_TYPE, Counter, GameMetrics, Histogram
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)",?')
+
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda match: {'n': '\n'}.get(match.group(1), match.group(1)), value)
+
+
+def parse(text):
+    '''Return the types of the metrics and their samples {(name, labels): value}.'''
+    types, samples = {}, {}
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            name, kind = line[len('# TYPE '):].split(' ')
+            types[name] = kind
+        elif not line.startswith('# HELP '):
+            match = SAMPLE.match(line)
+            assert match, line
+            name, labels, value = match.groups()
+            labels = labels or ''
+            assert LABEL.sub('', labels) == '', line
+            labels = tuple((label, unescape(value)) for label, value in LABEL.findall(labels))
+            samples[name, labels] = float(value)
+    return types, samples
+
+
+def test_counters():
+    metrics = GameMetrics()
+    metrics.active.inc(2)
+    metrics.active.dec()
+    metrics.finished.inc(value=0)
+    metrics.finished.inc(value=0)
+    metrics.finished.inc(value='draw')
+    metrics.sent.inc(120)
+    types, samples = parse(metrics.render())
+    assert types['game_games_active'] == 'gauge'
+    assert types['game_games_finished_total'] == 'counter'
+    assert samples['game_games_active', ()] == 1
+    assert samples['game_games_finished_total', (('result', '0'),)] == 2
+    assert samples['game_games_finished_total', (('result', 'draw'),)] == 1
+    assert samples['game_sent_bytes_total', ()] == 120
+    assert samples['game_timeouts_total', ()] == 0
+
+
+def test_label_escaping():
+    counter = Counter('names_total', 'Names.', 'name')
+    names = ['plain', 'say "hi"', 'back\\slash', 'two\nlines', '\\"']
+    for name in names:
+        counter.inc(value=name)
+    lines = ['{} {}'.format(sample, value) for sample, value in counter.samples()]
+    samples = parse('\n'.join(lines) + '\n')[1]
+    assert samples == {('names_total', (('name', name),)): 1 for name in names}
+
+
+def test_histogram():
+    histogram = Histogram('think_seconds', 'Think.', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2, 3):
+        histogram.observe(value)
+    lines = ['{} {}'.format(sample, value) for sample, value in histogram.samples()]
+    samples = parse('\n'.join(lines) + '\n')[1]
+    assert samples == {
+        ('think_seconds_bucket', (('le', '0.1'),)): 2,
+        ('think_seconds_bucket', (('le', '1'),)): 3,
+        ('think_seconds_bucket', (('le', '+Inf'),)): 5,
+        ('think_seconds_sum', ()): pytest.approx(5.65),
+        ('think_seconds_count', ()): 5,
+    }
+
+
+def test_serve():
+    metrics = GameMetrics('quarto')
+    metrics.timeouts.inc()
+    server = metrics.serve(port=0)
+    try:
+        url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+        with urllib.request.urlopen(url + '/metrics', timeout=10) as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            types, samples = parse(response.read().decode())
+        assert types['quarto_think_seconds'] == 'histogram'
+        assert samples['quarto_timeouts_total', ()] == 1
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + '/other', timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,128 @@
+# test_ponder.py
+# The AI thinks on the opponent's time: the reply of the opponent which has been searched while
+# pondering is answered without a new search, the other ones are searched on the clock.
+
+import copy
+import json
+import random
+import threading
+import time
+
+import pytest
+
+import quarto_AI
+from quarto_AI import QuartoAI, QuartoMind, QuartoState
+
+
+class AI(QuartoAI):
+    '''Pondering AI recording the positions it searched and the moves found.'''
+    def __init__(self):
+        self.found = {}
+        super().__init__('AI', None, ponder=True)
+
+    def _search(self, Quarto):
+        entry = Quarto.ttentry()
+        move = super()._search(Quarto)
+        self.found[entry] = move
+        return move
+
+
+def moves(Quarto):
+    '''Return the moves of the position which do not end the game, in the order of the search.'''
+    result = []
+    for move in Quarto.possible_moves():
+        Quarto.make_move(move)
+        if not Quarto.is_over():
+            result.append(move)
+        Quarto.unmake_move(move)
+    return result
+
+
+def position(pieces, seed=0):
+    '''Return the state of a random game with 'pieces' pieces on the board, and a move for it
+    which does not end the game.'''
+    rng = random.Random(seed)
+    while True:
+        state = QuartoState(currentPlayer=0, rng=rng)
+        for _ in range(pieces + 1):
+            Quarto = QuartoMind([], state)
+            # only the winning moves are searched when there is a quarto to make
+            if not moves(Quarto):
+                break
+            move = json.dumps(Quarto.servermove(rng.choice(moves(Quarto))))
+            before = copy.deepcopy(state)
+            state.applymove(json.loads(move))
+            state.nextPlayer()
+        else:
+            if moves(QuartoMind([], state)):
+                return before, move
+
+
+def reply(state, move, k):
+    '''Return the state after 'move' and the k-th reply of the opponent which does not end the
+    game (the order of the search while pondering), and its position.'''
+    state = copy.deepcopy(state)
+    state.applymove(json.loads(move))
+    state.nextPlayer()
+    Quarto = QuartoMind([], state)
+    state.applymove(Quarto.servermove(moves(Quarto)[k]))
+    state.nextPlayer()
+    return state, QuartoMind([], state)
+
+
+def wait(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pondered():
+    '''AI which has pondered the first reply to a move, and the state after that reply.'''
+    ai = AI()
+    state, move = position(10)
+    after, Quarto = reply(state, move, 0)
+    ai._ponder(state, move)
+    wait(lambda: Quarto.ttentry() in ai.found)
+    ai._stopponder()
+    return ai, after, Quarto
+
+
+def test_pondered_reply_is_not_searched(pondered, monkeypatch):
+    ai, state, Quarto = pondered
+    expected = Quarto.servermove(ai.found[Quarto.ttentry()])
+
+    def timedsearch(*args):
+        raise AssertionError('the pondered reply is searched again')
+    monkeypatch.setattr(quarto_AI, 'timedsearch', timedsearch)
+    ai.found.clear()
+    move = json.loads(ai._nextmove(state))
+    assert not ai.found
+    assert {key: move[key] for key in expected} == expected
+
+
+def test_other_reply_is_searched(pondered, monkeypatch):
+    ai = pondered[0]
+    state, Quarto = reply(*position(10), -1)
+    assert Quarto.ttentry() not in ai.found
+    searched = []
+
+    def timedsearch(search, Quarto, timeleft, gametime=None):
+        searched.append(Quarto.ttentry())
+        return search(Quarto)
+    monkeypatch.setattr(quarto_AI, 'timedsearch', timedsearch)
+    move = json.loads(ai._nextmove(state))
+    assert searched == [Quarto.ttentry()]
+    expected = Quarto.servermove(ai.found[Quarto.ttentry()])
+    assert {key: move[key] for key in expected} == expected
+
+
+def test_stop_joins_the_thread():
+    ai = AI()
+    threads = threading.active_count()
+    ai._ponder(*position(4))
+    assert threading.active_count() == threads + 1
+    ai._stopponder()
+    assert threading.active_count() == threads
+    ai._stopponder()
@@ -0,0 +1,181 @@
+# test_protocol.py
+# Framing of the messages of the game protocol (version 2) and compatibility with the
+# clients of the version 1, which send and receive each message as it is.
+
+import asyncio
+import socket
+
+import pytest
+
+from lib import game
+from lib.game import AsyncChannel, Channel, FRAME, MAX_FRAME_SIZE, _acceptedfeatures, _readytokens
+from quarto_AI import QuartoState
+
+
+class Trickle:
+    '''Socket receiving the bytes one by one, as a slow network would.'''
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+    def recv(self, size):
+        data = bytes(self.data[:1])
+        del self.data[:1]
+        return data
+
+
+@pytest.fixture
+def channels():
+    a, b = socket.socketpair()
+    server, client = Channel(a), Channel(b)
+    yield server, client
+    server.close()
+    client.close()
+
+
+def handshake(server, client, features=()):
+    client.send(' '.join(['READY', 'bob', 'PROTO=2'] + list(features)))
+    name, version, announced = _readytokens(server.recv())
+    server.accept(version, _acceptedfeatures(version, announced, QuartoState))
+    return name
+
+
+def test_ready_tokens():
+    assert _readytokens('READY') == (None, 1, set())
+    assert _readytokens('READY bob PROTO=2 STATE=binary') == ('bob', 2, {'STATE=binary'})
+    # a newer client is answered in the version of the server
+    assert _readytokens('READY PROTO=7')[1] == game.PROTOCOL_VERSION
+
+
+def test_version_2_frames(channels):
+    server, client = channels
+    assert handshake(server, client, [game.BINARY_STATE, game.DELTA_UPDATES]) == 'bob'
+    assert server.version == 2 and server.binary and server.delta and not server.session
+    # the acknowledgement and the first frames may arrive in the same segment
+    server.send('PLAY {}')
+    server.send(b'\x00\x01\n')
+    assert client.recv() == 'PROTO 2 STATE=binary UPDATES=delta'
+    assert client.version == 2 and client.features == {game.BINARY_STATE, game.DELTA_UPDATES}
+    assert client.recv() == 'PLAY {}'
+    assert client.recvbytes() == b'\x00\x01\n'
+    client.send('{"pos": 1}')
+    assert server.recv() == '{"pos": 1}'
+
+
+def test_version_1_client(channels):
+    server, client = channels
+    client.send('READY bob')
+    name, version, features = _readytokens(server.recv())
+    server.accept(version, _acceptedfeatures(version, features, QuartoState))
+    assert (name, server.version, server.features) == ('bob', 1, set())
+    # the messages are sent as they are, without frame nor acknowledgement
+    server.send('PLAY {"board": []}')
+    assert client.socket.recv(100) == b'PLAY {"board": []}'
+    client.socket.sendall(b'{"pos": 1}')
+    assert server.recv() == '{"pos": 1}'
+
+
+def test_features_need_version_2():
+    assert _acceptedfeatures(1, {game.BINARY_STATE, game.SESSION}, QuartoState, sessions=True) == set()
+    assert _acceptedfeatures(2, {game.SESSION}, QuartoState) == set()
+    assert _acceptedfeatures(2, {game.SESSION}, QuartoState, sessions=True) == {game.SESSION}
+
+
+class Declared(game.GameState):
+    '''State class which says it supports the features without implementing them.'''
+    nextPlayer = winner = prettyprint = None
+
+    @classmethod
+    def binary(cls):
+        return True
+
+    @classmethod
+    def delta(cls):
+        return True
+
+
+class Partial(game.GameState):
+    '''State class which only implements the binary encoding.'''
+    nextPlayer = winner = prettyprint = None
+
+    @classmethod
+    def binary(cls):
+        return True
+
+    def tobytes(self):
+        return b''
+
+    @classmethod
+    def frombytes(cls, data):
+        return cls({})
+
+    @classmethod
+    def delta(cls):
+        return True
+
+
+def test_features_need_the_methods():
+    features = {game.BINARY_STATE, game.DELTA_UPDATES}
+    assert game._statefeatures(QuartoState) == features
+    assert _acceptedfeatures(2, features, Declared) == set()
+    assert _acceptedfeatures(2, features, Partial) == {game.BINARY_STATE}
+    assert _acceptedfeatures(2, features, game.GameState) == set()
+
+
+def test_frames_cut_by_the_network():
+    messages = [b'PLAY ' + bytes(range(256)) * 10, b'', b'LOST']
+    channel = Channel(Trickle(b''.join(game._frame(message) for message in messages)))
+    channel.version = 2
+    assert [channel.recvbytes() for message in messages] == messages
+
+
+def test_frame_size():
+    with pytest.raises(ValueError):
+        game._frame(bytes(MAX_FRAME_SIZE + 1))
+    channel = Channel(Trickle(FRAME.pack(MAX_FRAME_SIZE + 1) + b'x'))
+    channel.version = 2
+    with pytest.raises(OSError):
+        channel.recvbytes()
+
+
+def test_async_channel():
+    async def exchange():
+        reader = asyncio.StreamReader()
+        channel = AsyncChannel(reader, None)
+        reader.feed_data(b'READY PROTO=2')
+        assert await channel.recv() == 'READY PROTO=2'
+        channel.version = 2
+        for message in (b'PLAY 1', b'\xc3\xa9', b''):
+            data = game._frame(message)
+            # a frame in two parts
+            reader.feed_data(data[:3])
+            reader.feed_data(data[3:])
+            assert await channel.recv() == message.decode()
+        reader.feed_data(FRAME.pack(10) + b'cut')
+        reader.feed_eof()
+        assert await channel.recv() == ''
+    asyncio.run(exchange())
+
+
+def test_acknowledgement_cut_by_the_network():
+    frame = game._frame('PLAY {}')
+    channel = Channel(Trickle(b'PROTO 2 STATE=binary\n' + frame))
+    assert channel.recv() == 'PROTO 2 STATE=binary'
+    assert channel.version == 2 and channel.binary
+    assert channel.recv() == 'PLAY {}'
+    # a message of the version 1 is not waited for
+    assert Channel(Trickle(b'WON')).recv() == 'W'
+
+
+def test_async_acknowledgement_cut_by_the_network():
+    async def exchange():
+        reader = asyncio.StreamReader()
+        channel = AsyncChannel(reader, None)
+        frame = game._frame('PLAY {}')
+        received = asyncio.ensure_future(channel.recvbytes())
+        for part in (b'PRO', b'TO 2 UPDATES=delta', b'\n' + frame[:2], frame[2:]):
+            reader.feed_data(part)
+            await asyncio.sleep(0)
+        assert await received == b'PROTO 2 UPDATES=delta'
+        assert channel.version == 2 and channel.delta
+        assert await channel.recv() == 'PLAY {}'
+    asyncio.run(exchange())
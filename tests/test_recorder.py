@@ -0,0 +1,58 @@
+# test_recorder.py
+# The records of the games: the log files rotate at their size limit, and a recorded game
+# replayed from its initial state gives back each of its moves.
+
+import contextlib
+import io
+import json
+import os
+import threading
+
+from lib import recorder, transport
+from lib.recorder import GameRecorder
+from quarto_AI import QuartoServer, QuartoAIBOT2
+import replay
+
+
+def test_rotation(tmp_path):
+    filename = str(tmp_path / 'games.log')
+    log = GameRecorder(filename, maxbytes=200, backups=2, batchsize=1)
+    games = [{'game': 'Quarto', 'moves': [k] * 20, 'result': 'draw'} for k in range(10)]
+    for game in games:
+        log.record(game)
+    log.close()
+    assert sorted(os.listdir(str(tmp_path))) == ['games.log', 'games.log.1', 'games.log.2']
+    for name in ('games.log.1', 'games.log.2'):
+        size = os.path.getsize(str(tmp_path / name))
+        assert 200 <= size < 200 + len(json.dumps(games[0]))
+    # the oldest games have been dropped, the others are read in their order
+    files = [filename + '.2', filename + '.1', filename]
+    kept = list(recorder.read(files))
+    assert kept and kept == games[-len(kept):]
+
+
+def test_replay(tmp_path):
+    filename = str(tmp_path / 'games.log')
+    log = GameRecorder(filename)
+    pipes = transport.PipeTransport()
+    server = QuartoServer(port=1, recorder=log, transport=pipes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=server.run)]
+        for name in ('a', 'b'):
+            threads.append(threading.Thread(target=QuartoAIBOT2, args=(name, ('localhost', 1)),
+                                            kwargs={'transport': pipes}))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(120)
+    log.close()
+    [record] = recorder.read([filename])
+    assert len(record['players']) == 2 and len(record['moves']) == len(record['times']) > 0
+    # the bots do not draw random choices: they play again the recorded moves
+    for k, move in enumerate(record['moves']):
+        state = replay.position(record, k)
+        assert json.loads(replay.nextmove('BOT2', state)[0]) == json.loads(move)
+    # the result is the one of the last move, before the turn passes
+    state.applymove(json.loads(move))
+    winner = state.winner()
+    assert record['result'] == ('draw' if winner is None else winner)
@@ -0,0 +1,54 @@
+# test_scoring.py
+# The vectorized evaluation of all the moves of a Quarto position (QuartoMind.evaluate_moves)
+# against the scoring of each successor.
+
+import random
+
+import pytest
+
+from quarto_AI import QuartoMind, NOPIECE
+
+
+def positions(n, seed=0):
+    '''Yield n random positions without quarto on the board, with a piece to play if any.'''
+    rng = random.Random(seed)
+    while n > 0:
+        codes = list(range(16))
+        rng.shuffle(codes)
+        pieces = rng.randrange(16)
+        board = [-1] * 16
+        for pos, code in zip(rng.sample(range(16), pieces), codes):
+            board[pos] = code
+        Quarto = QuartoMind.fromcodes(board, codes[pieces])
+        if not any(Quarto._completes(pos) for pos in range(16) if board[pos] >= 0):
+            n -= 1
+            yield Quarto
+
+
+@pytest.mark.parametrize('Quarto', list(positions(300)))
+def test_scores_of_the_successors(Quarto):
+    moves, scores = Quarto.evaluate_moves()
+    assert len(moves) == len(scores) > 0
+    for move, score in zip(moves, scores):
+        Quarto.make_move(move)
+        assert Quarto.scoring() == score
+        Quarto.unmake_move(move)
+
+
+@pytest.mark.parametrize('Quarto', list(positions(300, seed=1)))
+def test_all_the_moves_without_quarto(Quarto):
+    moves, scores = Quarto.evaluate_moves()
+    if -100 in scores:
+        # only the winning moves
+        assert set(scores) == {-100}
+        return
+    free = [pos for pos in range(16) if Quarto.board[pos] < 0]
+    others = [code for code in range(16) if Quarto.free >> code & 1 and code != Quarto.hand] or [NOPIECE]
+    assert sorted(moves) == sorted(pos | code << 5 for pos in free for code in others)
+
+
+def test_first_move_gives_a_piece():
+    Quarto = QuartoMind.fromcodes([-1] * 16, -1)
+    moves, scores = Quarto.evaluate_moves()
+    assert sorted(moves) == [NOPIECE | code << 5 for code in range(16)]
+    assert scores == [0] * 16
@@ -0,0 +1,132 @@
+# test_session.py
+# The chess clock of the games, and the sessions of the clients playing game after game on
+# one connection: a player who runs out of time must leave its session.
+
+import contextlib
+import io
+import json
+import socket
+import threading
+import time
+
+from lib import game, transport
+from quarto_AI import QuartoMind, QuartoServer, QuartoState
+
+MOVETIME = 0.3
+
+
+class Player(game.GameClient):
+    '''Client playing the first move of the evaluation, after 'delay' seconds for its first move.'''
+    def __init__(self, server, delay=0, session=False, transport=None):
+        self.delay = delay
+        self.games = 1
+        self.clocks = []
+        super().__init__(server, QuartoState, session=session, transport=transport)
+
+    def _handle(self, message):
+        pass
+
+    def _newgame(self):
+        self.games += 1
+
+    def _nextmove(self, state):
+        self.clocks.append(self._timeleft())
+        time.sleep(self.delay)
+        self.delay = 0
+        Quarto = QuartoMind([], state)
+        return json.dumps(Quarto.servermove(Quarto.possible_moves()[0]))
+
+
+def freeport():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start(target, *args, **kwargs):
+    thread = threading.Thread(target=target, args=args, kwargs=kwargs)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def test_clock():
+    clock = game.Clock(2, movetime=1, gametime=10, increment=2)
+    assert clock.enabled and clock.limit(0) == 1
+    clock.start()
+    assert clock.stop(0)
+    assert 11 < clock.remaining[0] <= 12 and clock.remaining[1] == 10
+    assert clock.message(1) == 'CLOCK 1.000 10.000'
+    clock = game.Clock(2, gametime=0.5)
+    assert clock.message(0) == 'CLOCK 0.500 0.500'
+    clock.start()
+    time.sleep(0.6)
+    assert clock.left(0) == 0.001 and not clock.stop(0)
+    assert not game.Clock(2).enabled and game.Clock(2).limit(0) is None
+
+
+def test_player_out_of_time():
+    pipes = transport.PipeTransport()
+    server = QuartoServer(port=1, transport=pipes, movetime=MOVETIME)
+    server._state = QuartoState(currentPlayer=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread = start(server.run)
+        players = []
+        client = start(lambda: players.append(Player(('localhost', 1), delay=2 * MOVETIME, transport=pipes)))
+        time.sleep(0.1)
+        fast = Player(('localhost', 1), transport=pipes)
+        thread.join(10)
+        client.join(5)
+    assert not thread.is_alive()
+    # the first player did not play in time
+    assert server.metrics.timeouts.values[None] == 1
+    assert dict(server.metrics.finished.values) == {1: 1}
+    assert fast.clocks == [] and players[0].clocks and 0 < players[0].clocks[0] <= MOVETIME
+
+
+def test_session_out_of_time():
+    port = freeport()
+    host = game.GameHost(lambda: QuartoServer(movetime=MOVETIME), host='127.0.0.1', port=port, games=2)
+    players = {}
+
+    def play(name, **kwargs):
+        players[name] = Player(('127.0.0.1', port), **kwargs)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread = start(host.run)
+        time.sleep(0.2)
+        clients = [start(play, 'fast', session=True)]
+        time.sleep(0.2)
+        clients.append(start(play, 'slow', delay=2 * MOVETIME, session=True))
+        # the slow player leaves its session when it runs out of time (its late move would
+        # be read as the READY of the next game): the fast one plays its next game with a
+        # player connected after the first game
+        deadline = time.monotonic() + 10
+        while not host.results and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.1)
+        clients.append(start(play, 'second'))
+        thread.join(30)
+        for client in clients:
+            client.join(5)
+    assert not thread.is_alive()
+    assert sum(host.results.values()) == 2 and 'aborted' not in host.results
+    assert host.metrics.timeouts.values[None] == 1
+    assert players['fast'].games == 2
+    assert players['slow'].games == 1
+
+
+def test_session():
+    port = freeport()
+    host = game.GameHost(lambda: QuartoServer(movetime=5), host='127.0.0.1', port=port, games=4)
+    players = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread = start(host.run)
+        time.sleep(0.2)
+        clients = [start(lambda: players.append(Player(('127.0.0.1', port), session=True))) for i in range(2)]
+        thread.join(30)
+        for client in clients:
+            client.join(5)
+    assert not thread.is_alive()
+    assert sum(host.results.values()) == 4 and 'aborted' not in host.results
+    assert [player.games for player in players] == [4, 4]
@@ -0,0 +1,68 @@
+# test_state.py
+# The Quarto states sent in binary (tobytes/frombytes) and updated with the moves (delta
+# updates) must stay the states of the server, with the same checksums.
+
+import copy
+import json
+import random
+
+import pytest
+
+from quarto_AI import QuartoMind, QuartoServer, QuartoState
+
+
+def game(seed):
+    '''Return the states before each turn of a random game and the moves played.'''
+    rng = random.Random(seed)
+    server = QuartoServer()
+    server._state = QuartoState(currentPlayer=seed % 2)
+    states, moves = [], []
+    while True:
+        states.append(copy.deepcopy(server._state))
+        if server._state.winner() != -1:
+            return states, moves
+        Quarto = QuartoMind([], server._state)
+        move = json.dumps(Quarto.servermove(rng.choice(Quarto.possible_moves())))
+        server.applymove(move)
+        server._state.nextPlayer()
+        moves.append(move)
+
+
+GAMES = [game(seed) for seed in range(20)]
+STATES = [state for states, moves in GAMES for state in states]
+
+
+@pytest.mark.parametrize('state', STATES)
+def test_bytes_round_trip(state):
+    data = state.tobytes()
+    decoded = QuartoState.frombytes(data)
+    assert decoded.tobytes() == data
+    assert str(decoded) == str(state)
+    assert decoded.checksum() == state.checksum()
+
+
+@pytest.mark.parametrize('state', STATES)
+def test_position_from_bytes(state):
+    # QuartoMind reads the codes of a state decoded from bytes instead of its pieces
+    expected, decoded = QuartoMind([], state), QuartoMind([], QuartoState.frombytes(state.tobytes()))
+    assert (decoded.board, decoded.hand, decoded.free) == (expected.board, expected.hand, expected.free)
+    assert decoded.possible_moves() == expected.possible_moves()
+
+
+@pytest.mark.parametrize('states, moves', GAMES)
+def test_delta_updates(states, moves):
+    # the client updates the state of its first turn with the moves of the server
+    state = QuartoState.frombytes(states[0].tobytes())
+    for move, expected in zip(moves, states[1:]):
+        state.update(move)
+        assert state.tobytes() == expected.tobytes()
+        assert state.checksum() == expected.checksum()
+
+
+def test_invalid_move_passes_the_turn():
+    state = GAMES[0][0][1]
+    updated = copy.deepcopy(state)
+    updated.update(None)
+    assert updated._state['visible'] == state._state['visible']
+    assert updated._state['currentPlayer'] == 1 - state._state['currentPlayer']
+    assert updated.checksum() != state.checksum()
@@ -0,0 +1,53 @@
+# test_tournament.py
+# The tournament replays the same games from the same seed, and its report rates the players
+# from their scores (Elo) and gives the percentiles of their move times.
+
+import math
+
+import pytest
+
+from tournament import elo, percentile, tournament
+
+
+def test_same_seed_same_games():
+    names = ['AI', 'BOT2']
+    first = tournament(names, 2, workers=1, seed=7)[0]
+    assert len(first) == 2 * 2
+    assert tournament(names, 2, workers=1, seed=7)[0] == first
+
+
+def games(a, b, wins, draws, losses):
+    '''Return the results of games between a and b, seen by both players.'''
+    results = []
+    for score, n in ((1.0, wins), (0.5, draws), (0.0, losses)):
+        for i in range(n):
+            results += [(a, b, score), (b, a, 1 - score)]
+    return results
+
+
+def test_elo():
+    ratings = elo(games('a', 'b', 2, 2, 2), ['a', 'b'])
+    assert ratings == pytest.approx({'a': 1500, 'b': 1500})
+    # three points of four: 400 * log10(3) points between the players
+    ratings = elo(games('a', 'b', 3, 0, 1), ['a', 'b'])
+    assert ratings['a'] + ratings['b'] == pytest.approx(3000)
+    assert ratings['a'] - ratings['b'] == pytest.approx(400 * math.log10(3), abs=1)
+    ratings = elo(games('a', 'b', 3, 0, 1) + games('b', 'c', 3, 0, 1), ['a', 'b', 'c'])
+    assert ratings['a'] > ratings['b'] > ratings['c']
+    assert ratings['b'] == pytest.approx(1500, abs=1)
+
+
+def test_elo_perfect_score():
+    ratings = elo(games('a', 'b', 4, 0, 0), ['a', 'b', 'c'])
+    assert ratings['a'] > ratings['c'] > ratings['b']
+    assert all(math.isfinite(rating) for rating in ratings.values())
+
+
+def test_percentile():
+    values = [10, 1, 9, 2, 8, 3, 7, 4, 6, 5]
+    assert percentile(values, 0) == 1
+    assert percentile(values, 0.5) == 6
+    assert percentile(values, 0.9) == 10
+    assert percentile(values, 0.99) == 10
+    assert percentile([4], 0.5) == 4
+    assert math.isnan(percentile([], 0.5))
@@ -0,0 +1,132 @@
+# test_transport.py
+# The transport in memory between the threads of a process (transport.PipeTransport), and
+# games played over it.
+
+import contextlib
+import io
+import socket
+import threading
+
+import pytest
+
+from lib import transport
+from lib.game import Channel, GameHost
+from quarto_AI import QuartoServer, QuartoAIBOT2
+
+
+@pytest.fixture
+def pipes():
+    return transport.PipeTransport(timeout=0.2)
+
+
+def test_connection(pipes):
+    listener = pipes.listen(('0.0.0.0', 1), 2)
+    client = pipes.connect(('localhost', 1))
+    server, address = listener.accept()
+    assert address == client.getsockname()
+    client.sendall(b'hello ')
+    client.sendall(bytearray(b'world'))
+    assert server.recv(3) == b'hel'
+    assert server.recv(100) == b'lo '
+    assert server.recv(100) == b'world'
+    server.sendall(b'bye')
+    server.close()
+    assert client.recv(100) == b'bye'
+    assert client.recv(100) == b''
+    with pytest.raises(BrokenPipeError):
+        client.sendall(b'late')
+    listener.close()
+
+
+def test_addresses_by_port(pipes):
+    listener = pipes.listen(('quarto', 1), 2)
+    with pytest.raises(OSError):
+        pipes.listen(('localhost', 1), 2)
+    with pytest.raises(ConnectionRefusedError):
+        pipes.connect(('quarto', 2))
+    listener.close()
+    with pytest.raises(ConnectionRefusedError):
+        pipes.connect(('quarto', 1))
+    pipes.listen(('localhost', 1), 2).close()
+
+
+def test_recv_timeout(pipes):
+    listener = pipes.listen(('localhost', 1), 2)
+    client = pipes.connect(('localhost', 1))
+    client.settimeout(0.05)
+    with pytest.raises(socket.timeout):
+        client.recv(10)
+    listener.close()
+
+
+def test_accept(pipes):
+    listener = pipes.listen(('localhost', 1), 2)
+    listener.settimeout(0.05)
+    with pytest.raises(socket.timeout):
+        listener.accept()
+    listener.settimeout(None)
+    # closing the listener stops the thread waiting in accept
+    errors = []
+
+    def accept():
+        try:
+            listener.accept()
+        except OSError as e:
+            errors.append(e)
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    threading.Timer(0.05, listener.close).start()
+    thread.join(5)
+    assert not thread.is_alive() and errors
+
+
+def test_framed_messages(pipes):
+    listener = pipes.listen(('localhost', 1), 2)
+    client = Channel(pipes.connect(('localhost', 1)))
+    server = Channel(listener.accept()[0])
+    client.send('READY PROTO=2')
+    assert server.recv() == 'READY PROTO=2'
+    server.accept(2)
+    server.send('PLAY ' + 'x' * 100000)
+    assert client.recv() == 'PROTO 2'
+    assert client.recv() == 'PLAY ' + 'x' * 100000
+    listener.close()
+
+
+def test_games_side_by_side():
+    # the example of the README, on two ports at once
+    pipes = transport.PipeTransport()
+    servers = [QuartoServer(port=port, transport=pipes) for port in (1, 2)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=server.run) for server in servers]
+        for port in (1, 2):
+            for name in ('a', 'b'):
+                threads.append(threading.Thread(target=QuartoAIBOT2, args=(name, ('localhost', port)),
+                                                kwargs={'transport': pipes}))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(120)
+    assert not any(thread.is_alive() for thread in threads)
+    for server in servers:
+        assert sum(server.metrics.finished.values.values()) == 1
+        assert server.metrics.sent.values[None] > 0
+
+
+def test_host_over_pipes():
+    pipes = transport.PipeTransport()
+    host = GameHost(QuartoServer, port=1, games=2, transport=pipes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=host.run)]
+        for name in 'abcd':
+            threads.append(threading.Thread(target=QuartoAIBOT2, args=(name, ('localhost', 1)),
+                                            kwargs={'transport': pipes}))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(120)
+    assert not any(thread.is_alive() for thread in threads)
+    assert sum(host.results.values()) == 2 and 'aborted' not in host.results
+    assert host.metrics.received.values[None] > 0 and host.metrics.sent.values[None] > 0
+    # the port is free again
+    pipes.listen(('localhost', 1)).close()
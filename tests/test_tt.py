@@ -0,0 +1,178 @@
+# test_tt.py
+# The transposition tables of easyAI.AI must not change the value found by a search: Negamax
+# with each table (empty, then filled by previous searches) against Negamax without table.
+
+import gc
+import random
+
+import pytest
+
+from easyAI.AI import (Negamax, TT, BoundedTT, MemoryBudget, ChunkTT, MmapTT, SqliteTT, LogTT,
+                       memory_budget)
+from easyAI.AI.DictTT import DictTT
+from quarto_AI import QuartoMind, QuartoTT, TT_ENTRIES
+
+DEPTH = 3
+
+
+def positions(n, pieces=6, seed=0):
+    '''Return n random positions with 'pieces' pieces on the board and without quarto.'''
+    rng = random.Random(seed)
+    result = []
+    while len(result) < n:
+        codes = list(range(16))
+        rng.shuffle(codes)
+        board = [-1] * 16
+        for pos, code in zip(rng.sample(range(16), pieces), codes):
+            board[pos] = code
+        Quarto = QuartoMind.fromcodes(board, codes[pieces])
+        if not any(Quarto._completes(pos) for pos in range(16) if board[pos] >= 0):
+            result.append(Quarto)
+    return result
+
+
+POSITIONS = positions(6)
+
+
+def value(Quarto, tt=None):
+    ai = Negamax(DEPTH, win_score=90, tt=tt)
+    move = ai(Quarto.copy())
+    return ai.alpha, move
+
+
+@pytest.fixture(scope='module')
+def expected():
+    return [value(Quarto)[0] for Quarto in POSITIONS]
+
+
+@pytest.fixture(scope='module')
+def solved():
+    '''A TT filled by the searches of the positions.'''
+    table = TT()
+    for Quarto in POSITIONS:
+        value(Quarto, table)
+    return table
+
+
+def check(table, expected, searches=2):
+    for i in range(searches):
+        for Quarto, alpha in zip(POSITIONS, expected):
+            found, move = value(Quarto, table)
+            assert found == alpha
+            assert move in Quarto.possible_moves()
+
+
+def test_tt(expected):
+    check(TT(), expected)
+
+
+def test_tt_max_entries(expected):
+    check(TT(max_entries=500), expected)
+
+
+def test_bounded_tt(expected):
+    check(BoundedTT(), expected)
+
+
+def test_bounded_tt_within_budget(expected):
+    budget = MemoryBudget(max_mb=0.1)
+    table = BoundedTT(budget=budget)
+    check(table, expected)
+    assert len(table) <= budget.max_entries
+    assert table.metrics()['evictions'] > 0
+
+
+def test_dict_tt(expected):
+    check(TT(own_dict=DictTT(64)), expected)
+
+
+def test_array_tt(expected):
+    ArrayTT = pytest.importorskip('easyAI.AI.ArrayTT').ArrayTT
+    check(ArrayTT(max_mb=0.05), expected)
+
+
+def test_array_tt_file(expected, tmp_path):
+    ArrayTT = pytest.importorskip('easyAI.AI.ArrayTT').ArrayTT
+    table = ArrayTT(max_mb=1)
+    check(table, expected, 1)
+    table.tofile(str(tmp_path / 'array.tt'))
+    check(ArrayTT().fromfile(str(tmp_path / 'array.tt')), expected)
+
+
+def test_tt_file(expected, solved, tmp_path):
+    solved.tofile(str(tmp_path / 'solved.tt'))
+    check(TT().fromfile(str(tmp_path / 'solved.tt')), expected)
+
+
+def test_mmap_tt(expected, solved, tmp_path):
+    MmapTT.save(solved, str(tmp_path / 'solved.mtt'))
+    table = MmapTT(str(tmp_path / 'solved.mtt'), overlay=TT())
+    assert len(table) == len(solved)
+    check(table, expected)
+    table.close()
+
+
+def test_chunk_tt(expected, solved, tmp_path):
+    ChunkTT.save(solved, str(tmp_path / 'solved.ctt'), block_size=64)
+    table = ChunkTT(str(tmp_path / 'solved.ctt'), overlay=TT())
+    assert len(table) == len(solved)
+    check(table, expected)
+    table.close()
+
+
+@pytest.mark.parametrize('cache', [None, False])
+def test_sqlite_tt(expected, tmp_path, cache):
+    filename = str(tmp_path / 'quarto.db')
+    table = SqliteTT(filename, cache=cache, batch_size=100)
+    check(table, expected, 1)
+    table.close()
+    # the next games read the entries of the previous ones
+    table = SqliteTT(filename, cache=cache)
+    assert len(table) > 0
+    check(table, expected)
+    table.close()
+
+
+def test_log_tt(expected, tmp_path):
+    table = LogTT(TT(), str(tmp_path / 'solve.log'), flush_every=100)
+    check(table, expected)
+    table.close()
+
+
+def test_quarto_tt_age(expected):
+    table = QuartoTT(TT_ENTRIES)
+    check(table, expected, 1)
+    assert len(table) > 0
+    table.age()
+    assert all(t.generation == 1 for t in table.tables)
+    check(table, expected)
+
+
+def test_quarto_tt_newgame(expected):
+    table = QuartoTT(TT_ENTRIES)
+    check(table, expected, 1)
+    table.age()
+    table.newgame()
+    # the next game does not start with the bounds of the previous one
+    assert len(table) == 0
+    assert all(t is not None and t.generation == 0 for t in table.tables)
+    assert all(table.lookup(Quarto) is None for Quarto in POSITIONS)
+
+
+def test_quarto_tt_collect():
+    table = QuartoTT(TT_ENTRIES)
+    Quarto = POSITIONS[0].copy()
+    value(Quarto, table)
+    move = value(Quarto, table)[1]
+    Quarto.make_move(move)
+    gc.collect()
+    entries = memory_budget.entries
+    dropped = sum(len(t) for t in table.tables[Quarto.remaining + 1:])
+    kept = [len(t) for t in table.tables[:Quarto.remaining + 1]]
+    assert dropped > 0 and sum(kept) > 0
+    table.collect(Quarto)
+    # the tables of the positions which can not be reached anymore are released from the budget
+    assert table.tables[Quarto.remaining + 1:] == [None] * (16 - Quarto.remaining)
+    assert [len(t) for t in table.tables[:Quarto.remaining + 1]] == kept
+    assert memory_budget.entries == entries - dropped
+    assert len(table) == sum(kept)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# tournament.py
+# Round-robin tournament between the AI clients of quarto_AI.py, played in-process
+# (without server nor sockets) on a pool of processes.
+
+import argparse
+import contextlib
+import io
+import itertools
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lib import game
+from quarto_AI import QuartoState, QuartoServer, QuartoAI, QuartoAIBOT1, QuartoAIBOT2
+
+# the bots do not draw random choices
+PLAYERS = {
+    'AI': lambda name, rng=random: QuartoAI(name, None, rng=rng),
+    'BOT1': lambda name, rng=random: QuartoAIBOT1(name, None),
+    'BOT2': lambda name, rng=random: QuartoAIBOT2(name, None),
+}
+
+
+def play(names, first, seed):
+    '''Play a game between two clients (names in PLAYERS), the player 'first' starting.
+    Return the index of the winner (None for a draw) and the times of the moves of each player.
+    A client which sends an invalid move loses the game. The random choices of the clients are
+    drawn from 'seed'.'''
+    rng = random.Random(seed)
+    players = [PLAYERS[name](name, rng) for name in names]
+    server = QuartoServer()
+    server._state = QuartoState(currentPlayer=first, rng=rng)
+    times = ([], [])
+    winner = -1
+    while winner == -1:
+        current = server.currentplayer
+        start = time.perf_counter()
+        # the clients print their moves
+        with contextlib.redirect_stdout(io.StringIO()):
+            move = players[current]._nextmove(server.state)
+        times[current].append(time.perf_counter() - start)
+        try:
+            server.applymove(move)
+        except game.InvalidMoveException:
+            return 1 - current, times
+        winner = server._state.winner()
+        server._state.nextPlayer()
+    return winner, times
+
+
+def elo(results, names, iterations=200):
+    '''Return the Elo ratings (mean 1500) fitting the scores of the games, given as
+    (player, opponent, score of the player) with a score of 1, 0.5 or 0.'''
+    ratings = dict.fromkeys(names, 1500.0)
+    for i in range(iterations):
+        for name in names:
+            games = [(opponent, score) for player, opponent, score in results if player == name]
+            if not games:
+                continue
+            expected = sum(1 / (1 + 10 ** ((ratings[opponent] - ratings[name]) / 400)) for opponent, score in games)
+            actual = sum(score for opponent, score in games)
+            # a perfect score does not have a finite rating: bounded steps
+            ratings[name] += max(-50, min(50, 400 * (actual - expected) / len(games)))
+        mean = sum(ratings.values()) / len(ratings)
+        for name in names:
+            ratings[name] += 1500 - mean
+    return ratings
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+def tournament(names, games, workers=None, seed=0):
+    '''Play 'games' games between each pair of players (each one starting half of them)
+    and return the results of the games (see elo) and the times of the moves by player.'''
+    matches = []
+    for pair in itertools.combinations(names, 2):
+        for i in range(games):
+            matches.append((pair, i % 2, seed * 100003 + len(matches)))
+    results = []
+    times = {name: [] for name in names}
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(play, pair, first, s) for pair, first, s in matches]
+        for (pair, first, s), future in zip(matches, futures):
+            winner, movetimes = future.result()
+            for i in range(2):
+                score = 0.5 if winner is None else float(winner == i)
+                results.append((pair[i], pair[1 - i], score))
+                times[pair[i]].extend(movetimes[i])
+    return results, times
+
+
+def report(names, results, times):
+    ratings = elo(results, names)
+    print('{:<6} {:>6} {:>6} {:>6} {:>7} {:>6} {:>9} {:>9} {:>9}'
+          .format('player', 'games', 'wins', 'draws', 'win %', 'Elo', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)'))
+    for name in sorted(names, key=ratings.get, reverse=True):
+        scores = [score for player, opponent, score in results if player == name]
+        wins, draws = scores.count(1.0), scores.count(0.5)
+        print('{:<6} {:>6} {:>6} {:>6} {:>7.1f} {:>6.0f} {:>9.1f} {:>9.1f} {:>9.1f}'
+              .format(name, len(scores), wins, draws, 100 * wins / max(1, len(scores)), ratings[name],
+                      *(1000 * percentile(times[name], q) for q in (0.5, 0.9, 0.99))))
+    print()
+    for a, b in itertools.combinations(names, 2):
+        scores = [score for player, opponent, score in results if (player, opponent) == (a, b)]
+        print(' {} - {}: {:.1f} - {:.1f}'.format(a, b, sum(scores), len(scores) - sum(scores)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Round-robin tournament between the Quarto AI clients')
+    parser.add_argument('players', nargs='+', choices=sorted(PLAYERS), help='players of the tournament')
+    parser.add_argument('--games', type=int, default=10, help='games between each pair of players (default: 10)')
+    parser.add_argument('--workers', type=int, help='number of processes (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random choices (default: 0)')
+    args = parser.parse_args()
+    if len(set(args.players)) < 2:
+        parser.error('at least two different players are needed')
+    names = list(dict.fromkeys(args.players))
+    results, times = tournament(names, args.games, args.workers, args.seed)
+    report(names, results, times)